@@ -1,35 +1,275 @@
-from flask import Flask, render_template, request
+import gzip
+import hashlib
+import json
+import threading
+from time import perf_counter
+from typing import Optional
+
+from flask import Flask, Response, abort, g, redirect, render_template, request, stream_template, stream_with_context, \
+    url_for
 from werkzeug.datastructures import ImmutableMultiDict
 
 import service
+from service import metrics
 from service.model import SkillSet, Skills
+from service.model.levels import MAX_XP
+from service.model.strategy import describe, wire_steps
+from service.travel import TRAVEL_TIME_LIMIT
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
+app.jinja_env.globals['describe'] = describe
+
+# Build the quest catalog at startup so the first request doesn't pay for it
+service.warm_up()
+
+# Exact searches always run as background jobs, see service.jobs, and so can take longer. Other plans do too when the
+# form asks for a job
+EXACT_TIME_LIMIT = 10.0
+# The longest a request for a job's result waits for it to finish
+MAX_JOB_WAIT = 30.0
+
+# The home page is the same for everyone until the quest data changes, so browsers may keep it for a day and then check
+# back with its ETag
+HOME_MAX_AGE = 24 * 60 * 60
+
+
+@app.before_request
+def start_timer():
+    g.started = perf_counter()
+
+
+@app.after_request
+def record_request(response: Response) -> Response:
+    # Streamed responses have only just started, the time it takes to finish them is in the solve and render phases
+    endpoint = request.endpoint or 'unknown'
+    metrics.inc('quest_requests_total', endpoint=endpoint, status=response.status_code)
+    metrics.observe('quest_request_seconds', perf_counter() - g.started, endpoint=endpoint)
+    return response
+
+
+@app.route('/metrics')
+def metrics_page():
+    if not metrics.ENABLED:
+        abort(404)
+    return Response(service.get_metrics(), mimetype='text/plain; version=0.0.4')
+
+
+class RenderedPage:
+    # A page rendered for one catalog version, compressed up front with every encoding there's a library for. Each
+    # encoding is a representation of its own, with its own strong ETag
+    def __init__(self, version: str, body: bytes):
+        self.version = version
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        self.bodies: dict[str, (bytes, str)] = {
+            'identity': (body, etag),
+            # No timestamp in the header, so every worker sends the same bytes under the same ETag
+            'gzip': (gzip.compress(body, 9, mtime=0), f'{etag}-gzip'),
+        }
+        if brotli is not None:
+            self.bodies['br'] = (brotli.compress(body), f'{etag}-br')
+
+    def response(self) -> Response:
+        encoding = request.accept_encodings.best_match([e for e in ('br', 'gzip') if e in self.bodies]) or 'identity'
+        body, etag = self.bodies[encoding]
+        headers = {'ETag': f'"{etag}"', 'Cache-Control': f'public, max-age={HOME_MAX_AGE}', 'Vary': 'Accept-Encoding'}
+        if request.if_none_match.contains_weak(etag):
+            return Response(status=304, headers=headers)
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return Response(body, mimetype='text/html', headers=headers)
+
+
+_home_lock = threading.Lock()
+_home: Optional[RenderedPage] = None
+
+
+def home_page() -> RenderedPage:
+    global _home
+
+    catalog = service.get_catalog()
+    page = _home
+    if page is not None and page.version == catalog.version:
+        return page
+
+    with _home_lock:
+        if _home is None or _home.version != catalog.version:
+            with metrics.timer('quest_phase_seconds', phase='render'):
+                body = render_template('index.html', quests=catalog.quests, skills=Skills).encode()
+            _home = RenderedPage(catalog.version, body)
+        return _home
 
 
 @app.route('/')
 def home():
-    quests = service.get_quest_data()
-    return render_template('index.html', quests=quests, skills=Skills)
+    return home_page().response()
 
 
 def parse_initial_stats(form_data: ImmutableMultiDict[str, str]):
+    # Raises ValueError, saying which skill, for values that aren't whole numbers or are out of range
     result = SkillSet()
 
     for skill in result:
         type = form_data.get(f'skill{str(skill)}Type', None)
-        value = form_data.get(f'skill{str(skill)}Value', '0')
+        value = form_data.get(f'skill{str(skill)}Value', '0').strip()
+        if value and not value.isdecimal():
+            raise ValueError(f'{skill} should be a whole number, found "{value}"')
         value = int(value) if value else 0
         if type == 'level':
-            value = Skills.min_xp_for_level(int(value))
+            try:
+                value = Skills.min_xp_for_level(value)
+            except ValueError as e:
+                raise ValueError(f'{skill}: {e}') from None
+        elif value > MAX_XP:
+            raise ValueError(f'{skill}: Experience cannot be greater than {MAX_XP}, found {value}')
         result[skill] = max(result[skill], value)
 
     return result
 
 
+def parse_completed_quests(form_data: ImmutableMultiDict[str, str]) -> int:
+    # The completed quests bitset, see QuestCatalog.quest_mask
+    positions = service.get_catalog().positions
+    result = 0
+
+    for form_name, quest_id in form_data.items():
+        if form_name.startswith('quest_') and quest_id.isdigit() and int(quest_id) in positions:
+            result |= 1 << positions[int(quest_id)]
+
+    return result
+
+
+def parse_target_quest(form_data: ImmutableMultiDict[str, str]):
+    # The quest to plan up to, or None for every quest
+    quest_id = form_data.get('target', '')
+    if quest_id.isdigit() and int(quest_id) in service.get_quest_data():
+        return int(quest_id)
+    return None
+
+
 @app.route('/result', methods=['POST'])
 def result():
-    initial_stats = parse_initial_stats(request.form)
-    completed_quests = [int(quest_id) for form_name, quest_id in request.form.items() if form_name.startswith('quest_')]
-    strategy = service.get_optimal_quest_strategy(initial_quests=completed_quests, initial_stats=initial_stats)
-    return render_template('result.html', strategy=strategy)
+    try:
+        initial_stats = parse_initial_stats(request.form)
+    except ValueError as e:
+        return Response(str(e), status=400)
+    completed_quests = parse_completed_quests(request.form)
+    target_quest = parse_target_quest(request.form)
+    if request.form.get('exact') or request.form.get('job'):
+        exact = bool(request.form.get('exact'))
+        try:
+            job = service.get_job_queue().submit('exact' if exact else 'greedy', completed_quests, initial_stats,
+                                                 target_quest, EXACT_TIME_LIMIT if exact else None)
+        except service.QueueFull as e:
+            return Response(str(e), status=429, headers={'Retry-After': str(e.retry_after)})
+        if wants_json():
+            return job_response(job)
+        # Pages poll for the result, waiting a little on every reload
+        return redirect(url_for('job_result', job_id=job.id, wait=2), code=303)
+    # Steps are rendered as the solver decides them, rather than once the whole plan is done
+    strategy, steps = service.stream_optimal_quest_strategy(initial_quests=completed_quests, initial_stats=initial_stats,
+                                                            target_quest=target_quest)
+    steps = metrics.TimedIterator(steps)
+    plan, wire = wire_steps(steps, service.get_quest_data())
+    if request.accept_mimetypes.best_match(['text/html', 'application/x-ndjson']) == 'application/x-ndjson':
+        return Response(stream_with_context(timed_render(ndjson_steps(strategy, plan, wire), steps)),
+                        mimetype='application/x-ndjson')
+    return Response(timed_render(stream_template('result_stream.html', plan=plan, steps=wire), steps))
+
+
+@app.route('/api/strategy', methods=['GET', 'POST'])
+def strategy_api():
+    # The plan, as the same form fields the home page posts, in the compact format of QuestStrategy.to_wire. With
+    # travel set, reordered to travel less between quests
+    try:
+        initial_stats = parse_initial_stats(request.values)
+    except ValueError as e:
+        return Response(json.dumps({'error': str(e)}), status=400, mimetype='application/json')
+    strategy = service.get_optimal_quest_strategy(initial_quests=parse_completed_quests(request.values),
+                                                  initial_stats=initial_stats,
+                                                  target_quest=parse_target_quest(request.values),
+                                                  travel_time_limit=TRAVEL_TIME_LIMIT if request.values.get('travel')
+                                                  else None)
+    return Response(json.dumps(strategy.to_wire(service.get_quest_data()), separators=(',', ':')),
+                    mimetype='application/json')
+
+
+def timed_render(body, steps: metrics.TimedIterator):
+    # Rendering a streamed response is interleaved with solving it, only the time not spent waiting on steps counts
+    body = metrics.TimedIterator(body)
+    try:
+        yield from body
+    finally:
+        body.close()
+        metrics.observe('quest_phase_seconds', body.elapsed - steps.elapsed, phase='render')
+
+
+def step_json(kind: str, quest_id: Optional[int], refs: list, plan: dict) -> dict:
+    # A quest completed with the rewards it gives, or rewards and training for the quest given, or the last quest
+    # completed if there isn't one. See wire_steps
+    step = {'quest': quest_id, 'rewards': [describe(ref, plan) for ref in refs]}
+    if kind == 'quest':
+        step['name'] = plan['quests'][str(quest_id)]
+    return step
+
+
+def ndjson_steps(strategy, plan: dict, steps):
+    # One json object per line, see step_json. The last line has the total training
+    for step in steps:
+        yield json.dumps(step_json(*step, plan)) + '\n'
+    yield json.dumps({'training_xp': strategy.training_xp}) + '\n'
+
+
+def wants_json() -> bool:
+    return request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json'
+
+
+@app.route('/jobs/<job_id>')
+def job_result(job_id: str):
+    # With ?wait=seconds, holds on to the request until the job's finished, or for that long at most
+    queue = service.get_job_queue()
+    job = queue.get(job_id)
+    if job is None:
+        abort(404)
+    wait = request.args.get('wait', 0, type=float)
+    if wait > 0:
+        queue.wait(job, min(wait, MAX_JOB_WAIT))
+    return job_response(job)
+
+
+def job_response(job: service.Job) -> Response:
+    # 202 while the job's queued or running, then the plan, or 504 if it ran out of time, 500 if it failed
+    status = job.status
+    url = url_for('job_result', job_id=job.id)
+    error = job.error
+    if status == 'done':
+        try:
+            plan = job.result()
+        except ValueError as e:
+            status, error = 'failed', str(e)
+    code = {'queued': 202, 'running': 202, 'done': 200, 'timed out': 504}.get(status, 500)
+    headers = {'Location': url} if code == 202 else {}
+
+    if wants_json():
+        body = {'job': job.id, 'status': status, 'url': url}
+        if status == 'done':
+            strategy = plan.strategy if job.kind == 'exact' else plan
+            body['training_xp'] = strategy.training_xp
+            body['plan'] = strategy.to_wire(service.get_quest_data())
+            if job.kind == 'exact':
+                body.update(greedy_training_xp=plan.greedy_training_xp, lower_bound=plan.lower_bound,
+                            proven=plan.proven)
+        elif error is not None:
+            body['error'] = error
+        return Response(json.dumps(body), status=code, mimetype='application/json', headers=headers)
+
+    if status == 'done':
+        with metrics.timer('quest_phase_seconds', phase='render'):
+            strategy, exact = (plan.strategy, plan) if job.kind == 'exact' else (plan, None)
+            return Response(render_template('result.html', plan=strategy.to_wire(service.get_quest_data()),
+                                            exact=exact))
+    return Response(render_template('job.html', status=status, error=error), status=code, headers=headers)
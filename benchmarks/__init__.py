@@ -0,0 +1,3 @@
+from .profiles import PROFILES, profile
+from .suite import BENCHMARKS, compare_results, run_benchmarks
+from .synthetic import load_real_quest_data, scaled_quest_data
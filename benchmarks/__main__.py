@@ -0,0 +1,52 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from .profiles import PROFILES
+from .suite import BENCHMARKS, compare_results, run_benchmarks
+
+
+def _scales(value: str) -> [int]:
+    return [int(scale) for scale in value.split(',')]
+
+
+def main(argv: [str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Time the solver\'s hot paths on the real quest catalog and synthetic ones scaled up from it'
+    )
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, default=BENCHMARKS, help='benchmarks to run')
+    parser.add_argument('--profiles', nargs='+', choices=PROFILES, default=PROFILES, help='accounts to run them for')
+    parser.add_argument('--scales', type=_scales, default=[1, 10],
+                        help='catalog sizes to solve and look up lamps in, as multiples of the real one '
+                             '(default: 1,10, 100x solves are too slow to run by default)')
+    parser.add_argument('--load-scales', type=_scales, default=[1, 10, 100],
+                        help='catalog sizes to load (default: 1,10,100)')
+    parser.add_argument('--runs', type=int, default=5, help='runs per benchmark, at most 3 for solves, and only 1 '
+                                                            'for larger catalogs (default: %(default)s)')
+    parser.add_argument('--output', type=Path, help='write the results here as json, instead of to stdout')
+    parser.add_argument('--compare', type=Path, help='results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=1.1,
+                        help='how many times slower counts as a regression (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.only, args.profiles, args.scales, args.load_scales, args.runs)
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2))
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if args.compare is not None:
+        lines, regressions = compare_results(json.loads(args.compare.read_text()), results, args.threshold)
+        for line in lines:
+            print(line, file=sys.stderr)
+        if regressions:
+            print(f'{regressions} benchmark(s) slower than {args.compare}', file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,35 @@
+from operator import attrgetter
+
+from service.catalog import QuestCatalog
+from service.model import SkillSet, Skills
+from service.model.skillset import SKILLS
+
+__all__ = ['PROFILES', 'profile']
+
+PROFILES = ('fresh', 'mid', 'maxed', 'all_but_one')
+
+
+def _stats(level: int) -> SkillSet:
+    return SkillSet({skill: max(Skills.min_xp_for_level(level), skill.initial) for skill in SKILLS})
+
+
+def profile(catalog: QuestCatalog, name: str) -> (int, SkillSet):
+    # The completed quests bitset and stats of a representative account:
+    #   - fresh: nothing done, starting stats
+    #   - mid: the easier half of the quests done, along with anything they need, every skill at 50
+    #   - maxed: nothing done, every skill at 99, so no training is ever needed
+    #   - all_but_one: every quest done bar the one with the longest prereq chain, every skill at 80
+    if name == 'fresh':
+        return 0, SkillSet()
+    if name == 'mid':
+        quests = sorted(catalog.quests.values(), key=attrgetter('sort_key'))
+        done = 0
+        for quest in quests[:len(quests) // 2]:
+            done |= quest.bit | catalog.closures[quest.id].mask
+        return done & catalog.quest_mask(catalog.quests), _stats(50)
+    if name == 'maxed':
+        return 0, _stats(99)
+    if name == 'all_but_one':
+        last = max(catalog.quests, key=lambda quest_id: catalog.closures[quest_id].depth)
+        return catalog.quest_mask(quest_id for quest_id in catalog.quests if quest_id != last), _stats(80)
+    raise ValueError(f'Unknown profile {name}')
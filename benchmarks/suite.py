@@ -0,0 +1,238 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from random import Random
+from statistics import mean, median
+from typing import Callable, Iterable, Iterator
+
+from service.catalog import QuestCatalog
+from service.hoard import RewardHoard
+from service.model import Player, SkillSet, Skills
+from service.model import combat
+from service.model.levels import XP_TABLE
+from service.model.quest import load_quest_data, parse_quest_data
+from service.model.rewards import ClaimableXpReward, ImmediateXpReward
+from service.model.skills import COMBAT_SKILLS
+from service.model.skillset import SKILLS
+from service.service import optimal_search
+
+from .profiles import PROFILES, profile
+from .synthetic import load_real_quest_data, scaled_quest_data
+
+__all__ = ['BENCHMARKS', 'run_benchmarks', 'compare_results']
+
+# Every gap next_lamp is asked to fill, for every skill
+LAMP_GAPS = (500, 20_000, 1_000_000)
+# Ops per run of the benchmarks that time many small calls
+LEVEL_LOOKUPS = 20_000
+COMBAT_READS = 5_000
+
+
+@lru_cache(maxsize=None)
+def _quest_data(scale: int) -> list[dict]:
+    return scaled_quest_data(load_real_quest_data(), scale)
+
+
+@lru_cache(maxsize=None)
+def _catalog(scale: int) -> QuestCatalog:
+    return QuestCatalog(parse_quest_data(_quest_data(scale)), f'synthetic-{scale}x', (0, 0))
+
+
+def _timings(run: Callable[[], object], runs: int) -> ([float], object):
+    times = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = run()
+        times.append(time.perf_counter() - start)
+    return times, result
+
+
+def _result(name: str, params: dict, times: [float], **extra) -> dict:
+    return {
+        'name': name,
+        'params': params,
+        'runs': len(times),
+        'min': min(times),
+        'median': median(times),
+        'mean': mean(times),
+        'extra': extra,
+    }
+
+
+def bench_load_quest_data(scales: [int], runs: int) -> Iterator[dict]:
+    # Parsing the json file into quests, as on a cold start without a snapshot
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in scales:
+            path = Path(tmp) / f'quest_data_{scale}x.json'
+            path.write_text(json.dumps(_quest_data(scale)))
+            times, quests = _timings(lambda: load_quest_data(path), runs if scale < 100 else 1)
+            yield _result('load_quest_data', {'scale': scale}, times, quests=len(quests))
+
+
+def bench_optimal_search(scales: [int], profiles: [str], runs: int) -> Iterator[dict]:
+    # A whole greedy solve, without the cache or the trace
+    for scale in scales:
+        catalog = _catalog(scale)
+        for name in profiles:
+            quests_completed, stats = profile(catalog, name)
+
+            def solve():
+                player = Player(stats.copy())
+                player.quests_completed = quests_completed
+                return optimal_search(player, catalog.quests)
+
+            times, strategy = _timings(solve, runs if scale == 1 else 1)
+            yield _result('optimal_search', {'scale': scale, 'profile': name}, times,
+                          training_xp=strategy.training_xp, steps=len(strategy.log))
+
+
+def _lamp_hoard(catalog: QuestCatalog) -> RewardHoard:
+    # Every reward that can end up in the hoard, from every quest
+    return RewardHoard(
+        reward for quest in catalog.quests.values() for reward in quest.xp_rewards
+        if isinstance(reward, ClaimableXpReward) or not isinstance(reward, ImmediateXpReward)
+    )
+
+
+def bench_next_lamp(scales: [int], profiles: [str], runs: int) -> Iterator[dict]:
+    # Looking up the best lamp for every skill and a few gaps, against a hoard of every reward in the catalog
+    for scale in scales:
+        hoard = _lamp_hoard(_catalog(scale))
+        for name in profiles:
+            _, stats = profile(_catalog(scale), name)
+            gaps = [SkillSet({skill: gap for skill in SKILLS}) for gap in LAMP_GAPS]
+
+            def lookups():
+                return sum(hoard.next_lamp(stats, gap, skill) is not None for gap in gaps for skill in SKILLS)
+
+            times, found = _timings(lookups, runs)
+            yield _result('RewardHoard.next_lamp', {'scale': scale, 'profile': name}, times,
+                          calls=len(gaps) * len(SKILLS), hoard=len(hoard), found=found)
+
+
+def bench_combat_route(profiles: [str], runs: int) -> Iterator[dict]:
+    # Routes to every combat level from 3 to 138, from scratch and then from the warm caches
+    for name in profiles:
+        _, stats = profile(_catalog(1), name)
+
+        def routes():
+            return sum(SkillSet.optimal_route_to_combat_level(goal, stats.copy()).total() for goal in range(3, 139))
+
+        def cold_routes():
+            combat.route_to_combat_level.cache_clear()
+            combat._tables.cache_clear()
+            return routes()
+
+        times, xp = _timings(cold_routes, runs)
+        yield _result('SkillSet.optimal_route_to_combat_level', {'profile': name, 'cache': 'cold'}, times,
+                      calls=136, xp=xp)
+        times, xp = _timings(routes, runs)
+        yield _result('SkillSet.optimal_route_to_combat_level', {'profile': name, 'cache': 'warm'}, times,
+                      calls=136, xp=xp)
+
+
+def bench_level_for_xp(runs: int) -> Iterator[dict]:
+    random = Random(0)
+    xps = [random.randrange(XP_TABLE[-1] + 1) for _ in range(LEVEL_LOOKUPS)]
+    times, _ = _timings(lambda: [Skills.level_for_xp(xp) for xp in xps], runs)
+    yield _result('Skills.level_for_xp', {}, times, calls=len(xps))
+
+
+def bench_combat_level(profiles: [str], runs: int) -> Iterator[dict]:
+    # Reading the combat level after every change to a combat skill, as training does
+    for name in profiles:
+        _, stats = profile(_catalog(1), name)
+
+        def reads():
+            player = Player(stats.copy())
+            level = 0
+            for n in range(COMBAT_READS):
+                player.skills[COMBAT_SKILLS[n % len(COMBAT_SKILLS)]] += 500
+                level = player.combat_level
+            return level
+
+        times, level = _timings(reads, runs)
+        yield _result('Player.combat_level', {'profile': name}, times, calls=COMBAT_READS, level=level)
+
+
+BENCHMARKS = ('load_quest_data', 'optimal_search', 'next_lamp', 'combat_route', 'level_for_xp', 'combat_level')
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=Path(__file__).resolve().parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(only: Iterable[str] = BENCHMARKS, profiles: Iterable[str] = PROFILES, scales: [int] = (1, 10),
+                   load_scales: [int] = (1, 10, 100), runs: int = 5, log=sys.stderr) -> dict:
+    # Machine-readable results: where and what they were run on, and the timings of every benchmark, in seconds
+    only, profiles = set(only), list(profiles)
+    suites = {
+        'load_quest_data': lambda: bench_load_quest_data(load_scales, runs),
+        'optimal_search': lambda: bench_optimal_search(scales, profiles, min(runs, 3)),
+        'next_lamp': lambda: bench_next_lamp(scales, profiles, runs),
+        'combat_route': lambda: bench_combat_route(profiles, runs),
+        'level_for_xp': lambda: bench_level_for_xp(runs),
+        'combat_level': lambda: bench_combat_level(profiles, runs),
+    }
+    results = []
+    for name in BENCHMARKS:
+        if name not in only:
+            continue
+        for result in suites[name]():
+            if log is not None:
+                print(f'{_label(result)}: {result["median"] * 1000:.2f} ms', file=log)
+            results.append(result)
+
+    return {
+        'meta': {
+            'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'results': results,
+    }
+
+
+def _label(result: dict) -> str:
+    return ' '.join([result['name']] + [f'{key}={value}' for key, value in result['params'].items()])
+
+
+def compare_results(baseline: dict, current: dict, threshold: float = 1.1) -> ([str], int):
+    # A line per benchmark in both runs, comparing median times, and how many got slower by more than threshold
+    def key(result):
+        return result['name'], json.dumps(result['params'], sort_keys=True)
+
+    before = {key(result): result for result in baseline['results']}
+    lines = []
+    regressions = 0
+    for result in current['results']:
+        old = before.get(key(result))
+        if old is None:
+            continue
+        ratio = result['median'] / old['median'] if old['median'] else float('inf')
+        flag = ''
+        if ratio > threshold:
+            regressions += 1
+            flag = '  SLOWER'
+        elif ratio < 1 / threshold:
+            flag = '  faster'
+        lines.append(f'{_label(result)}: {old["median"] * 1000:.2f} ms -> '
+                     f'{result["median"] * 1000:.2f} ms ({ratio:.2f}x){flag}')
+        if old['extra'] != result['extra']:
+            lines.append(f'  results changed: {old["extra"]} -> {result["extra"]}')
+    return lines, regressions
@@ -0,0 +1,41 @@
+import copy
+import json
+from pathlib import Path
+from random import Random
+
+__all__ = ['scaled_quest_data', 'load_real_quest_data']
+
+DATA_FILE = Path(__file__).resolve().parent.parent / 'service' / 'quest_data.json'
+
+# Chance of a copied prereq being pointed at the same quest in an earlier copy instead of its own
+CROSS_LINK = 0.25
+
+
+def load_real_quest_data() -> list[dict]:
+    with open(DATA_FILE) as f:
+        return json.load(f)
+
+
+def scaled_quest_data(data: list[dict], scale: int, seed: int = 0) -> list[dict]:
+    # A catalog scale times the size of data, with the same shape: every quest is copied scale times, keeping its
+    # difficulty, requirements and rewards, so prereq density, reward type mix and skill requirements are unchanged.
+    # Copies of a prereq are sometimes swapped for an earlier copy of it, so the copies are one graph rather than
+    # scale separate ones. The same data, scale and seed always give the same catalog
+    if scale == 1:
+        return data
+
+    random = Random(seed)
+    stride = 10 ** len(str(max(quest['id'] for quest in data)))
+    result = []
+    for n in range(scale):
+        for quest in data:
+            quest = copy.deepcopy(quest)
+            quest['id'] += n * stride
+            if n:
+                quest['name'] = f'{quest["name"]} #{n + 1}'
+            quest['quest_requirements'] = [
+                prereq + (random.randrange(n) if n and random.random() < CROSS_LINK else n) * stride
+                for prereq in quest.get('quest_requirements', [])
+            ]
+            result.append(quest)
+    return result
@@ -1 +1,4 @@
-from .service import get_optimal_quest_strategy, get_quest_data
\ No newline at end of file
+from .catalog import get_catalog, warm_up
+from .service import get_optimal_quest_strategy, stream_optimal_quest_strategy, get_exact_quest_strategy, \
+    replan_quest_strategy, get_quest_data, get_cache_stats, get_metrics
+from .jobs import Job, QueueFull, get_job_queue
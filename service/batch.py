@@ -0,0 +1,204 @@
+import argparse
+import csv
+import gc
+import json
+import multiprocessing
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, TextIO
+
+from .catalog import get_catalog, warm_up
+from .model import SkillSet, Skills
+from .model.levels import MAX_XP
+from .service import get_optimal_quest_strategy
+
+__all__ = ['read_profiles', 'plan_profile', 'plan_profiles']
+
+# How often progress is reported, in seconds
+PROGRESS_INTERVAL = 2.0
+
+
+def _skill(name: str) -> Optional[Skills]:
+    return Skills.__members__.get(name.strip().upper())
+
+
+def _profile_from_row(row: dict[str, str]) -> dict:
+    # A csv row: an id column, quests as ids separated by spaces or semicolons, an optional target, and a column of xp
+    # per skill, named after it
+    quests = (row.get('quests') or '').replace(';', ' ').split()
+    return {
+        'id': row.get('id'),
+        'quests': [int(quest_id) for quest_id in quests],
+        'target': int(row['target']) if row.get('target') else None,
+        'skills': {name: int(xp) for name, xp in row.items() if name and _skill(name) is not None and xp},
+    }
+
+
+def read_profiles(file: TextIO, format: str = 'ndjson') -> Iterator[dict]:
+    # Profiles, one per line of ndjson or row of csv, as {'id', 'skills': {skill name: xp}, 'quests': [quest id],
+    # 'target'}, every field optional. Lines that can't be read are passed on as {'id', 'error'}
+    if format == 'csv':
+        for n, row in enumerate(csv.DictReader(file), 1):
+            try:
+                yield _profile_from_row(row)
+            except ValueError as e:
+                yield {'id': row.get('id') or n, 'error': str(e)}
+        return
+
+    for n, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            profile = json.loads(line)
+            if not isinstance(profile, dict):
+                raise ValueError('expected a json object')
+        except ValueError as e:
+            yield {'id': n, 'error': f'line {n}: {e}'}
+            continue
+        yield profile
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _check_profile(profile: dict):
+    # Raises ValueError for fields of the wrong type, before any of them get near the solver
+    skills = profile.get('skills')
+    if skills is not None:
+        if not isinstance(skills, dict):
+            raise ValueError(f'"skills" should be an object of skill names to xp, found {type(skills).__name__}')
+        for name, xp in skills.items():
+            if _skill(name) is None:
+                raise ValueError(f'Unknown skill {name}')
+            if not _is_int(xp) or not 0 <= xp <= MAX_XP:
+                raise ValueError(f'{name} xp should be a whole number from 0 to {MAX_XP}, found {xp!r}')
+    quests = profile.get('quests')
+    if quests is not None and (not isinstance(quests, list) or not all(_is_int(quest_id) for quest_id in quests)):
+        raise ValueError(f'"quests" should be a list of quest ids, found {quests!r}')
+    target = profile.get('target')
+    if target is not None and not _is_int(target):
+        raise ValueError(f'"target" should be a quest id, found {target!r}')
+
+
+def _stats(skills: dict[str, int]) -> SkillSet:
+    # The same as the home page's form: every skill starts at its lowest, and is raised to the xp given
+    stats = SkillSet()
+    for name, xp in skills.items():
+        skill = _skill(name)
+        stats[skill] = max(stats[skill], xp)
+    return stats
+
+
+def plan_profile(profile: dict, full: bool = False) -> dict:
+    # A summary of the profile's plan: the training it takes, and the order to do its quests in. With full, the whole
+    # plan, as QuestStrategy.to_wire
+    result = {'id': profile.get('id')}
+    if 'error' in profile:
+        result['error'] = profile['error']
+        return result
+    try:
+        _check_profile(profile)
+        strategy = get_optimal_quest_strategy(profile.get('quests') or None, _stats(profile.get('skills') or {}),
+                                              profile.get('target'))
+    except Exception as e:
+        # Whatever goes wrong with one profile is reported on its line, rather than ending the whole run
+        result['error'] = str(e) or type(e).__name__
+        return result
+    result['training_xp'] = strategy.training_xp
+    result['quests'] = [quest_id for quest_id in strategy]
+    if full:
+        result['plan'] = strategy.to_wire(get_catalog().quests)
+    return result
+
+
+def _start_worker():
+    # Forked workers share the parent's catalog, copy on write, and only check it's still current. Anything else
+    # loads its own, from the snapshot
+    warm_up()
+
+
+def _plan_full(profile: dict) -> dict:
+    return plan_profile(profile, True)
+
+
+def plan_profiles(profiles: Iterable[dict], workers: int = None, full: bool = False, ordered: bool = True,
+                  chunksize: int = 4) -> Iterator[dict]:
+    # plan_profile for every profile, fanned out over a pool of worker processes, in the order given unless not
+    # ordered. With a single worker, plans in this process instead
+    workers = workers or os.cpu_count() or 1
+    plan = _plan_full if full else plan_profile
+    if workers == 1:
+        warm_up()
+        yield from map(plan, profiles)
+        return
+
+    # Load the catalog before the workers fork, so they all share the one copy, and keep the garbage collector from
+    # writing to its objects, which would copy their pages in every worker
+    warm_up()
+    gc.freeze()
+    method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+    try:
+        with multiprocessing.get_context(method).Pool(workers, initializer=_start_worker) as pool:
+            if ordered:
+                yield from pool.imap(plan, profiles, chunksize)
+            else:
+                yield from pool.imap_unordered(plan, profiles, chunksize)
+    finally:
+        gc.unfreeze()
+
+
+def _format(path: Optional[Path], format: Optional[str]) -> str:
+    if format is not None:
+        return format
+    return 'csv' if path is not None and path.suffix.lower() == '.csv' else 'ndjson'
+
+
+def main(argv: [str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m service.batch',
+        description='Plan quests for many players at once, from ndjson or csv profiles, writing a json line per plan'
+    )
+    parser.add_argument('input', type=Path, nargs='?',
+                        help='profiles to plan for, one json object per line or a csv file with a column per skill '
+                             '(default: stdin)')
+    parser.add_argument('--output', type=Path, help='write the plans here, instead of to stdout')
+    parser.add_argument('--format', choices=('ndjson', 'csv'), help='input format (default: by file extension)')
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per cpu)')
+    parser.add_argument('--chunksize', type=int, default=4, help='profiles handed to a worker at a time '
+                                                                 '(default: %(default)s)')
+    parser.add_argument('--unordered', action='store_true', help='write plans as they finish, not in input order')
+    parser.add_argument('--full', action='store_true', help='write every step of the plans, not just the quest order')
+    parser.add_argument('--quiet', action='store_true', help='don\'t report progress')
+    args = parser.parse_args(argv)
+
+    input = args.input.open(newline='') if args.input is not None else sys.stdin
+    output = args.output.open('w') if args.output is not None else sys.stdout
+    start = last_report = time.perf_counter()
+    planned = failed = 0
+    try:
+        profiles = read_profiles(input, _format(args.input, args.format))
+        for result in plan_profiles(profiles, args.workers, args.full, not args.unordered, args.chunksize):
+            output.write(json.dumps(result, separators=(',', ':')) + '\n')
+            planned += 1
+            failed += 'error' in result
+            now = time.perf_counter()
+            if not args.quiet and now - last_report > PROGRESS_INTERVAL:
+                last_report = now
+                print(f'{planned} planned, {failed} failed, {planned / (now - start):.1f}/s', file=sys.stderr)
+    finally:
+        if input is not sys.stdin:
+            input.close()
+        if output is not sys.stdout:
+            output.close()
+
+    if not args.quiet:
+        elapsed = time.perf_counter() - start
+        print(f'Planned {planned} profiles ({failed} failed) in {elapsed:.1f}s', file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,48 @@
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+from .schema import QuestDataError, check_quest_references
+from .snapshot import SNAPSHOT_FILE, compile_snapshot
+
+DATA_FILE = Path(__file__).resolve().parent / 'quest_data.json'
+
+
+def main(argv: [str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m service.build_snapshot',
+        description='Validate the quest data and compile it into a binary snapshot for fast worker start-up'
+    )
+    parser.add_argument('--data', type=Path, default=DATA_FILE, help='quest data json (default: %(default)s)')
+    parser.add_argument('--output', type=Path, default=SNAPSHOT_FILE, help='snapshot to write (default: %(default)s)')
+    parser.add_argument('--check', action='store_true', help='only validate the quest data, don\'t write anything')
+    args = parser.parse_args(argv)
+
+    raw = args.data.read_bytes()
+    try:
+        snapshot = compile_snapshot(raw)
+    except QuestDataError as e:
+        for error in e.errors:
+            print(error, file=sys.stderr)
+        print(f'{len(e.errors)} problem(s) found in {args.data}', file=sys.stderr)
+        return 1
+
+    for warning in check_quest_references(json.loads(raw)):
+        print(f'warning: {warning}', file=sys.stderr)
+
+    if args.check:
+        print(f'{args.data} is valid')
+        return 0
+
+    # Write next to the target and rename, so running workers never see a half-written snapshot
+    tmp_file = args.output.with_name(args.output.name + '.tmp')
+    tmp_file.write_bytes(snapshot)
+    os.replace(tmp_file, args.output)
+    print(f'Wrote {args.output} ({len(snapshot)} bytes)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
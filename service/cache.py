@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from .model.skillset import SkillSet
+
+__all__ = ['StrategyCache', 'get_cache', 'strategy_key']
+
+# Bump whenever the records cached, or the solver's output for the same input, change
+FORMAT_VERSION = 4
+
+# Set to a file to keep results across restarts
+CACHE_DB_ENV = 'QUEST_STRATEGY_CACHE_DB'
+CACHE_SIZE_ENV = 'QUEST_STRATEGY_CACHE_BYTES'
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+def strategy_key(initial_stats: SkillSet, completed_quests: int, mode: str) -> str:
+    # Only the skill vector matters to the solver, whether a skill is present with 0 xp or absent makes no difference
+    h = hashlib.sha256()
+    h.update(FORMAT_VERSION.to_bytes(4, 'little'))
+    h.update(initial_stats.vector.tobytes())
+    h.update(completed_quests.to_bytes((completed_quests.bit_length() + 7) // 8 + 1, 'little'))
+    h.update(mode.encode())
+    return h.hexdigest()
+
+
+def _encode(record: dict) -> bytes:
+    return zlib.compress(json.dumps(record, separators=(',', ':')).encode())
+
+
+def _decode(data: bytes) -> dict:
+    return json.loads(zlib.decompress(data))
+
+
+class StrategyCache:
+    # Solver results by strategy_key(), for one catalog version at a time. Looking anything up for a different version
+    # drops everything cached for the old one, so a changed catalog never serves stale plans.
+    #
+    # Records are kept compressed, in a LRU bounded by their total size, and optionally in a SQLite file so they
+    # survive restarts. Anything found on disk is promoted to memory
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, path: Optional[Path] = None):
+        self.max_bytes = max_bytes
+        self.path = path
+        self.version: Optional[str] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._bytes = 0
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS strategies (key TEXT PRIMARY KEY, version TEXT NOT NULL, record BLOB NOT NULL)'
+            )
+
+    def __len__(self):
+        return len(self._memory)
+
+    def _use_version(self, version: str):
+        if version == self.version:
+            return
+        self.version = version
+        self._memory.clear()
+        self._bytes = 0
+        if self._db is not None:
+            self._db.execute('DELETE FROM strategies WHERE version != ?', (version,))
+
+    def _remember(self, key: str, data: bytes):
+        if key in self._memory:
+            self._bytes -= len(self._memory.pop(key))
+        if len(data) > self.max_bytes:
+            return
+        self._memory[key] = data
+        self._bytes += len(data)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._bytes -= len(evicted)
+
+    def get(self, version: str, key: str) -> Optional[dict]:
+        with self._lock:
+            self._use_version(version)
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return _decode(data)
+            if self._db is not None:
+                row = self._db.execute('SELECT record FROM strategies WHERE key = ? AND version = ?',
+                                       (key, version)).fetchone()
+                if row is not None:
+                    self._remember(key, row[0])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return _decode(row[0])
+            self.misses += 1
+            return None
+
+    def put(self, version: str, key: str, record: dict):
+        data = _encode(record)
+        with self._lock:
+            self._use_version(version)
+            self._remember(key, data)
+            if self._db is not None:
+                self._db.execute('INSERT OR REPLACE INTO strategies (key, version, record) VALUES (?, ?, ?)',
+                                 (key, version, data))
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._bytes = 0
+            if self._db is not None:
+                self._db.execute('DELETE FROM strategies')
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'entries': len(self._memory),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+
+_lock = threading.Lock()
+_cache: Optional[StrategyCache] = None
+
+
+def get_cache() -> StrategyCache:
+    global _cache
+
+    cache = _cache
+    if cache is not None:
+        return cache
+
+    with _lock:
+        if _cache is None:
+            path = os.environ.get(CACHE_DB_ENV)
+            _cache = StrategyCache(int(os.environ.get(CACHE_SIZE_ENV, DEFAULT_MAX_BYTES)), Path(path) if path else None)
+        return _cache
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from types import MappingProxyType
+from typing import Iterable, Mapping, Optional
+
+from .closure import PrereqClosure, build_closures, target_quests
+from .model.quest import Quest, parse_quest_data, quest_mask, quest_positions
+from .snapshot import SNAPSHOT_FILE, load_snapshot
+from .travel import TravelCosts
+
+__all__ = ['QuestCatalog', 'get_catalog', 'warm_up']
+
+DATA_FILE = Path(__file__).resolve().parent / 'quest_data.json'
+
+
+class QuestCatalog:
+    def __init__(self, quests: dict[int, Quest], version: str, stamp: (int, int)):
+        # Shared by every request and thread, so only ever hand out a read-only view
+        self.quests: Mapping[int, Quest] = MappingProxyType(quests)
+        # Bit positions of quest ids in completed quests bitsets, the same ones the quests were built with
+        self.positions: Mapping[int, int] = MappingProxyType(
+            quest_positions((quest.id, quest.quest_prereqs) for quest in quests.values())
+        )
+        # Every quest's transitive prereqs and the most they need, for planning towards a single quest
+        self.closures: Mapping[int, PrereqClosure] = MappingProxyType(build_closures(quests))
+        # The travel costs between quests with a location, see travel.shorten_travel
+        self.travel = TravelCosts(quests)
+        self.version = version
+        self.stamp = stamp
+
+    def restamped(self, stamp: (int, int)) -> 'QuestCatalog':
+        catalog = QuestCatalog.__new__(QuestCatalog)
+        catalog.quests = self.quests
+        catalog.positions = self.positions
+        catalog.closures = self.closures
+        catalog.travel = self.travel
+        catalog.version = self.version
+        catalog.stamp = stamp
+        return catalog
+
+    def quest_mask(self, quest_ids: Iterable[int]) -> int:
+        return quest_mask(self.positions, quest_ids)
+
+    def target_quests(self, target_id: int, quests_completed: int, quest_points: int) -> dict[int, Quest]:
+        # See closure.target_quests
+        return target_quests(self.quests, self.closures, target_id, quests_completed, quest_points)
+
+    def __len__(self):
+        return len(self.quests)
+
+
+_lock = threading.Lock()
+_catalog: Optional[QuestCatalog] = None
+
+
+def _file_stamp(path: Path) -> (int, int):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def get_catalog() -> QuestCatalog:
+    global _catalog
+
+    # Fast path: a single stat() call, no locking. Readers keep whichever catalog they grabbed,
+    # a rebuild only ever swaps the module reference
+    catalog = _catalog
+    stamp = _file_stamp(DATA_FILE)
+    if catalog is not None and catalog.stamp == stamp:
+        return catalog
+
+    with _lock:
+        catalog = _catalog
+        if catalog is not None and catalog.stamp == stamp:
+            return catalog
+
+        raw = DATA_FILE.read_bytes()
+        version = hashlib.sha256(raw).hexdigest()
+        if catalog is not None and catalog.version == version:
+            # Touched but not changed, no need to rebuild
+            _catalog = catalog.restamped(stamp)
+        else:
+            # Prefer the compiled snapshot, falling back to the json if it's missing or stale
+            quests = load_snapshot(SNAPSHOT_FILE, version)
+            if quests is None:
+                quests = parse_quest_data(json.loads(raw))
+            _catalog = QuestCatalog(quests, version, stamp)
+        return _catalog
+
+
+def warm_up() -> QuestCatalog:
+    return get_catalog()
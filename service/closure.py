@@ -0,0 +1,115 @@
+from operator import attrgetter
+from typing import Mapping
+
+from .model.quest import Quest
+from .model.skillset import SKILLS, SkillSet
+from .util import bits
+
+__all__ = ['PrereqClosure', 'build_closures', 'target_quests']
+
+
+class PrereqClosure:
+    # Everything that has to be done before a quest can be: every quest it needs, directly or not, and the most any of
+    # them, or the quest itself, asks for
+    __slots__ = ('mask', 'depth', 'skill_prereqs', 'combat_requirement', 'qp_requirement', 'quest_points')
+
+    def __init__(self, mask: int, depth: int, skill_prereqs: SkillSet, combat_requirement: int, qp_requirement: int,
+                 quest_points: int):
+        # Bitset of the transitive prereqs, by Quest.position, not including the quest itself
+        self.mask = mask
+        # 0 for a quest with no prereqs in the catalog, otherwise one more than its deepest prereq
+        self.depth = depth
+        self.skill_prereqs = skill_prereqs
+        self.combat_requirement = combat_requirement
+        self.qp_requirement = qp_requirement
+        # Given by the quest and all its prereqs together
+        self.quest_points = quest_points
+
+
+def _quest_points(by_position: Mapping[int, Quest], mask: int) -> int:
+    return sum(by_position[position].quest_points for position in bits(mask) if position in by_position)
+
+
+def build_closures(quests: Mapping[int, Quest]) -> dict[int, PrereqClosure]:
+    by_position = {quest.position: quest for quest in quests.values()}
+    closures = {}
+
+    # Depth first, with an explicit stack so long prereq chains can't run out of recursion. A quest is seen twice: once
+    # to queue its prereqs, then once they're all done. The quests seen once and not yet done are the current path
+    for root in quests.values():
+        stack = [(root, False)]
+        path = set()
+        while stack:
+            quest, ready = stack.pop()
+            if quest.id in closures:
+                continue
+            prereqs = [quests[prereq_id] for prereq_id in quest.quest_prereqs if prereq_id in quests]
+            if not ready:
+                path.add(quest.id)
+                stack.append((quest, True))
+                for prereq in prereqs:
+                    if prereq.id in path:
+                        raise ValueError(f'Quest {prereq.id} is its own prerequisite')
+                    if prereq.id not in closures:
+                        stack.append((prereq, False))
+                continue
+
+            # Prereqs outside the catalog are only in the mask, there's nothing more to know about them
+            mask = quest.prereq_mask
+            depth = 0
+            xp = list(quest.skill_prereqs.vector)
+            combat_requirement = quest.combat_requirement
+            qp_requirement = quest.qp_requirement
+            for prereq in prereqs:
+                prereq_closure = closures[prereq.id]
+                mask |= prereq_closure.mask
+                depth = max(depth, prereq_closure.depth + 1)
+                xp = list(map(max, xp, prereq_closure.skill_prereqs.vector))
+                combat_requirement = max(combat_requirement, prereq_closure.combat_requirement)
+                qp_requirement = max(qp_requirement, prereq_closure.qp_requirement)
+
+            skill_prereqs = SkillSet({skill: value for skill, value in zip(SKILLS, xp) if value > 0})
+            closures[quest.id] = PrereqClosure(mask, depth, skill_prereqs, combat_requirement, qp_requirement,
+                                               quest.quest_points + _quest_points(by_position, mask))
+            path.discard(quest.id)
+    return closures
+
+
+def target_quests(quests: Mapping[int, Quest], closures: Mapping[int, PrereqClosure], target_id: int,
+                  quests_completed: int, quest_points: int) -> dict[int, Quest]:
+    # The quests left to do to unlock target_id, and complete it: its prereqs, plus enough other quests to make up the
+    # quest points anything on the way needs. Those are picked easiest first, along with whatever they need in turn
+    by_position = {quest.position: quest for quest in quests.values()}
+    target = closures[target_id]
+    needed = (target.mask | quests[target_id].bit) & ~quests_completed
+    # Quest points a quest needs can only come from quests that don't need it in turn, by the quests that need them
+    dependents: dict[int, int] = {}
+
+    def shortfall() -> (int, int):
+        # The most quest points any quest is short of, and the bits of every quest with a quest point requirement
+        worst, gated = 0, 0
+        for position in bits(needed):
+            quest = by_position.get(position)
+            if quest is None or not quest.qp_requirement:
+                continue
+            gated |= quest.bit
+            if quest.id not in dependents:
+                dependents[quest.id] = sum(other.bit for other in quests.values() if closures[other.id].mask & quest.bit)
+            before = _quest_points(by_position, needed & ~dependents[quest.id] & ~quest.bit)
+            worst = max(worst, quest.qp_requirement - quest_points - before)
+        return worst, gated
+
+    short, gated = shortfall()
+    if short > 0:
+        for quest in sorted(quests.values(), key=attrgetter('sort_key')):
+            closure = closures[quest.id]
+            extra = (closure.mask | quest.bit) & ~(quests_completed | needed)
+            # Skip anything that gives nothing, or can only be done after a quest it's meant to make up points for
+            if not quest.quest_points or not quest.bit & extra or closure.mask & gated:
+                continue
+            needed |= extra
+            short, gated = shortfall()
+            if short <= 0:
+                break
+
+    return {by_position[position].id: by_position[position] for position in bits(needed) if position in by_position}
@@ -0,0 +1,472 @@
+from bisect import bisect_right
+from heapq import heappop, heappush
+from itertools import count
+from time import monotonic
+from typing import Mapping, Optional
+
+from .model import Player, SkillSet, Skills
+from .model.levels import MAX_LEVEL, XP_TABLE, level_for_xp, levels_for_xp
+from .model.quest import Quest
+from .model.rewards import ChoiceXpReward, ClaimableChoiceXpReward, ClaimableXpReward, ClaimedChoiceXpReward, \
+    ImmediateXpReward, PrismaticXpReward, XpReward
+from .model.skills import COMBAT_SKILLS
+from .model.skillset import SKILLS, SKILL_COUNT
+from .model.strategy import QuestStrategy, Training
+from .util import bits
+
+__all__ = ['ExactResult', 'exact_search']
+
+_SIZES = list(PrismaticXpReward.PrismaticSize)
+# The least xp a skill can have at each level, as level_for_xp counts them, which is all a prismatic lamp goes by
+_LEVEL_STARTS = [0, 0] + [XP_TABLE[level - 1] + 1 for level in range(2, MAX_LEVEL + 1)]
+# The xp a prismatic lamp of each size takes a skill to, used at the start of each level. Always rising with level
+_PRISMATIC_REACH = {
+    size: [start + amount for start, amount in zip(_LEVEL_STARTS, amounts)]
+    for size, amounts in PrismaticXpReward.PRISMATIC_AMOUNTS.items()
+}
+
+
+def _prismatic_target(size: PrismaticXpReward.PrismaticSize, xp: int, required: int) -> int:
+    # The xp to train a skill to before using a prismatic lamp on it, to get from xp to required with the least
+    # training before and after. Below the first level the lamp reaches required from, every level leaves required
+    # less what the lamp gives still to train, so the best is the one it gives most at. From that level on, it's the
+    # training to get there
+    amounts = PrismaticXpReward.PRISMATIC_AMOUNTS[size]
+    level = level_for_xp(xp)
+    best, best_cost = xp, xp + max(0, required - xp - amounts[level])
+    reaching = bisect_right(_PRISMATIC_REACH[size], required, level + 1)
+    if reaching > level + 1:
+        most = amounts.index(max(amounts[level + 1:reaching]), level + 1, reaching)
+        if required - amounts[most] < best_cost:
+            best, best_cost = _LEVEL_STARTS[most], required - amounts[most]
+    if reaching <= MAX_LEVEL and _LEVEL_STARTS[reaching] < best_cost:
+        best = _LEVEL_STARTS[reaching]
+    return best
+
+
+class ExactResult:
+    def __init__(self, strategy: QuestStrategy, greedy_training_xp: int, lower_bound: int, proven: bool,
+                 nodes: int, elapsed: float):
+        self.strategy = strategy
+        self.training_xp = strategy.training_xp
+        self.greedy_training_xp = greedy_training_xp
+        # No plan needs less training than this. Equal to training_xp once proven
+        self.lower_bound = lower_bound
+        self.proven = proven
+        self.nodes = nodes
+        self.elapsed = elapsed
+
+    def to_record(self, quests: Mapping[int, Quest]) -> dict:
+        return {
+            'strategy': self.strategy.to_record(quests),
+            'greedy_training_xp': self.greedy_training_xp,
+            'lower_bound': self.lower_bound,
+            'proven': self.proven,
+            'nodes': self.nodes,
+            'elapsed': self.elapsed,
+        }
+
+    @staticmethod
+    def from_record(record: dict, quests: Mapping[int, Quest]) -> 'ExactResult':
+        return ExactResult(QuestStrategy.from_record(record['strategy'], quests), record['greedy_training_xp'],
+                           record['lower_bound'], record['proven'], record['nodes'], record['elapsed'])
+
+    @property
+    def gap(self) -> int:
+        # How much training the greedy plan does over this one
+        return self.greedy_training_xp - self.training_xp
+
+    @property
+    def optimality_gap(self) -> int:
+        # How far this plan could still be from the optimum
+        return self.training_xp - self.lower_bound
+
+
+def _combat_level(skills: SkillSet) -> int:
+    levels = levels_for_xp(skills.vector)
+    return Skills.calculate_combat_level({skill: levels[skill.ordinal] for skill in COMBAT_SKILLS})
+
+
+class _Node:
+    __slots__ = ('skills', 'done', 'qp', 'hoard', 'pool', 'cost', 'lamp_floor', 'steps')
+
+    def __init__(self, skills: SkillSet, done: int, qp: int, hoard: int, pool: [int], cost: int,
+                 steps: Optional[tuple]):
+        self.skills = skills
+        self.done = done
+        self.qp = qp
+        self.hoard = hoard
+        # The most xp the hoard could give, by reward skill group, for the lower bound
+        self.pool = pool
+        self.cost = cost
+        # Lamps used back to back commute, so they're only ever tried in one order, see _ExactSearch.expand
+        self.lamp_floor = 0
+        # (step, previous steps), newest first
+        self.steps = steps
+
+    def child(self, cost: int = 0) -> '_Node':
+        return _Node(self.skills.copy(), self.done, self.qp, self.hoard, list(self.pool), self.cost + cost, self.steps)
+
+    def record(self, *step):
+        self.steps = (step, self.steps)
+
+
+class _ExactSearch:
+    # Best-first branch and bound over the decisions the greedy solver makes heuristically.
+    #
+    # Completing a quest, or claiming a Claimable reward, never makes anything else harder: requirements only ever ask
+    # for more, and rewards only ever give more. So every node is first closed under those free moves, and the search
+    # only branches where the player is stuck, on:
+    #   - training a skill up to what one of the available quests needs
+    #   - training combat up to an available quest's combat requirement, with SkillSet.optimal_route_to_combat_level
+    #   - using a hoarded Choice or prismatic reward on a skill one of those would train
+    #   - training a skill up to the minimum level of a hoarded reward that could go towards what's still needed
+    #   - training a skill up to the level a hoarded prismatic lamp does the most from towards a requirement
+    # Nodes are ordered by training so far plus an admissible lower bound on the training still to come, so the first
+    # finished plan off the queue is optimal. States already reached as cheaply with at least as much xp are pruned,
+    # looked up by completed quests, hoard and skill levels
+    def __init__(self, player: Player, quest_list: Mapping[int, Quest], targets: [int]):
+        self.quests = sorted((quest_list[quest_id] for quest_id in targets), key=lambda q: q.sort_key)
+        self.bits = {quest.id: 1 << idx for idx, quest in enumerate(self.quests)}
+        self.goal = (1 << len(self.quests)) - 1
+        # Quest prereqs, in the catalog's bit positions, translated to these
+        by_position = {quest.position: self.bits[quest.id] for quest in self.quests}
+        self.prereq_masks = []
+        for quest in self.quests:
+            outstanding = list(bits(quest.prereq_mask & ~player.quests_completed))
+            if all(position in by_position for position in outstanding):
+                self.prereq_masks.append(sum(by_position[position] for position in outstanding))
+            else:
+                self.prereq_masks.append(None)
+
+        # Every reward gets a bit in the hoard mask. Lamps, the rewards the search can choose a skill for, are
+        # numbered non-prismatic first: prismatic lamps give more at higher levels, so they're best used last
+        rewards = [reward for quest in self.quests for reward in quest.xp_rewards]
+        rewards.sort(key=lambda reward: isinstance(reward, PrismaticXpReward))
+        self.rewards: [XpReward] = rewards
+        self.reward_bits = {reward: 1 << idx for idx, reward in enumerate(rewards)}
+        self.claimable_mask = sum(self.reward_bits[reward] for reward in rewards if isinstance(reward, ClaimableXpReward))
+        self.lamp_mask = sum(self.reward_bits[reward] for reward in rewards if isinstance(reward, ChoiceXpReward))
+        self.prismatic = [isinstance(reward, PrismaticXpReward) for reward in rewards]
+        self.skill_ordinals = {
+            reward.skills: [skill.ordinal for skill in SKILLS if skill in reward.skills] for reward in rewards
+        }
+        self.reward_ordinals = [self.skill_ordinals[reward.skills] for reward in rewards]
+        # Rewards with the same signature are interchangeable, only the first one in the hoard is ever branched on
+        self.signatures = [
+            (reward.size if self.prismatic[idx] else reward.amount(), reward.skills, reward.minimum_xp, self.prismatic[idx])
+            if isinstance(reward, ChoiceXpReward) else None
+            for idx, reward in enumerate(rewards)
+        ]
+
+        # For the lower bound, the most xp the rewards could give, pooled by the skills they can go to. Prismatic
+        # lamps are counted by size instead, what they're worth depends on the levels still to be reached.
+        # A pool is a slot per group for xp, followed by a slot per group and prismatic size for lamp counts
+        groups = {}
+        for reward in rewards:
+            groups.setdefault(reward.skills, len(groups))
+        self.group_ordinals = [self.skill_ordinals[skills] for skills in groups]
+        self.pool_size = len(groups) * (1 + len(_SIZES))
+        self.reward_slot = [
+            len(groups) + groups[reward.skills] * len(_SIZES) + _SIZES.index(reward.size) if self.prismatic[idx]
+            else groups[reward.skills]
+            for idx, reward in enumerate(rewards)
+        ]
+        self.reward_bound = [1 if self.prismatic[idx] else reward.amount() for idx, reward in enumerate(rewards)]
+        self.quest_rewards = [sum(self.reward_bits[reward] for reward in quest.xp_rewards) for quest in self.quests]
+
+        self.remaining_cache: dict[int, ([int], [int])] = {}
+        self.memo: dict[tuple, [(tuple, int)]] = {}
+
+    # Free moves
+
+    def _complete(self, node: _Node, idx: int):
+        quest = self.quests[idx]
+        node.done |= 1 << idx
+        node.qp += quest.quest_points
+        # Same as Player.complete_quest
+        claimed = []
+        for reward in quest.xp_rewards:
+            if isinstance(reward, ClaimableXpReward) and reward.is_claimable(node.skills):
+                claimed.append(reward)
+            if isinstance(reward, ImmediateXpReward) and reward.is_claimable(node.skills):
+                node.skills += reward.get_reward()
+            else:
+                self._hoard(node, self.reward_bits[reward].bit_length() - 1)
+        node.record('quest', quest, claimed)
+
+    def _hoard(self, node: _Node, idx: int):
+        node.hoard |= 1 << idx
+        node.pool[self.reward_slot[idx]] += self.reward_bound[idx]
+
+    def _unhoard(self, node: _Node, idx: int):
+        node.hoard &= ~(1 << idx)
+        node.pool[self.reward_slot[idx]] -= self.reward_bound[idx]
+
+    def _available(self, node: _Node) -> [int]:
+        # The quests not done yet with nothing training can't fix standing in the way
+        available = []
+        for idx in bits(self.goal & ~node.done):
+            prereqs = self.prereq_masks[idx]
+            if prereqs is not None and prereqs & node.done == prereqs and self.quests[idx].qp_requirement <= node.qp:
+                available.append(idx)
+        return available
+
+    def close(self, node: _Node):
+        progress = True
+        while progress:
+            progress = False
+            for idx in bits(node.hoard & self.claimable_mask):
+                reward = self.rewards[idx]
+                if reward.is_claimable(node.skills):
+                    self._unhoard(node, idx)
+                    node.skills += reward.get_reward()
+                    node.record('claim', reward)
+                    progress = True
+            combat = _combat_level(node.skills)
+            for idx in self._available(node):
+                quest = self.quests[idx]
+                if quest.combat_requirement <= combat and quest.skill_prereqs.dominated_by(node.skills):
+                    self._complete(node, idx)
+                    progress = True
+
+    # Bounding
+
+    def _remaining(self, remaining: int) -> ([int], [int]):
+        # What the quests left need, and the most xp their rewards could give. Siblings in the search mostly share
+        # this, so it's cached
+        cached = self.remaining_cache.get(remaining)
+        if cached is None:
+            need = [0] * SKILL_COUNT
+            pool = [0] * self.pool_size
+            for idx in bits(remaining):
+                need = list(map(max, need, self.quests[idx].skill_prereqs.vector))
+                for reward_idx in bits(self.quest_rewards[idx]):
+                    pool[self.reward_slot[reward_idx]] += self.reward_bound[reward_idx]
+            cached = self.remaining_cache[remaining] = (need, pool)
+        return cached
+
+    def lower_bound(self, node: _Node) -> (int, int):
+        # An admissible bound on the training still needed, and the xp still missing before lamps, to break ties
+        remaining = self.goal & ~node.done
+        if not remaining:
+            return 0, 0
+        need, pool = self._remaining(remaining)
+        residual = [max(0, n - xp) for n, xp in zip(need, node.skills.vector)]
+
+        # Rewards can't make up more than what's missing in the skills they can go to
+        deficit = sum(residual)
+        pool = list(map(int.__add__, pool, node.pool))
+        usable = 0
+        for group, ordinals in enumerate(self.group_ordinals):
+            missing = [o for o in ordinals if residual[o]]
+            if not missing:
+                continue
+            amount = pool[group]
+            # A prismatic lamp used before a requirement is met gives at most what it does at the required level
+            lamps = len(self.group_ordinals) + group * len(_SIZES)
+            if any(pool[lamps:lamps + len(_SIZES)]):
+                level = level_for_xp(max(need[o] for o in missing))
+                amount += sum(count * PrismaticXpReward.PRISMATIC_AMOUNTS[size][level]
+                              for size, count in zip(_SIZES, pool[lamps:lamps + len(_SIZES)]))
+            if amount:
+                usable += min(amount, sum([residual[o] for o in missing]))
+        return max(0, deficit - usable), deficit
+
+    def dominated(self, node: _Node) -> bool:
+        xp = tuple(node.skills.vector)
+        key = (node.done, node.hoard, bytes(levels_for_xp(xp)))
+        entries = self.memo.setdefault(key, [])
+        for other_xp, other_cost in entries:
+            if other_cost <= node.cost and all(map(int.__ge__, other_xp, xp)):
+                return True
+        entries[:] = [(other_xp, other_cost) for other_xp, other_cost in entries
+                      if not (node.cost <= other_cost and all(map(int.__ge__, xp, other_xp)))]
+        entries.append((xp, node.cost))
+        return False
+
+    # Branching
+
+    def expand(self, node: _Node) -> [_Node]:
+        combat = _combat_level(node.skills)
+        xp = node.skills.vector
+
+        children = []
+        trained = set()
+        wanted = set()
+        targets: dict[int, set[int]] = {}
+        for idx in self._available(node):
+            quest = self.quests[idx]
+            for skill, required in quest.skill_prereqs.items():
+                if required > xp[skill.ordinal]:
+                    wanted.add(skill.ordinal)
+                    targets.setdefault(skill.ordinal, set()).add(required)
+                    if (skill, required) not in trained:
+                        trained.add((skill, required))
+                        child = node.child(required - xp[skill.ordinal])
+                        child.skills[skill] = required
+                        child.record('train', skill, required, required - xp[skill.ordinal])
+                        children.append(child)
+            if quest.combat_requirement > combat:
+                route = SkillSet.optimal_route_to_combat_level(quest.combat_requirement, node.skills.copy())
+                wanted.update(skill.ordinal for skill in route)
+                if ('combat', quest.combat_requirement) not in trained:
+                    trained.add(('combat', quest.combat_requirement))
+                    child = node.child(route.total())
+                    child.skills += route
+                    child.record('combat', [(skill, child.skills[skill], gained) for skill, gained in route.items()])
+                    children.append(child)
+
+        # Training just far enough to unlock a reward, then using it, can beat training straight to the requirement
+        need, _ = self._remaining(self.goal & ~node.done)
+        for idx in bits(node.hoard & (self.claimable_mask | self.lamp_mask)):
+            reward = self.rewards[idx]
+            for ordinal in self.reward_ordinals[idx]:
+                required = reward.minimum_xp
+                if xp[ordinal] < required and (required < need[ordinal] or ordinal in wanted) \
+                        and (SKILLS[ordinal], required) not in trained:
+                    trained.add((SKILLS[ordinal], required))
+                    child = node.child(required - xp[ordinal])
+                    child.skills[SKILLS[ordinal]] = required
+                    child.record('train', SKILLS[ordinal], required, required - xp[ordinal])
+                    children.append(child)
+
+        # A prismatic lamp gives more the higher the level it's used at, so training part of the way to a requirement
+        # before using it can beat using it straight away, or training all the way, see _prismatic_target
+        signatures = set()
+        for idx in bits(node.hoard & self.lamp_mask):
+            if not self.prismatic[idx] or self.signatures[idx] in signatures:
+                continue
+            signatures.add(self.signatures[idx])
+            reward = self.rewards[idx]
+            for ordinal in self.reward_ordinals[idx]:
+                for required in targets.get(ordinal, ()):
+                    target = _prismatic_target(reward.size, max(xp[ordinal], reward.minimum_xp), required)
+                    if xp[ordinal] < target < required and (SKILLS[ordinal], target) not in trained:
+                        trained.add((SKILLS[ordinal], target))
+                        child = node.child(target - xp[ordinal])
+                        child.skills[SKILLS[ordinal]] = target
+                        child.record('train', SKILLS[ordinal], target, target - xp[ordinal])
+                        children.append(child)
+
+        # Lamps used one after another commute, bar prismatic lamps growing with level, so they're only tried in
+        # reward order. Training in between starts the order over
+        seen = set()
+        for idx in bits(node.hoard & self.lamp_mask & ~((1 << node.lamp_floor) - 1)):
+            if self.signatures[idx] in seen:
+                continue
+            seen.add(self.signatures[idx])
+            reward = self.rewards[idx]
+            for ordinal in self.reward_ordinals[idx]:
+                skill = SKILLS[ordinal]
+                if ordinal in wanted and reward.is_claimable(node.skills, skill):
+                    child = node.child()
+                    self._unhoard(child, idx)
+                    child.lamp_floor = idx + 1
+                    child.skills += reward.get_reward(skill_choice=skill, player_skills=node.skills)
+                    child.record('lamp', reward, skill)
+                    children.append(child)
+
+        for child in children:
+            self.close(child)
+        return children
+
+    def dive(self, node: _Node, limit: int, deadline: float) -> Optional[_Node]:
+        # Follows the most promising child all the way down. Lamps cost nothing, so the bound alone would have the
+        # search try every way of using them before any training; this finds a good plan to prune against first
+        while node.done != self.goal:
+            if monotonic() > deadline:
+                return None
+            best = None
+            for child in self.expand(node):
+                bound, deficit = self.lower_bound(child)
+                key = (child.cost + bound, deficit)
+                if key[0] < limit and (best is None or key < best[0]):
+                    best = (key, child)
+            if best is None:
+                return None
+            node = best[1]
+        return node
+
+    def strategy(self, node: _Node) -> QuestStrategy:
+        steps = []
+        link = node.steps
+        while link is not None:
+            step, link = link
+            steps.append(step)
+
+        strategy = QuestStrategy()
+        # Quests completed since the last training, whose lamps can be listed first thing under them
+        untrained = set()
+        for kind, *args in reversed(steps):
+            if kind == 'quest':
+                quest, claimed = args
+                strategy.add_quest(quest, claimed)
+                untrained.add(quest.id)
+            elif kind == 'claim':
+                strategy.add_reward(args[0])
+            elif kind == 'lamp':
+                reward, skill = args
+                if isinstance(reward, ClaimableChoiceXpReward) or reward.quest_id not in untrained:
+                    strategy.add_reward(ClaimedChoiceXpReward(reward, skill))
+                else:
+                    strategy.push_reward(ClaimedChoiceXpReward(reward, skill), reward.quest_id)
+            elif kind == 'train':
+                skill, required, gained = args
+                strategy.add_reward(Training(skill, required, gained))
+                untrained.clear()
+            elif kind == 'combat':
+                for skill, target, gained in args[0]:
+                    strategy.add_reward(Training(skill, target, gained))
+                untrained.clear()
+        strategy.training_xp = node.cost
+        return strategy
+
+
+def exact_search(player: Player, quest_list: Mapping[int, Quest], greedy: QuestStrategy,
+                 node_limit: int = 20000, time_limit: float = 10.0) -> ExactResult:
+    # greedy is the greedy solver's plan for the same player. It sets which quests have to be completed, and its
+    # training is the bound to beat. If nothing beats it, or the limits run out first, it's what is returned
+    started = monotonic()
+    search = _ExactSearch(player, quest_list, list(greedy))
+
+    root = _Node(player.skills.copy(), 0, player.quest_points, 0, [0] * search.pool_size, 0, None)
+    search.close(root)
+
+    best, best_cost = None, greedy.training_xp
+    dive = search.dive(root, best_cost, started + time_limit)
+    if dive is not None:
+        best, best_cost = dive, dive.cost
+    # Ordered by bound, then by xp still missing, so ties dive towards finishing
+    order = count()
+    bound, deficit = search.lower_bound(root)
+    queue = [(bound, deficit, next(order), root)]
+    lower_bound = bound
+    nodes = 0
+
+    while queue:
+        bound, deficit, _, node = heappop(queue)
+        if bound >= best_cost:
+            queue = []
+            break
+        if node.done == search.goal:
+            best, best_cost = node, node.cost
+            queue = []
+            break
+        if nodes >= node_limit or monotonic() - started > time_limit:
+            # Everything still queued is at least this far off
+            lower_bound = bound
+            heappush(queue, (bound, deficit, next(order), node))
+            break
+        nodes += 1
+
+        for child in search.expand(node):
+            child_bound, child_deficit = search.lower_bound(child)
+            child_bound += child.cost
+            if child_bound < best_cost and not search.dominated(child):
+                heappush(queue, (child_bound, child_deficit, next(order), child))
+
+    proven = not queue
+    strategy = search.strategy(best) if best is not None else greedy
+    return ExactResult(strategy, greedy.training_xp, strategy.training_xp if proven else lower_bound, proven,
+                       nodes, monotonic() - started)
@@ -0,0 +1,163 @@
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+__all__ = ['Hold', 'SingleFlight', 'get_flights']
+
+# Set to a directory to also coalesce solves across processes on the host. That only saves work if they share a cache
+# too, see cache.CACHE_DB_ENV
+FLIGHT_DIR_ENV = 'QUEST_FLIGHT_DIR'
+# The longest anyone waits on someone else's solve before going ahead with their own
+FLIGHT_TIMEOUT = 60.0
+LOCK_POLL = 0.05
+
+
+class _Flight:
+    __slots__ = ('lock', 'users', 'result')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users = 0
+        # Whatever the last holder left for the ones waiting behind it
+        self.result = None
+
+
+class Hold:
+    # Holding a key in a SingleFlight. Released once the work is done, or abandoned, or when garbage collected
+    def __init__(self, flights: 'SingleFlight', key: str, flight: _Flight, held: bool, waited: bool, file):
+        self._flights = flights
+        self._key = key
+        self._flight = flight
+        self._held = held
+        self._file = file
+        self._released = False
+        # Whether someone else held the key first, so whatever they were doing may have been done already
+        self.waited = waited
+
+    @property
+    def result(self):
+        return self._flight.result
+
+    @result.setter
+    def result(self, value):
+        self._flight.result = value
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        if self._file is not None:
+            # Removed while still locked, so lock files don't pile up. Anyone who opened it in the meantime notices
+            # it's gone once they lock it, see SingleFlight._lock_file
+            try:
+                os.unlink(self._file.name)
+            except FileNotFoundError:
+                pass
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+        if self._held:
+            self._flight.lock.release()
+        self._flights._leave(self._key, self._flight)
+
+    def __enter__(self) -> 'Hold':
+        return self
+
+    def __exit__(self, *_):
+        self.release()
+
+    def __del__(self):
+        self.release()
+
+
+class SingleFlight:
+    # One caller at a time per key, so identical solves running at once are done once: the first caller solves, and
+    # everyone who came in while it did gets its result. acquire() blocks until the caller holds the key. Within a
+    # process, a holder hands its result straight on through Hold.result. With a lock directory, keys are held across
+    # processes too, and results are passed on through the shared cache
+    def __init__(self, lock_dir: Optional[Path] = None, timeout: float = FLIGHT_TIMEOUT):
+        self.lock_dir = lock_dir if fcntl is not None else None
+        self.timeout = timeout
+        # Reentrant, a Hold collected while it's held releases itself
+        self._lock = threading.RLock()
+        self._flights: dict[str, _Flight] = {}
+
+    def _leave(self, key: str, flight: _Flight):
+        with self._lock:
+            flight.users -= 1
+            if not flight.users and self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def _lock_file(self, key: str, deadline: float) -> (Optional[object], bool):
+        # The key's lock file, locked, or None if it stayed locked until deadline, and whether it had to wait. Every
+        # key has a file of its own, so unrelated keys never wait on each other
+        self.lock_dir.mkdir(parents=True, exist_ok=True)
+        path = self.lock_dir / f'{hashlib.sha256(key.encode()).hexdigest()}.lock'
+        waited = False
+        while True:
+            file = open(path, 'a+b')
+            while True:
+                try:
+                    fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    waited = True
+                    if time.monotonic() > deadline:
+                        file.close()
+                        return None, waited
+                    time.sleep(LOCK_POLL)
+            # The last holder removes the file once it's done, a lock on a file that's gone doesn't hold the key
+            try:
+                if os.stat(path).st_ino == os.fstat(file.fileno()).st_ino:
+                    return file, waited
+            except FileNotFoundError:
+                pass
+            file.close()
+
+    def acquire(self, key: str) -> Hold:
+        # Past the timeout, goes ahead without holding the key, rather than wait on a holder that may be stuck
+        deadline = time.monotonic() + self.timeout
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+            flight.users += 1
+
+        held = flight.lock.acquire(blocking=False)
+        waited = not held
+        if not held:
+            held = flight.lock.acquire(timeout=self.timeout)
+
+        file = None
+        if self.lock_dir is not None:
+            file, waited_for_file = self._lock_file(key, deadline)
+            waited = waited or waited_for_file
+        return Hold(self, key, flight, held, waited, file)
+
+    def __len__(self):
+        return len(self._flights)
+
+
+_lock = threading.Lock()
+_flights: Optional[SingleFlight] = None
+
+
+def get_flights() -> SingleFlight:
+    global _flights
+
+    flights = _flights
+    if flights is not None:
+        return flights
+
+    with _lock:
+        if _flights is None:
+            path = os.environ.get(FLIGHT_DIR_ENV)
+            _flights = SingleFlight(Path(path) if path else None)
+        return _flights
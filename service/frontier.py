@@ -0,0 +1,144 @@
+from heapq import heappop, heappush
+from operator import attrgetter
+from typing import Mapping, Optional
+
+from .model import Player
+from .model.quest import Quest
+from .model.skillset import SKILL_COUNT
+
+__all__ = ['Frontier', 'build_quest_postreqs']
+
+
+def build_quest_postreqs(quests: Mapping[int, Quest]) -> dict[int, [int]]:
+    res = {}
+
+    for quest_id, quest in quests.items():
+        for prereq_id in quest.quest_prereqs:
+            if prereq_id not in res:
+                res[prereq_id] = []
+            res[prereq_id].append(quest_id)
+
+    return res
+
+
+class Frontier:
+    # The quests whose prerequisite quests are all done, indexed by whatever else still blocks them.
+    # Every outstanding skill, combat and quest point requirement is a blocker, filed in a heap by its threshold.
+    # When the player's stats go up, only the heap entries that are now met are popped, and a quest moves to the
+    # eligible queue once its last blocker clears. Requirements are judged exactly like Quest.satisfies_requirements
+    def __init__(self, quests: Mapping[int, Quest], player: Player):
+        self._quests = quests
+        self._player = player
+        self._postreqs = build_quest_postreqs(quests)
+        # For service.metrics: quests and single requirements checked against the player's stats, and sorts
+        self.requirement_checks = 0
+        self.sorts = 0
+
+        self._prereqs_left: dict[int, int] = {}
+        for quest_id, quest in quests.items():
+            if not quest.bit & player.quests_completed:
+                self._prereqs_left[quest_id] = (quest.prereq_mask & ~player.quests_completed).bit_count()
+
+        self._blockers: dict[int, int] = {}
+        self._skill_waiting: [[(int, tuple, int)]] = [[] for _ in range(SKILL_COUNT)]
+        self._combat_waiting: [(int, tuple, int)] = []
+        self._qp_waiting: [(int, tuple, int)] = []
+        self._eligible: [(tuple, int)] = []
+        self._sync_stats()
+
+        for quest_id, prereqs_left in self._prereqs_left.items():
+            if not prereqs_left:
+                self._add(quest_id)
+
+    def __bool__(self):
+        return bool(self._blockers)
+
+    def __len__(self):
+        return len(self._blockers)
+
+    def _sync_stats(self):
+        self._xp = list(self._player.skills.vector)
+        self._combat = self._player.combat_level
+        self._qp = self._player.quest_points
+
+    def _add(self, quest_id: int):
+        quest = self._quests[quest_id]
+        key = quest.sort_key
+        blockers = 0
+        self.requirement_checks += 1
+
+        for ordinal, xp in quest.skill_thresholds:
+            if xp > self._xp[ordinal]:
+                heappush(self._skill_waiting[ordinal], (xp, key, quest_id))
+                blockers += 1
+        if quest.combat_requirement > self._combat:
+            heappush(self._combat_waiting, (quest.combat_requirement, key, quest_id))
+            blockers += 1
+        if quest.qp_requirement > self._qp:
+            heappush(self._qp_waiting, (quest.qp_requirement, key, quest_id))
+            blockers += 1
+
+        self._blockers[quest_id] = blockers
+        if not blockers:
+            heappush(self._eligible, (key, quest_id))
+
+    def _clear(self, waiting: [(int, tuple, int)], value):
+        while waiting and waiting[0][0] <= value:
+            _, key, quest_id = heappop(waiting)
+            self.requirement_checks += 1
+            if quest_id in self._blockers:
+                self._blockers[quest_id] -= 1
+                if not self._blockers[quest_id]:
+                    heappush(self._eligible, (key, quest_id))
+
+    def _rebuild(self):
+        pending = list(self._blockers)
+        self._blockers = {}
+        self._skill_waiting = [[] for _ in range(SKILL_COUNT)]
+        self._combat_waiting = []
+        self._qp_waiting = []
+        self._eligible = []
+        for quest_id in pending:
+            self._add(quest_id)
+
+    def refresh(self):
+        old_xp, old_combat, old_qp = self._xp, self._combat, self._qp
+        self._sync_stats()
+
+        if self._combat < old_combat or self._qp < old_qp or any(new < old for new, old in zip(self._xp, old_xp)):
+            # Stats only ever go up during a solve. If something lowered them, start over rather than un-clear blockers
+            self._rebuild()
+            return
+
+        for ordinal, (new, old) in enumerate(zip(self._xp, old_xp)):
+            if new != old:
+                self._clear(self._skill_waiting[ordinal], new)
+        if self._combat != old_combat:
+            self._clear(self._combat_waiting, self._combat)
+        if self._qp != old_qp:
+            self._clear(self._qp_waiting, self._qp)
+
+    def pop_eligible(self) -> Optional[Quest]:
+        self.refresh()
+        while self._eligible:
+            _, quest_id = heappop(self._eligible)
+            if quest_id in self._blockers:
+                del self._blockers[quest_id]
+                return self._quests[quest_id]
+        return None
+
+    def complete(self, quest: Quest):
+        # Call once the player has completed the quest, to release everything that was waiting on it
+        self._blockers.pop(quest.id, None)
+        self._prereqs_left.pop(quest.id, None)
+        self.refresh()
+        for postreq_id in self._postreqs.get(quest.id, []):
+            if postreq_id in self._prereqs_left:
+                self._prereqs_left[postreq_id] -= 1
+                if not self._prereqs_left[postreq_id]:
+                    self._add(postreq_id)
+
+    def pending(self) -> [Quest]:
+        # Every quest in the frontier, easiest first
+        self.sorts += 1
+        return sorted((self._quests[quest_id] for quest_id in self._blockers), key=attrgetter('sort_key'))
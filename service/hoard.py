@@ -0,0 +1,221 @@
+from bisect import bisect_left, insort
+from functools import lru_cache
+from itertools import count
+from typing import Iterable, Iterator, Optional
+
+from .model.levels import level_for_xp
+from .model.rewards import ChoiceXpReward, ClaimableXpReward, ImmediateXpReward, PrismaticXpReward, TieredXpReward, \
+    XpReward
+from .model.skills import Skills
+from .model.skillset import SKILLS, SKILL_COUNT, SkillSet
+
+__all__ = ['RewardHoard']
+
+# Entries are (amount or prismatic size, insertion order, reward), so each bucket sorts by amount and ties go to
+# whichever reward was hoarded first
+_Entry = tuple[int, int, XpReward]
+
+
+@lru_cache(maxsize=None)
+def _skill_ordinals(skills: Skills) -> (int, ...):
+    # Flag membership is slow, and rewards only ever use a handful of skill combinations
+    return tuple(skill.ordinal for skill in SKILLS if skill in skills)
+
+
+@lru_cache(maxsize=None)
+def _max_prismatic_amount(size: PrismaticXpReward.PrismaticSize) -> int:
+    return max(PrismaticXpReward.PRISMATIC_AMOUNTS[size])
+
+
+def _nearest(bucket: [_Entry], gap: int) -> Optional[_Entry]:
+    # The smallest amount at or above the gap and the largest below it are the only contenders
+    i = bisect_left(bucket, (gap,))
+    above = bucket[i] if i < len(bucket) else None
+    if not i:
+        return above
+    below = bucket[bisect_left(bucket, (bucket[i - 1][0],))]
+    if above is None or gap - below[0] <= above[0] - gap:
+        return below
+    return above
+
+
+class RewardHoard:
+    # The rewards collected but not used yet, indexed for XpReward selection in the solver.
+    #
+    # Choice rewards are filed under every skill they can go to, and prismatic lamps likewise by size, each bucketed by
+    # the xp the skill needs before they can be used. Claimable rewards always give their own skill and don't care
+    # which skill they're used for, so they're bucketed by the skill and xp that unlocks them.
+    # next_lamp() picks exactly what sorting the whole hoard by XpReward.__lt__ and taking the reward whose amount is
+    # closest to the gap would: non-prismatic rewards before prismatic ones, then smaller amounts (or sizes) first.
+    #
+    # Changes are logged, so the solver can try rewards out and rollback() to a checkpoint() afterwards
+    def __init__(self, rewards: Iterable[XpReward] = ()):
+        self._order = count()
+        self._seq: dict[XpReward, int] = {}
+        self._choices: [dict[int, [_Entry]]] = [{} for _ in range(SKILL_COUNT)]
+        self._prismatics: [dict[int, [_Entry]]] = [{} for _ in range(SKILL_COUNT)]
+        self._claimables: dict[(Skills, int), [_Entry]] = {}
+        # Anything the buckets don't model is checked the slow way
+        self._others: [_Entry] = []
+        # The buckets each reward goes in, worked out the first time it's added. Buckets are never dropped, so they stay
+        # valid however often the reward is removed and added back
+        self._reward_buckets: dict[XpReward, [[_Entry]]] = {}
+        self._log: [(bool, XpReward, int)] = []
+        self.update(rewards)
+
+    def __len__(self):
+        return len(self._seq)
+
+    def __bool__(self):
+        return bool(self._seq)
+
+    def __contains__(self, reward: XpReward):
+        return reward in self._seq
+
+    def __iter__(self) -> Iterator[XpReward]:
+        return iter(sorted(self._seq, key=self._seq.get))
+
+    def _buckets(self, reward: XpReward) -> [[_Entry]]:
+        buckets = self._reward_buckets.get(reward)
+        if buckets is None:
+            buckets = self._reward_buckets[reward] = self._find_buckets(reward)
+        return buckets
+
+    def _find_buckets(self, reward: XpReward) -> [[_Entry]]:
+        if isinstance(reward, PrismaticXpReward):
+            return [self._prismatics[ordinal].setdefault(reward.minimum_xp, []) for ordinal in _skill_ordinals(reward.skills)]
+        elif isinstance(reward, TieredXpReward):
+            return [self._others]
+        elif isinstance(reward, ChoiceXpReward):
+            return [self._choices[ordinal].setdefault(reward.minimum_xp, []) for ordinal in _skill_ordinals(reward.skills)]
+        elif isinstance(reward, ImmediateXpReward):
+            return [self._claimables.setdefault((reward.skills, getattr(reward, 'minimum_xp', 0)), [])]
+        return [self._others]
+
+    @staticmethod
+    def _entry(reward: XpReward, seq: int) -> _Entry:
+        if isinstance(reward, PrismaticXpReward):
+            return reward.size.value, seq, reward
+        elif isinstance(reward, (ChoiceXpReward, ImmediateXpReward)) and not isinstance(reward, TieredXpReward):
+            return reward.amount(), seq, reward
+        return 0, seq, reward
+
+    def _insert(self, reward: XpReward, seq: int):
+        self._seq[reward] = seq
+        entry = self._entry(reward, seq)
+        for bucket in self._buckets(reward):
+            insort(bucket, entry)
+
+    def _delete(self, reward: XpReward) -> int:
+        seq = self._seq.pop(reward)
+        entry = self._entry(reward, seq)
+        for bucket in self._buckets(reward):
+            del bucket[bisect_left(bucket, entry[:2])]
+        return seq
+
+    def add(self, reward: XpReward):
+        if reward in self._seq:
+            return
+        seq = next(self._order)
+        self._insert(reward, seq)
+        self._log.append((True, reward, seq))
+
+    def update(self, rewards: Iterable[XpReward]):
+        for reward in rewards:
+            self.add(reward)
+
+    def remove(self, reward: XpReward):
+        if reward not in self._seq:
+            raise KeyError(reward)
+        self._log.append((False, reward, self._delete(reward)))
+
+    def checkpoint(self) -> int:
+        return len(self._log)
+
+    def rollback(self, checkpoint: int):
+        while len(self._log) > checkpoint:
+            added, reward, seq = self._log.pop()
+            if added:
+                self._delete(reward)
+            else:
+                self._insert(reward, seq)
+
+    def commit(self):
+        # Forget the log, nothing before this point can be rolled back any more
+        self._log.clear()
+
+    def pop_claimable(self, player_skills: SkillSet) -> [ClaimableXpReward]:
+        # Takes every Claimable reward the player now meets the requirement for out of the hoard
+        ready = [
+            entry for (skill, minimum_xp), bucket in self._claimables.items() if minimum_xp <= player_skills[skill]
+            for entry in bucket if isinstance(entry[2], ClaimableXpReward)
+        ]
+        ready.sort(key=lambda entry: entry[1])
+        for _, _, reward in ready:
+            self.remove(reward)
+        return [reward for _, _, reward in ready]
+
+    def coverage(self) -> ([float], float):
+        # The most xp the rewards in the hoard could add between them, however they're used: by skill ordinal, every
+        # reward that can go to the skill at its largest amount, at any level for prismatic lamps, and in total, every
+        # reward once. Infinite for rewards whose amount isn't known up front
+        coverage = [0] * SKILL_COUNT
+        total = 0
+        for reward in self._seq:
+            if isinstance(reward, PrismaticXpReward):
+                amount = _max_prismatic_amount(reward.size)
+            elif isinstance(reward, (ChoiceXpReward, ImmediateXpReward)):
+                amount = reward.amount()
+            else:
+                amount = float('inf')
+            for ordinal in _skill_ordinals(reward.skills):
+                coverage[ordinal] += amount
+            total += amount
+        return coverage, total
+
+    def next_lamp(self, player_skills: SkillSet, xp_gap: SkillSet, skill: Skills) -> Optional[XpReward]:
+        # The usable reward whose amount, used on skill, is closest to filling its gap
+        gap = xp_gap[skill]
+        xp = player_skills[skill]
+        best = None
+
+        # Emptied buckets are kept, skip them before anything else
+        candidates = [
+            _nearest(bucket, gap) for minimum_xp, bucket in self._choices[skill.ordinal].items()
+            if bucket and minimum_xp <= xp
+        ]
+        candidates += [
+            _nearest(bucket, gap) for (claim_skill, minimum_xp), bucket in self._claimables.items()
+            if bucket and minimum_xp <= player_skills[claim_skill]
+        ]
+        for entry in candidates:
+            if entry is not None:
+                key = (abs(entry[0] - gap), 0, entry[0], entry[1])
+                if best is None or key < best[0]:
+                    best = (key, entry[2])
+
+        level = None
+        for minimum_xp, bucket in self._prismatics[skill.ordinal].items():
+            if minimum_xp > xp:
+                continue
+            if level is None:
+                level = level_for_xp(xp)
+            seen = set()
+            for size, seq, reward in bucket:
+                # Only the first lamp of each size can win, the rest would tie with it and were hoarded later
+                if size in seen:
+                    continue
+                seen.add(size)
+                key = (abs(PrismaticXpReward.PRISMATIC_AMOUNTS[reward.size][level] - gap), 1, size, seq)
+                if best is None or key < best[0]:
+                    best = (key, reward)
+
+        for _, seq, reward in self._others:
+            if reward.is_claimable(player_skills, skill):
+                prismatic = isinstance(reward, PrismaticXpReward)
+                amount = reward.amount(player_skills, skill)
+                key = (abs(amount - gap), int(prismatic), reward.size.value if prismatic else amount, seq)
+                if best is None or key < best[0]:
+                    best = (key, reward)
+
+        return best[1] if best is not None else None
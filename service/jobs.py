@@ -0,0 +1,226 @@
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from math import ceil
+from typing import Optional, Union
+
+from . import metrics
+from .catalog import get_catalog, warm_up
+from .exact import ExactResult
+from .model import SkillSet, Skills
+from .model.strategy import QuestStrategy
+from .service import get_exact_quest_strategy, stream_optimal_quest_strategy
+
+__all__ = ['Job', 'JobQueue', 'JobTimeout', 'QueueFull', 'get_job_queue']
+
+JOB_WORKERS_ENV = 'QUEST_JOB_WORKERS'
+JOB_QUEUE_ENV = 'QUEST_JOB_QUEUE'
+JOB_TIME_LIMIT_ENV = 'QUEST_JOB_TIME_LIMIT'
+DEFAULT_WORKERS = 2
+# Jobs queued or running at once, anything more is turned away
+DEFAULT_MAX_PENDING = 8
+DEFAULT_TIME_LIMIT = 10.0
+# Finished jobs are kept this long for their results to be fetched
+RESULT_TTL = 10 * 60
+
+KINDS = ('greedy', 'exact')
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f'Too many jobs queued, try again in {retry_after}s')
+        self.retry_after = retry_after
+
+
+class JobTimeout(Exception):
+    pass
+
+
+def _start_worker():
+    # Each worker loads the catalog once, up front, from the snapshot, and keeps it for every job it runs. Anything
+    # recorded while loading it is the worker's own business, not the parent's
+    warm_up()
+    metrics.drain()
+
+
+def _pool_context():
+    # Workers are started by a fork server, or spawned where there isn't one, never forked from the parent. The pool's
+    # made from a request thread, and a fork would copy whatever locks the parent's other threads held just then, e.g.
+    # the metrics lock, into a worker where they'd never be released
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        # The fork server imports the solver once, every worker it starts has it already
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+def _solve(kind: str, initial_quests: int, initial_stats: dict[str, int], target_quest: Optional[int],
+           time_limit: float) -> (str, dict, tuple):
+    # Runs in a worker. Returns the catalog version solved against, the result's record, and the metrics recorded in
+    # the worker since its last job, which is all that goes back to the parent. The exact search stops itself at the
+    # time limit, the greedy solver is checked on every step
+    deadline = time.perf_counter() + time_limit
+    catalog = get_catalog()
+    stats = SkillSet({Skills[name]: xp for name, xp in initial_stats.items()})
+    if kind == 'exact':
+        result = get_exact_quest_strategy(initial_quests, stats, time_limit=time_limit, target_quest=target_quest)
+        return catalog.version, result.to_record(catalog.quests), metrics.drain()
+
+    strategy, steps = stream_optimal_quest_strategy(initial_quests, stats, target_quest)
+    for _ in steps:
+        if time.perf_counter() > deadline:
+            steps.close()
+            raise JobTimeout(f'Gave up after {time_limit:g}s')
+    return catalog.version, strategy.to_record(catalog.quests), metrics.drain()
+
+
+class Job:
+    __slots__ = ('id', 'kind', 'future', 'submitted', 'finished')
+
+    def __init__(self, kind: str, future: Future):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.future = future
+        self.submitted = time.monotonic()
+        self.finished: Optional[float] = None
+
+    @property
+    def status(self) -> str:
+        # queued, running, done, timed out or failed
+        future = self.future
+        if not future.done():
+            return 'running' if future.running() else 'queued'
+        if future.cancelled():
+            return 'failed'
+        error = future.exception()
+        if error is None:
+            return 'done'
+        return 'timed out' if isinstance(error, JobTimeout) else 'failed'
+
+    @property
+    def error(self) -> Optional[str]:
+        if not self.future.done():
+            return None
+        if self.future.cancelled():
+            return 'Cancelled'
+        error = self.future.exception()
+        return str(error) if error is not None else None
+
+    def result(self) -> Union[QuestStrategy, ExactResult]:
+        # The finished plan, rebuilt against this process's catalog
+        version, record, _ = self.future.result(timeout=0)
+        catalog = get_catalog()
+        if version != catalog.version:
+            raise ValueError('The quest data changed while this job was running')
+        if self.kind == 'exact':
+            return ExactResult.from_record(record, catalog.quests)
+        return QuestStrategy.from_record(record, catalog.quests)
+
+
+class JobQueue:
+    # Solves run in a pool of worker processes, rather than on request threads. At most max_pending jobs are queued or
+    # running at once, past that submit() raises QueueFull with how long to wait before trying again. Every job has a
+    # time limit, past which it ends as timed out
+    def __init__(self, workers: int = DEFAULT_WORKERS, max_pending: int = DEFAULT_MAX_PENDING,
+                 time_limit: float = DEFAULT_TIME_LIMIT):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.time_limit = time_limit
+
+        self._lock = threading.Lock()
+        self._jobs: dict[str, Job] = {}
+        self._pending = 0
+        # How long the last few jobs took, to tell clients turned away when to come back
+        self._recent_seconds = 1.0
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=_pool_context(), initializer=_start_worker)
+        return self._pool
+
+    def _expire(self):
+        now = time.monotonic()
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished is not None and now - job.finished > RESULT_TTL]:
+            del self._jobs[job_id]
+
+    def _finished(self, job: Job):
+        with self._lock:
+            job.finished = time.monotonic()
+            self._pending -= 1
+            self._recent_seconds = 0.8 * self._recent_seconds + 0.2 * (job.finished - job.submitted)
+        metrics.inc('quest_jobs_total', kind=job.kind, status=job.status)
+        metrics.observe('quest_job_seconds', job.finished - job.submitted, kind=job.kind)
+        if job.status == 'done':
+            metrics.merge(job.future.result()[2])
+
+    def retry_after(self) -> int:
+        # Roughly how long until a slot frees up
+        return max(1, ceil(self._recent_seconds * self._pending / self.workers))
+
+    def submit(self, kind: str, initial_quests: int = 0, initial_stats: SkillSet = None, target_quest: int = None,
+               time_limit: float = None) -> Job:
+        if kind not in KINDS:
+            raise ValueError(f'Unknown solver {kind}')
+        time_limit = min(time_limit or self.time_limit, self.time_limit)
+        stats = {skill.name: xp for skill, xp in (initial_stats or SkillSet()).items()}
+
+        with self._lock:
+            self._expire()
+            if self._pending >= self.max_pending:
+                metrics.inc('quest_jobs_rejected_total', kind=kind)
+                raise QueueFull(self.retry_after())
+            try:
+                future = self._get_pool().submit(_solve, kind, initial_quests, stats, target_quest, time_limit)
+            except BrokenProcessPool:
+                # A worker died, taking the pool with it. Whatever was running on it has failed, start a new one
+                self._pool = None
+                future = self._get_pool().submit(_solve, kind, initial_quests, stats, target_quest, time_limit)
+            job = Job(kind, future)
+            self._jobs[job.id] = job
+            self._pending += 1
+        future.add_done_callback(lambda _: self._finished(job))
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job: Job, timeout: float) -> Job:
+        # Long polling: returns as soon as the job's finished, or after timeout seconds either way
+        wait([job.future], timeout=timeout)
+        return job
+
+    def __len__(self):
+        return self._pending
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+
+_lock = threading.Lock()
+_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    global _queue
+
+    queue = _queue
+    if queue is not None:
+        return queue
+
+    with _lock:
+        if _queue is None:
+            _queue = JobQueue(int(os.environ.get(JOB_WORKERS_ENV, DEFAULT_WORKERS)),
+                              int(os.environ.get(JOB_QUEUE_ENV, DEFAULT_MAX_PENDING)),
+                              float(os.environ.get(JOB_TIME_LIMIT_ENV, DEFAULT_TIME_LIMIT)))
+        return _queue
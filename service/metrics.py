@@ -0,0 +1,215 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+
+__all__ = ['ENABLED', 'SolveStats', 'TimedIterator', 'inc', 'observe', 'timer', 'record_solve', 'drain', 'merge',
+           'render']
+
+# Set to 0 to turn metrics off. Nothing is recorded or timed then, and the solvers only keep their per-solve counts
+METRICS_ENV = 'QUEST_METRICS'
+ENABLED = os.environ.get(METRICS_ENV, '1') != '0'
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Every metric, by name: its type, and its help text
+METRICS = {
+    'quest_requests_total': ('counter', 'Requests handled, by endpoint and status'),
+    'quest_request_seconds': ('histogram', 'Time until a response starts, by endpoint'),
+    'quest_phase_seconds': ('histogram', 'Time spent loading the catalog, solving and rendering, by phase'),
+    'quest_solves_total': ('counter', 'Solves run, by solver'),
+    'quest_solve_seconds': ('histogram', 'Time spent solving, by solver'),
+    'quest_solver_iterations_total': ('counter', 'Iterations of the greedy solver\'s main loop'),
+    'quest_solver_frontier_quests_total': ('counter', 'Quests in the frontier, summed over every iteration'),
+    'quest_solver_sorts_total': ('counter', 'Times the frontier was sorted to weigh up training'),
+    'quest_solver_requirement_checks_total': ('counter', 'Quest requirements checked against the player\'s stats'),
+    'quest_solver_lamps_total': ('counter', 'Lamps tried out while weighing up training'),
+    'quest_solver_training_total': ('counter', 'Times the solver had to fall back to training skills'),
+    'quest_solver_combat_routes_total': ('counter', 'Combat training routes worked out'),
+    'quest_jobs_total': ('counter', 'Background jobs finished, by solver and how they ended'),
+    'quest_jobs_rejected_total': ('counter', 'Background jobs turned away with the queue full, by solver'),
+    'quest_job_seconds': ('histogram', 'Time from queueing a background job to it finishing, by solver'),
+}
+
+
+class _Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        idx = bisect_left(BUCKETS, value)
+        if idx < len(BUCKETS):
+            self.counts[idx] += 1
+        self.sum += value
+        self.count += 1
+
+
+_lock = threading.Lock()
+# Both by (name, labels), labels as sorted (name, value) pairs
+_counters: dict[(str, tuple), float] = {}
+_histograms: dict[(str, tuple), _Histogram] = {}
+
+
+def inc(name: str, amount: float = 1, **labels):
+    if not ENABLED:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name: str, value: float, **labels):
+    if not ENABLED:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = _Histogram()
+        histogram.observe(value)
+
+
+@contextmanager
+def timer(name: str, **labels):
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+class TimedIterator:
+    # Passes through everything iterable gives, adding up the time spent waiting on it in elapsed
+    def __init__(self, iterable: Iterable):
+        self._iterator = iter(iterable)
+        self.elapsed = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            return next(self._iterator)
+        finally:
+            self.elapsed += time.perf_counter() - start
+
+    def close(self):
+        close = getattr(self._iterator, 'close', None)
+        if close is not None:
+            close()
+
+
+class SolveStats:
+    # What one greedy solve did, counted as it goes, and added to the process totals once it's over
+    __slots__ = ('iterations', 'frontier_quests', 'lamps', 'training', 'combat_routes', 'frontier')
+
+    def __init__(self):
+        self.iterations = 0
+        self.frontier_quests = 0
+        self.lamps = 0
+        self.training = 0
+        self.combat_routes = 0
+        # The solve's Frontier, which counts its own sorts and requirement checks
+        self.frontier = None
+
+
+def record_solve(stats: SolveStats, seconds: float, solver: str = 'greedy'):
+    if not ENABLED:
+        return
+    inc('quest_solves_total', solver=solver)
+    observe('quest_solve_seconds', seconds, solver=solver)
+    observe('quest_phase_seconds', seconds, phase='solve')
+    if stats is None:
+        return
+    inc('quest_solver_iterations_total', stats.iterations)
+    inc('quest_solver_frontier_quests_total', stats.frontier_quests)
+    inc('quest_solver_lamps_total', stats.lamps)
+    inc('quest_solver_training_total', stats.training)
+    inc('quest_solver_combat_routes_total', stats.combat_routes)
+    if stats.frontier is not None:
+        inc('quest_solver_sorts_total', stats.frontier.sorts)
+        inc('quest_solver_requirement_checks_total', stats.frontier.requirement_checks)
+
+
+def drain() -> (dict, dict):
+    # Takes everything recorded so far out of this process's totals, for another process to merge()
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: (h.counts, h.sum, h.count) for key, h in _histograms.items()}
+        _counters.clear()
+        _histograms.clear()
+    return counters, histograms
+
+
+def merge(drained: (dict, dict)):
+    if not ENABLED:
+        return
+    counters, histograms = drained
+    with _lock:
+        for key, value in counters.items():
+            _counters[key] = _counters.get(key, 0) + value
+        for key, (counts, total, count) in histograms.items():
+            histogram = _histograms.get(key)
+            if histogram is None:
+                histogram = _histograms[key] = _Histogram()
+            histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+            histogram.sum += total
+            histogram.count += count
+
+
+def _labels(labels: tuple, *extra: (str, str)) -> str:
+    labels = labels + extra
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}'
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _lines(extra: dict[str, (str, str, float)]) -> Iterator[str]:
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: (list(h.counts), h.sum, h.count) for key, h in _histograms.items()}
+
+    for name, (kind, description) in METRICS.items():
+        yield f'# HELP {name} {description}'
+        yield f'# TYPE {name} {kind}'
+        if kind == 'counter':
+            for (key, labels), value in sorted(counters.items()):
+                if key == name:
+                    yield f'{name}{_labels(labels)} {_number(value)}'
+            continue
+        for (key, labels), (counts, total, count) in sorted(histograms.items()):
+            if key != name:
+                continue
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS, counts):
+                cumulative += bucket
+                yield f'{name}_bucket{_labels(labels, ("le", repr(bound)))} {cumulative}'
+            yield f'{name}_bucket{_labels(labels, ("le", "+Inf"))} {count}'
+            yield f'{name}_sum{_labels(labels)} {_number(total)}'
+            yield f'{name}_count{_labels(labels)} {count}'
+
+    for name, (kind, description, value) in extra.items():
+        yield f'# HELP {name} {description}'
+        yield f'# TYPE {name} {kind}'
+        yield f'{name} {_number(value)}'
+
+
+def render(extra: dict[str, (str, str, float)] = None) -> str:
+    # Everything recorded so far, in the Prometheus text format, followed by the values in extra, as
+    # name: (type, help, value), for anything kept track of elsewhere
+    return '\n'.join(_lines(extra or {})) + '\n'
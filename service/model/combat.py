@@ -0,0 +1,150 @@
+from functools import lru_cache
+
+from .levels import XP_TABLE, level_for_xp, levels_for_xp
+from .skills import COMBAT_SKILLS, Skills
+
+__all__ = ['route_to_combat_level', 'MAX_TRAINED_LEVEL']
+
+# Combat skills are never trained past this
+MAX_TRAINED_LEVEL = 99
+
+_NEVER = 1 << 62
+
+
+class _Table:
+    # The cheapest way to reach every value of a term of the combat formula, from the levels the player has.
+    # costs[i] is the least xp for the term to be exactly base + i, choices[i] what it's made up of
+    __slots__ = ('base', 'costs', 'choices')
+
+    def __init__(self, base: int, costs: [int], choices: [tuple]):
+        self.base = base
+        self.costs = costs
+        self.choices = choices
+
+    @property
+    def top(self) -> int:
+        return self.base + len(self.costs) - 1
+
+    def at_least(self) -> '_Table':
+        # The same, but for the term to be at least base + i
+        costs, choices = list(self.costs), list(self.choices)
+        for i in range(len(costs) - 2, -1, -1):
+            if costs[i + 1] < costs[i]:
+                costs[i], choices[i] = costs[i + 1], choices[i + 1]
+        return _Table(self.base, costs, choices)
+
+    def __add__(self, other: '_Table') -> '_Table':
+        # The cheapest way for the sum of two terms to reach every value, a (min, +) convolution
+        costs = [_NEVER] * (len(self.costs) + len(other.costs) - 1)
+        choices = [()] * len(costs)
+        for i, (cost, choice) in enumerate(zip(self.costs, self.choices)):
+            for j, other_cost in enumerate(other.costs, i):
+                if cost + other_cost < costs[j]:
+                    costs[j] = cost + other_cost
+                    choices[j] = choice + other.choices[j - i]
+        return _Table(self.base + other.base, costs, choices)
+
+
+def _skill_table(xp: int, halved: bool = False) -> _Table:
+    # Levels from the current one up to MAX_TRAINED_LEVEL, or their halves, rounded down, for prayer and summoning.
+    # Choices are the levels trained to
+    level = level_for_xp(xp)
+    if level >= MAX_TRAINED_LEVEL:
+        return _Table(level // 2 if halved else level, [0], [(level,)])
+
+    levels = range(level, MAX_TRAINED_LEVEL + 1)
+    if halved:
+        # The lowest level giving each half
+        levels = [level] + list(range(2 * (level // 2 + 1), MAX_TRAINED_LEVEL + 1, 2))
+    costs = [0] + [XP_TABLE[target] - xp for target in levels[1:]]
+    return _Table(levels[0] // 2 if halved else levels[0], costs, [(target,) for target in levels])
+
+
+class _CombatTables:
+    # Everything route() needs for one set of combat xp. The formula is
+    #   0.25 * (1.3 * max(attack + strength, 2 * magic, 2 * ranged) + defence + constitution + prayer // 2 + summoning // 2)
+    # so the style and the rest are planned separately, and route() only has to pick how to split the level between them
+    def __init__(self, xps: (int, ...)):
+        attack, strength, defence, ranged, magic, constitution, prayer, summoning = xps
+        self.xps = xps
+        self.levels = tuple(levels_for_xp(xps))
+
+        melee = (_skill_table(attack) + _skill_table(strength)).at_least()
+        magic = _skill_table(magic)
+        ranged = _skill_table(ranged)
+        self.style_base = max(melee.base, 2 * magic.base, 2 * ranged.base)
+        top = max(melee.top, 2 * magic.top, 2 * ranged.top)
+        # The style reached by training one of the three, and which: 0 for melee, 1 for magic, 2 for ranged
+        self.style_costs = []
+        self.style_choices = []
+        for style in range(self.style_base, top + 1):
+            half = (style + 1) // 2
+            options = [
+                (melee.costs[style - melee.base] if style > melee.base else 0) if style <= melee.top else _NEVER,
+                (magic.costs[half - magic.base] if style > 2 * magic.base else 0) if style <= 2 * magic.top else _NEVER,
+                (ranged.costs[half - ranged.base] if style > 2 * ranged.base else 0) if style <= 2 * ranged.top else _NEVER,
+            ]
+            best = min(range(3), key=options.__getitem__)
+            choice = melee.choices[max(0, style - melee.base)] if best == 0 \
+                else magic.choices[max(0, half - magic.base)] if best == 1 \
+                else ranged.choices[max(0, half - ranged.base)]
+            self.style_costs.append(options[best])
+            self.style_choices.append((best, choice))
+
+        self.rest = (_skill_table(defence) + _skill_table(constitution) + _skill_table(prayer, True)
+                     + _skill_table(summoning, True)).at_least()
+
+    def _levels(self, style: int, rest: int) -> [int]:
+        # The levels the cheapest plan for the given style and the rest ends up on, in COMBAT_SKILLS order
+        levels = list(self.levels)
+        which, choice = self.style_choices[style - self.style_base]
+        if which == 0:
+            levels[0], levels[1] = choice
+        elif which == 1:
+            levels[4], = choice
+        else:
+            levels[3], = choice
+        levels[2], levels[5], levels[6], levels[7] = self.rest.choices[rest - self.rest.base]
+        return levels
+
+    def route(self, goal: int) -> ((int, int), ...):
+        # The least xp to reach combat level goal, as (skill ordinal, xp) for every skill trained
+        extra = {}
+        while True:
+            best = None
+            for idx, style_cost in enumerate(self.style_costs):
+                style = self.style_base + idx
+                # Exactly floor(0.25 * (1.3 * style + rest)) >= goal
+                rest = max(self.rest.base, -((13 * style - 40 * goal) // 10) + extra.get(style, 0))
+                if rest > self.rest.top:
+                    continue
+                cost = style_cost + self.rest.costs[rest - self.rest.base]
+                if best is None or cost < best[0]:
+                    best = (cost, style, rest)
+            if best is None:
+                raise ValueError(f'Combat level {goal} is out of reach')
+
+            _, style, rest = best
+            levels = self._levels(style, rest)
+            # Combat levels are worked out in floating point everywhere else, which can come out a hair short
+            if Skills.calculate_combat_level(dict(zip(COMBAT_SKILLS, levels))) >= goal:
+                break
+            extra[style] = extra.get(style, 0) + 1
+
+        return tuple(
+            (skill.ordinal, XP_TABLE[level] - xp)
+            for skill, xp, current, level in zip(COMBAT_SKILLS, self.xps, self.levels, levels) if level > current
+        )
+
+
+@lru_cache(maxsize=256)
+def _tables(xps: (int, ...)) -> _CombatTables:
+    return _CombatTables(xps)
+
+
+@lru_cache(maxsize=4096)
+def route_to_combat_level(xps: (int, ...), goal: int) -> ((int, int), ...):
+    # The least xp to train, as (skill ordinal, xp) pairs, for the combat xps given, in COMBAT_SKILLS order, to reach
+    # combat level goal. Building the tables for a new set of xps is a few (min, +) convolutions over at most 99
+    # levels, every goal after that is a scan over the style levels
+    return _tables(xps).route(goal)
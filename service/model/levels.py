@@ -0,0 +1,51 @@
+from array import array
+from bisect import bisect_left
+from typing import Iterable
+
+__all__ = ['XP_TABLE', 'MAX_LEVEL', 'MAX_XP', 'min_xp_for_level', 'level_for_xp', 'levels_for_xp', 'xp_to_level']
+
+MAX_LEVEL = 120
+# No skill can have more xp than this
+MAX_XP = 200_000_000
+
+# XP_TABLE[level] is the xp needed to reach level
+XP_TABLE = [-1, 0, 83, 174, 276, 388, 512, 650, 801, 969, 1154, 1358, 1584, 1833, 2107, 2411, 2746, 3115, 3523, 3973,
+            4470, 5018, 5624, 6291, 7028, 7842, 8740, 9730, 10824, 12031, 13363, 14833, 16456, 18247, 20224, 22406,
+            24815, 27473, 30408, 33648, 37224, 41171, 45529, 50339, 55649, 61512, 67983, 75127, 83014, 91721, 101333,
+            111945, 123660, 136594, 150872, 166636, 184040, 203254, 224466, 247866, 273742, 302288, 333804, 368599,
+            407015, 449428, 496254, 547953, 605032, 668051, 737627, 814445, 899257, 992895, 1096278, 1210421, 1336443,
+            1475581, 1629200, 1798808, 1986068, 2192818, 2421087, 2673114, 2951373, 3258594, 3597792, 3972294, 4385776,
+            4842295, 5346332, 5902831, 6517253, 7195629, 7944614, 8771558, 9684577, 10692629, 11805606, 13034431,
+            14391160, 15889109, 17542976, 19368992, 21385073, 23611006, 26068632, 26782069, 31777943, 35085654,
+            38737661, 42769801, 47221641, 52136869, 57563718, 63555443, 70170840, 77474828, 85539082, 94442737,
+            104273167]
+
+
+def min_xp_for_level(level: int) -> int:
+    if level < 1:
+        raise ValueError(f'Level must be greater than 0, found {level}')
+    elif level > MAX_LEVEL:
+        raise ValueError(f'Level cannot be greater than {MAX_LEVEL}, found {level}')
+    return XP_TABLE[level]
+
+
+def level_for_xp(xp: int) -> int:
+    if xp < 0:
+        raise ValueError(f'Experience cannot be negative, found {xp}')
+    # The first level whose xp threshold is at least xp
+    return min(bisect_left(XP_TABLE, xp), MAX_LEVEL)
+
+
+def levels_for_xp(xps: Iterable[int]) -> array:
+    # Batch version of level_for_xp, for whole skill vectors or many players' worth of xp at once
+    levels = array('B', [bisect_left(XP_TABLE, xp) for xp in xps])
+    # XP_TABLE[0] is -1, so only negative xp lands on level 0
+    if 0 in levels:
+        raise ValueError('Experience cannot be negative')
+    if MAX_LEVEL + 1 in levels:
+        return array('B', [level if level <= MAX_LEVEL else MAX_LEVEL for level in levels])
+    return levels
+
+
+def xp_to_level(level: int, current_xp: int = 0) -> int:
+    return max(0, min_xp_for_level(level) - current_xp)
@@ -1,8 +1,12 @@
-from math import floor
+from array import array
+from typing import Optional
 
 from .rewards import XpReward, ImmediateXpReward, ClaimableXpReward
-from .skills import Skills
-from .skillset import SkillSet
+from .levels import level_for_xp, levels_for_xp
+from .skills import COMBAT_SKILLS, Skills
+from .skillset import SKILL_COUNT, SkillSet
+
+COMBAT_ORDINALS = frozenset(skill.ordinal for skill in COMBAT_SKILLS)
 
 
 class Player:
@@ -10,37 +14,105 @@ class Player:
         initial_stats = initial_stats or SkillSet()
         self.skills = initial_stats
         self.quest_points = 1
-        self.quests_completed = set()
+        # Bitset of completed quests, by Quest.position
+        self.quests_completed = 0
         self._explicit_combat_level = 1
 
+        # Levels are derived from self.skills, and only brought up to date when read. The skills object and its version
+        # are remembered, so assigning a new SkillSet or mutating the current one in place both invalidate the cache
+        self._levels_source: Optional[SkillSet] = None
+        self._levels_version = -1
+        self._levels_xp = array('q', [0] * SKILL_COUNT)
+        self._levels = levels_for_xp(self._levels_xp)
+        self._combat_level = Skills.calculate_combat_level(
+            {skill: self._levels[skill.ordinal] for skill in COMBAT_SKILLS}
+        )
+
+        # Xp gained through gain(), as (skill, xp before, whether it was present), so it can be rolled back
+        self._log: [(Skills, int, bool)] = []
+
+    def _refresh_levels(self):
+        skills = self.skills
+        if skills is self._levels_source and skills.version == self._levels_version:
+            return
+
+        xp = skills.vector
+        old_xp = self._levels_xp
+        if xp != old_xp:
+            combat_changed = False
+            for ordinal in [ordinal for ordinal, (new, old) in enumerate(zip(xp, old_xp)) if new != old]:
+                level = level_for_xp(xp[ordinal])
+                if level != self._levels[ordinal]:
+                    self._levels[ordinal] = level
+                    combat_changed = combat_changed or ordinal in COMBAT_ORDINALS
+            self._levels_xp = array('q', xp)
+            if combat_changed:
+                self._combat_level = Skills.calculate_combat_level(
+                    {skill: self._levels[skill.ordinal] for skill in COMBAT_SKILLS}
+                )
+
+        self._levels_source = skills
+        self._levels_version = skills.version
+
+    def level(self, skill: Skills) -> int:
+        self._refresh_levels()
+        return self._levels[skill.ordinal]
+
     @property
     def combat_level(self) -> int:
-        return max(self._explicit_combat_level, Skills.calculate_combat_level({
-            Skills.ATTACK: Skills.level_for_xp(self.skills[Skills.ATTACK]),
-            Skills.STRENGTH: Skills.level_for_xp(self.skills[Skills.STRENGTH]),
-            Skills.DEFENCE: Skills.level_for_xp(self.skills[Skills.DEFENCE]),
-            Skills.RANGED: Skills.level_for_xp(self.skills[Skills.RANGED]),
-            Skills.MAGIC: Skills.level_for_xp(self.skills[Skills.MAGIC]),
-            Skills.CONSTITUTION: Skills.level_for_xp(self.skills[Skills.CONSTITUTION]),
-            Skills.PRAYER: Skills.level_for_xp(self.skills[Skills.PRAYER]),
-            Skills.SUMMONING: Skills.level_for_xp(self.skills[Skills.SUMMONING]),
-        }))
-
-    def complete_quest(self, quest: int, quest_points: int, rewards: [XpReward]) -> ([XpReward], set[XpReward]):
-        self.quests_completed.add(quest)
+        self._refresh_levels()
+        return max(self._explicit_combat_level, self._combat_level)
+
+    def complete_quest(self, quest_bit: int, quest_points: int, rewards: [XpReward]) -> ([XpReward], [XpReward]):
+        self.quests_completed |= quest_bit
         self.quest_points += quest_points
 
         claimed_rewards = []
-        hoarded_rewards = set()
+        hoarded_rewards = []
         for reward in rewards:
             if isinstance(reward, ClaimableXpReward) and reward.is_claimable(self.skills):
                 claimed_rewards.append(reward)
             if isinstance(reward, ImmediateXpReward) and reward.is_claimable(self.skills):
                 self.skills += reward.get_reward()
             else:
-                hoarded_rewards.add(reward)
+                hoarded_rewards.append(reward)
         return claimed_rewards, hoarded_rewards
 
+    # Speculating: the solver gains xp to try something out, then rolls back to a checkpoint, the same way as
+    # RewardHoard. Only the skills that changed are logged and put back, rather than copying every skill up front
+
+    def gain(self, xp: SkillSet):
+        skills = self.skills
+        for skill, amount in xp.items():
+            self._log.append((skill, skills[skill], skill in skills))
+            skills[skill] += amount
+
+    def checkpoint(self) -> int:
+        return len(self._log)
+
+    def rollback(self, checkpoint: int) -> [(Skills, int)]:
+        # Returns the skills put back and the xp they had, for apply() to redo without working the xp out again
+        skills = self.skills
+        undone = {}
+        while len(self._log) > checkpoint:
+            skill, xp, present = self._log.pop()
+            undone.setdefault(skill, skills[skill])
+            if present:
+                skills[skill] = xp
+            else:
+                del skills[skill]
+        return list(undone.items())
+
+    def apply(self, changes: [(Skills, int)]):
+        skills = self.skills
+        for skill, xp in changes:
+            self._log.append((skill, skills[skill], skill in skills))
+            skills[skill] = xp
+
+    def commit(self):
+        # Forget the log, nothing before this point can be rolled back any more
+        self._log.clear()
+
     def set_combat_level(self, value: int):
         self._explicit_combat_level = value
 
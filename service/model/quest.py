@@ -1,11 +1,12 @@
 import json
 from enum import Enum
+from typing import Iterable, Mapping
 
 from .player import Player
 from .skillset import SkillSet
 from .rewards import XpReward
 
-__all__ = ['Quest', 'Difficulty', 'load_quest_data']
+__all__ = ['Quest', 'Difficulty', 'load_quest_data', 'parse_quest_data', 'quest_positions', 'quest_mask']
 
 
 class OrderedEnum(Enum):
@@ -34,42 +35,110 @@ class Difficulty(OrderedEnum):
 
 
 class Quest:
-    def __init__(self, id: int, name: str, difficulty: Difficulty, combat_requirement: int, qp_requirement: int,
-                 quest_reqs: [int], skill_reqs: SkillSet, quest_points: int, rewards: [XpReward]):
-        self.id: int = id
-        self.name: str = name
-        self.difficulty = difficulty
-
-        self.qp_requirement = qp_requirement
-        self.combat_requirement = combat_requirement
-        self.combat_training_requirement = SkillSet.optimal_route_to_combat_level(combat_requirement)
-        self.quest_prereqs = set(quest_reqs)
-        self.skill_prereqs = skill_reqs
+    # Quests are built once per catalog and shared by every solve, so they're frozen. Everything the solver orders
+    # or filters them by is worked out here rather than on every comparison
+    __slots__ = ('id', 'name', 'difficulty', 'position', 'bit', 'qp_requirement', 'combat_requirement',
+                 'combat_training_requirement', 'quest_prereqs', 'prereq_mask', 'skill_prereqs', 'quest_points', 'xp_rewards',
+                 'total_requirements', 'requirement_xp', 'skill_thresholds', 'sort_key', 'location')
 
-        self.quest_points: int = quest_points
-        self.xp_rewards = rewards
+    def __init__(self, id: int, name: str, difficulty: Difficulty, combat_requirement: int, qp_requirement: int,
+                 quest_reqs: [int], skill_reqs: SkillSet, quest_points: int, rewards: [XpReward],
+                 combat_training_requirement: SkillSet = None, positions: dict[int, int] = None,
+                 location: (int, int) = None):
+        # positions maps quest ids to bits in the completed quests bitset, see quest_positions()
+        if positions is None:
+            positions = quest_positions([(id, quest_reqs)])
+        if combat_training_requirement is None:
+            combat_training_requirement = SkillSet.optimal_route_to_combat_level(combat_requirement)
+        total_requirements = skill_reqs + combat_training_requirement
+
+        init = super(Quest, self).__setattr__
+        init('id', id)
+        init('name', name)
+        init('difficulty', difficulty)
+        init('position', positions[id])
+        init('bit', 1 << positions[id])
+
+        init('qp_requirement', qp_requirement)
+        init('combat_requirement', combat_requirement)
+        init('combat_training_requirement', combat_training_requirement)
+        init('quest_prereqs', frozenset(quest_reqs))
+        init('prereq_mask', quest_mask(positions, quest_reqs))
+        init('skill_prereqs', skill_reqs)
+
+        init('quest_points', quest_points)
+        init('xp_rewards', tuple(rewards))
+
+        # The skill requirements plus the combat training needed to reach the combat requirement
+        init('total_requirements', total_requirements)
+        init('requirement_xp', total_requirements.total())
+        # (skill ordinal, xp) for every skill requirement, for the frontier's per-skill heaps
+        init('skill_thresholds', tuple((skill.ordinal, xp) for skill, xp in skill_reqs.items() if xp > 0))
+        # Easiest first: difficulty, then the total xp the requirements (including combat training) add up to.
+        # Ranking by total xp extends the old "requirements dominated by" partial order into a total one, which
+        # sorting and the solver's priority queue need. The id breaks any remaining ties
+        init('sort_key', (difficulty.value, self.requirement_xp, id))
+        # Where the quest starts, as (x, y) map coordinates in tiles, if known. Only used to cut down on travel, see
+        # service.travel
+        init('location', tuple(location) if location is not None else None)
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f'Quest is read-only, cannot set {key}')
+
+    def __delattr__(self, key):
+        raise AttributeError(f'Quest is read-only, cannot delete {key}')
+
+    def __setstate__(self, state):
+        _, slots = state
+        for key, value in slots.items():
+            super(Quest, self).__setattr__(key, value)
 
     def __lt__(self, other):
         if not isinstance(other, Quest):
             return False
-        return (self.difficulty, self.skill_prereqs + self.combat_training_requirement) \
-               < (other.difficulty, other.skill_prereqs+ other.combat_training_requirement)
+        return self.sort_key < other.sort_key
 
     def satisfies_requirements(self, player: Player):
         return all([
-            self.id not in player.quests_completed,
-            self.skill_prereqs <= player.skills,
+            not self.bit & player.quests_completed,
+            self.skill_prereqs.dominated_by(player.skills),
             self.combat_requirement <= player.combat_level,
             self.qp_requirement <= player.quest_points,
-            self.quest_prereqs <= player.quests_completed
+            not self.prereq_mask & ~player.quests_completed
         ])
 
 
+def quest_positions(quests: Iterable[tuple[int, Iterable[int]]]) -> dict[int, int]:
+    # Gives every quest id, from (id, prereq ids) pairs, a dense bit position: the quests in order, then any prereqs
+    # that aren't one of them. Those can only ever be met by the player's initial quests
+    positions = {}
+    dangling = []
+    for quest_id, quest_reqs in quests:
+        positions.setdefault(quest_id, len(positions))
+        dangling += quest_reqs
+    for quest_id in sorted(dangling):
+        positions.setdefault(quest_id, len(positions))
+    return positions
+
+
+def quest_mask(positions: Mapping[int, int], quest_ids: Iterable[int]) -> int:
+    # Ids with no position can't be a prereq of anything, so they're left out
+    mask = 0
+    for quest_id in quest_ids:
+        if quest_id in positions:
+            mask |= 1 << positions[quest_id]
+    return mask
+
+
 def load_quest_data(filename) -> dict[int, Quest]:
-    quest_list = {}
     with open(filename) as f:
         data = json.load(f)
+    return parse_quest_data(data)
 
+
+def parse_quest_data(data: list[dict]) -> dict[int, Quest]:
+    quest_list = {}
+    positions = quest_positions((quest["id"], quest.get("quest_requirements", [])) for quest in data)
     for quest in data:
         if quest["id"] in quest_list:
             raise ValueError
@@ -79,5 +148,7 @@ def load_quest_data(filename) -> dict[int, Quest]:
                                         quest_reqs=quest.get("quest_requirements", []),
                                         skill_reqs=SkillSet.from_json(quest.get("skill_requirements", [])),
                                         quest_points=quest.get("quest_points", 0),
-                                        rewards=[XpReward.from_json(reward, quest["id"]) for reward in quest.get("xp_rewards", [])])
+                                        rewards=[XpReward.from_json(reward, quest["id"]) for reward in quest.get("xp_rewards", [])],
+                                        positions=positions,
+                                        location=quest.get("location"))
     return quest_list
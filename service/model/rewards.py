@@ -2,6 +2,7 @@ from abc import ABCMeta, abstractmethod
 from enum import Enum, auto
 from math import floor
 
+from .levels import MAX_LEVEL, level_for_xp, min_xp_for_level
 from .skills import Skills
 from .skillset import SkillSet
 
@@ -103,7 +104,7 @@ class ImmediateXpReward(XpReward):
 class ChoiceXpReward(XpReward):
     def __init__(self, quest_id: int, amount: int, skills: Skills, minimum_level: int):
         super(ChoiceXpReward, self).__init__(quest_id, amount, skills)
-        self.minimum_xp = Skills.min_xp_for_level(minimum_level)
+        self.minimum_xp = min_xp_for_level(minimum_level)
 
     def get_reward(self, skill_choice: Skills, *args, **kwargs):
         if skill_choice not in self.skills:
@@ -123,7 +124,7 @@ class ClaimableXpReward(ImmediateXpReward):
     def __init__(self, quest_id: int, amount: int, skill: Skills, minimum_level: int, source: str):
         super(ClaimableXpReward, self).__init__(quest_id, amount, skill)
         self.claim_source = source
-        self.minimum_xp = Skills.min_xp_for_level(minimum_level)
+        self.minimum_xp = min_xp_for_level(minimum_level)
 
     def is_claimable(self, player_skills: SkillSet, *args, **kwargs):
         return self.minimum_xp <= player_skills[self.skills]
@@ -144,7 +145,7 @@ class ClaimableChoiceXpReward(ChoiceXpReward):
 class TieredXpReward(ClaimableChoiceXpReward):
     def __init__(self, quest_id: int, amount: int, skills: Skills, minimum_level: int, source: str):
         super(TieredXpReward, self).__init__(quest_id, amount, skills, minimum_level=0, source=source)
-        self.tier_requirement = Skills.min_xp_for_level(minimum_level)
+        self.tier_requirement = min_xp_for_level(minimum_level)
 
     def is_claimable(self, player_skills: SkillSet, *args, **kwargs):
         return all(p_skill >= self.tier_requirement for p_skill, p_value in player_skills if p_skill in self.skills)
@@ -171,6 +172,8 @@ class PrismaticXpReward(ChoiceXpReward):
         PrismaticSize.LARGE: lambda l: floor(-1E-5*l**5 + 2.3E-3*l**4 - 0.1118*l**3 + 2.329*l**2 + 37.437*l + 181.96),
         PrismaticSize.HUGE: lambda l: floor(-2E-5*l**5 + 4.6E-3*l**4 - 0.2237*l**3 + 4.6581*l**2 + 74.875*l + 363.92)
     }
+    # PRISMATIC_AMOUNTS[size][level], evaluated once rather than on every lamp considered
+    PRISMATIC_AMOUNTS = {size: tuple(reward(level) for level in range(MAX_LEVEL + 1)) for size, reward in PRISMATIC_REWARDS.items()}
 
     def __init__(self, quest_id: int, size: PrismaticSize, skills: Skills, minimum_level: int):
         super(PrismaticXpReward, self).__init__(quest_id=quest_id, amount=0, skills=skills, minimum_level=minimum_level)
@@ -187,13 +190,15 @@ class PrismaticXpReward(ChoiceXpReward):
         return SkillSet({skill_choice: self.amount(player_skills, skill_choice)})
 
     def amount(self, player_skills: SkillSet, skill_choice: Skills, *args, **kwargs):
-        return self.PRISMATIC_REWARDS[self.size](Skills.level_for_xp(player_skills[skill_choice]))
+        return self.PRISMATIC_AMOUNTS[self.size][level_for_xp(player_skills[skill_choice])]
 
     def __str__(self):
         return f'{self.size} xp lamp'
 
 
 class ClaimedChoiceXpReward:
+    __slots__ = ('reward', 'skill_choice')
+
     def __init__(self, reward: XpReward, skill_choice: Skills):
         self.reward = reward
         self.skill_choice = skill_choice
@@ -1,9 +1,10 @@
-from collections import Counter
 from enum import unique, Flag
 from functools import reduce
-from math import floor, ceil
+from math import floor
 from operator import or_ as _or_
 
+from .levels import level_for_xp, min_xp_for_level, xp_to_level
+
 __all__ = ['Skills']
 
 
@@ -17,18 +18,6 @@ def with_limits(enumeration):
     return enumeration
 
 
-XP_TABLE = [-1, 0, 83, 174, 276, 388, 512, 650, 801, 969, 1154, 1358, 1584, 1833, 2107, 2411, 2746, 3115, 3523, 3973,
-            4470, 5018, 5624, 6291, 7028, 7842, 8740, 9730, 10824, 12031, 13363, 14833, 16456, 18247, 20224, 22406,
-            24815, 27473, 30408, 33648, 37224, 41171, 45529, 50339, 55649, 61512, 67983, 75127, 83014, 91721, 101333,
-            111945, 123660, 136594, 150872, 166636, 184040, 203254, 224466, 247866, 273742, 302288, 333804, 368599,
-            407015, 449428, 496254, 547953, 605032, 668051, 737627, 814445, 899257, 992895, 1096278, 1210421, 1336443,
-            1475581, 1629200, 1798808, 1986068, 2192818, 2421087, 2673114, 2951373, 3258594, 3597792, 3972294, 4385776,
-            4842295, 5346332, 5902831, 6517253, 7195629, 7944614, 8771558, 9684577, 10692629, 11805606, 13034431,
-            14391160, 15889109, 17542976, 19368992, 21385073, 23611006, 26068632, 26782069, 31777943, 35085654,
-            38737661, 42769801, 47221641, 52136869, 57563718, 63555443, 70170840, 77474828, 85539082, 94442737,
-            104273167]
-
-
 @with_limits
 @unique
 class Skills(Flag):
@@ -37,24 +26,12 @@ class Skills(Flag):
         obj = object.__new__(cls)
         obj._value_ = value
         obj.initial = cls.min_xp_for_level(initial_level)
+        # Dense index of the skill, for fixed-width skill vectors
+        obj.ordinal = value.bit_length() - 1
         return obj
 
-    @staticmethod
-    def min_xp_for_level(level: int) -> int:
-        if level < 1:
-            raise ValueError(f'Level must be greater than 0, found {level}')
-        elif level > 120:
-            raise ValueError(f'Level cannot be greater than 1200, found {level}')
-        return XP_TABLE[level]
-
-    @staticmethod
-    def level_for_xp(xp: int) -> int:
-        if xp < 0:
-            raise ValueError(f'Experience cannot be negative, found {xp}')
-        for idx, max_xp in enumerate(XP_TABLE, start=1):
-            if xp <= max_xp:
-                return idx - 1
-        return 120
+    min_xp_for_level = staticmethod(min_xp_for_level)
+    level_for_xp = staticmethod(level_for_xp)
 
     ATTACK = 2 ** 0
     STRENGTH = 2 ** 1
@@ -103,55 +80,20 @@ class Skills(Flag):
                 + floor(levels.get(Skills.SUMMONING, 1) / 2)   # Summoning
         )
 
-    @staticmethod
-    def xp_to_level(level: int, current_xp = 0) -> int:
-        return max(0, Skills.min_xp_for_level(level) - current_xp)
+    xp_to_level = staticmethod(xp_to_level)
 
     @staticmethod
     def calculate_combat_level(levels: dict['Skills', int]) -> int:
         return floor(Skills.__calculate_combat_level_unfloored(levels))
 
-    # Adapted from https://runescape.wiki/w/Module:Combat_level
-    @staticmethod
-    def levels_for_combat_increase(levels: dict['Skills', int]) -> dict['Skills', int]:
-        result = {
-            Skills.ATTACK: 0,
-            Skills.STRENGTH: 0,
-            Skills.MAGIC: 0,
-            Skills.RANGED: 0,
-            Skills.DEFENCE: 0,
-            Skills.CONSTITUTION: 0,
-            Skills.PRAYER: 0,
-            Skills.SUMMONING: 0
-        }
-
-        attack_strength_level = levels.get(Skills.ATTACK, 1) + levels.get(Skills.STRENGTH, 1)
-
-        raw_combat_level = Skills.__calculate_combat_level_unfloored(levels)
-        cb_fractional = raw_combat_level % 1
-        result[Skills.CONSTITUTION] = result[Skills.DEFENCE] = ceil((1 - cb_fractional) * 4)
-        result[Skills.PRAYER] = ceil(((1 - cb_fractional) * 4)) * 2 - (levels.get(Skills.PRAYER, 1) % 2)
-        result[Skills.SUMMONING] = ceil(((1 - cb_fractional) * 4)) * 2 - (levels.get(Skills.SUMMONING, 1) % 2)
-
-        if attack_strength_level >= 2*levels.get(Skills.MAGIC, 1) and attack_strength_level >= 2*levels.get(Skills.RANGED, 1):
-            result[Skills.ATTACK] = result[Skills.STRENGTH] = ceil((1 - cb_fractional) / 0.325)
-            result[Skills.MAGIC] = ceil(
-                (attack_strength_level - 2*levels.get(Skills.MAGIC, 1)) / 2
-                + (1 - cb_fractional) / 0.65
-            )
-            result[Skills.RANGED] = ceil(
-                (attack_strength_level - 2*levels.get(Skills.RANGED, 1)) / 2
-                + (1 - cb_fractional) / 0.65
-            )
-        else:
-            result[Skills.ATTACK] = result[Skills.STRENGTH] = 2*max(levels.get(Skills.MAGIC, 1), levels.get(Skills.RANGED, 1))\
-                                                              - attack_strength_level\
-                                                              + ceil((1 - cb_fractional) / 0.325)
-            result[Skills.MAGIC] = ceil((1 - cb_fractional) / 0.65)
-            if levels.get(Skills.RANGED, 1) > levels.get(Skills.MAGIC, 1):
-                result[Skills.RANGED] = result[Skills.MAGIC]
-                result[Skills.MAGIC] = levels.get(Skills.RANGED, 1) - levels.get(Skills.MAGIC, 1) + result[Skills.RANGED]
-            else:
-                result[Skills.RANGED] = levels.get(Skills.MAGIC, 1) - levels.get(Skills.RANGED, 1) + result[Skills.MAGIC]
-
-        return result
+
+COMBAT_SKILLS = (
+    Skills.ATTACK,
+    Skills.STRENGTH,
+    Skills.DEFENCE,
+    Skills.RANGED,
+    Skills.MAGIC,
+    Skills.CONSTITUTION,
+    Skills.PRAYER,
+    Skills.SUMMONING,
+)
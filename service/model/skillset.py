@@ -1,135 +1,238 @@
-from collections import Counter
-from math import ceil
+from array import array
+from itertools import compress
+from operator import add, itemgetter, le, lt, neg, or_, sub
 
-from .skills import Skills
+from .combat import route_to_combat_level
+from .levels import levels_for_xp, min_xp_for_level
+from .skills import COMBAT_SKILLS, Skills
 
 
-class SkillSet(Counter):
+# Skill vectors are fixed width, indexed by Skills.ordinal
+SKILLS: tuple[Skills, ...] = tuple(Skills)
+SKILL_COUNT = len(SKILLS)
+
+_ZEROS = (0,) * SKILL_COUNT
+_INITIAL = tuple(skill.initial for skill in SKILLS)
+
+
+class SkillSet:
+    # A Counter of skill -> xp, stored as a fixed-width array plus a mask of which skills are present.
+    # Presence follows Counter semantics exactly: arithmetic keeps only positive entries, subtract() keeps everything,
+    # comparisons only look at the skills present in the right hand side. Absent skills are always stored as 0
+    # _version is bumped by every in-place change, so derived state (see Player) can tell when it's out of date
+    __slots__ = ('_xp', '_keys', '_version')
+    __hash__ = None
+
     def __init__(self, iterable=None):
-        iterable = iterable or {skill: skill.initial for skill in Skills}
-        super(SkillSet, self).__init__(iterable)
+        self._version = 0
+        if not iterable:
+            self._xp = array('q', _INITIAL)
+            self._keys = bytearray(b'\x01' * SKILL_COUNT)
+        elif isinstance(iterable, SkillSet):
+            self._xp = array('q', iterable._xp)
+            self._keys = bytearray(iterable._keys)
+        else:
+            self._xp = array('q', _ZEROS)
+            self._keys = bytearray(SKILL_COUNT)
+            self.update(iterable)
+
+    @classmethod
+    def empty(cls):
+        skillset = cls.__new__(cls)
+        skillset._xp = array('q', _ZEROS)
+        skillset._keys = bytearray(SKILL_COUNT)
+        skillset._version = 0
+        return skillset
+
+    @classmethod
+    def from_vector(cls, xp, present) -> 'SkillSet':
+        # The inverse of vector and present
+        skillset = cls.__new__(cls)
+        skillset._xp = array('q', xp)
+        skillset._keys = bytearray(present)
+        skillset._version = 0
+        return skillset
+
+    @classmethod
+    def _from_positive(cls, xp) -> 'SkillSet':
+        # Counter arithmetic drops anything that isn't positive
+        skillset = cls.__new__(cls)
+        skillset._xp = array('q', [v if v > 0 else 0 for v in xp])
+        skillset._keys = bytearray(map(bool, skillset._xp))
+        skillset._version = 0
+        return skillset
+
+    @staticmethod
+    def _coerce(other) -> 'SkillSet':
+        if isinstance(other, SkillSet):
+            return other
+        skillset = SkillSet.empty()
+        skillset.update(other)
+        return skillset
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def vector(self) -> array:
+        # xp of every skill by ordinal, absent skills are 0. Read only
+        return self._xp
+
+    @property
+    def present(self) -> bytearray:
+        # 1 for every skill present, by ordinal. Read only
+        return self._keys
+
+    # Mapping interface
+
+    # Composite flags like Skills.ALL have no slot. No requirement can ever match one, so they read as 0 and writes
+    # to them are dropped
+    def __getitem__(self, skill: Skills) -> int:
+        try:
+            return self._xp[skill.ordinal]
+        except AttributeError:
+            return 0
+
+    def __setitem__(self, skill: Skills, value: int):
+        ordinal = getattr(skill, 'ordinal', None)
+        if ordinal is not None:
+            self._xp[ordinal] = value
+            self._keys[ordinal] = 1
+            self._version += 1
+
+    def __delitem__(self, skill: Skills):
+        if not self._keys[skill.ordinal]:
+            raise KeyError(skill)
+        self._xp[skill.ordinal] = 0
+        self._keys[skill.ordinal] = 0
+        self._version += 1
+
+    def __contains__(self, skill: Skills) -> bool:
+        ordinal = getattr(skill, 'ordinal', None)
+        return ordinal is not None and self._keys[ordinal] == 1
+
+    def __iter__(self):
+        return compress(SKILLS, self._keys)
+
+    def __len__(self):
+        return self._keys.count(1)
+
+    def __bool__(self):
+        return 1 in self._keys
+
+    def get(self, skill: Skills, default=None):
+        return self[skill] if skill in self else default
+
+    def keys(self):
+        return list(compress(SKILLS, self._keys))
+
+    def values(self):
+        return list(compress(self._xp, self._keys))
+
+    def items(self):
+        return list(compress(zip(SKILLS, self._xp), self._keys))
+
+    def update(self, other=None):
+        for skill, xp in (other.items() if other is not None else ()):
+            self[skill] = self[skill] + xp
+
+    def subtract(self, other):
+        other = SkillSet._coerce(other)
+        self._xp = array('q', map(sub, self._xp, other._xp))
+        self._keys = bytearray(map(or_, self._keys, other._keys))
+        self._version += 1
+
+    def copy(self) -> 'SkillSet':
+        return SkillSet(self)
+
+    def most_common(self, n: int = None) -> [(Skills, int)]:
+        # Ties keep skill order, sorted() is stable
+        items = sorted(self.items(), key=itemgetter(1), reverse=True)
+        return items if n is None else items[:n]
+
+    def total(self) -> int:
+        return sum(self._xp)
+
+    def levels(self) -> dict[Skills, int]:
+        return dict(zip(compress(SKILLS, self._keys), levels_for_xp(compress(self._xp, self._keys))))
+
+    # Arithmetic, Counter semantics
+
+    def __add__(self, other):
+        if not isinstance(other, SkillSet):
+            return NotImplemented
+        return SkillSet._from_positive(map(add, self._xp, other._xp))
+
+    def __sub__(self, other):
+        if not isinstance(other, SkillSet):
+            return NotImplemented
+        return SkillSet._from_positive(map(sub, self._xp, other._xp))
+
+    def __pos__(self):
+        return SkillSet._from_positive(self._xp)
+
+    def __neg__(self):
+        return SkillSet._from_positive(map(neg, self._xp))
+
+    def __iadd__(self, other):
+        other = SkillSet._coerce(other)
+        self._xp = array('q', [v if v > 0 else 0 for v in map(add, self._xp, other._xp)])
+        self._keys = bytearray(map(bool, self._xp))
+        self._version += 1
+        return self
+
+    def __isub__(self, other):
+        other = SkillSet._coerce(other)
+        self._xp = array('q', [v if v > 0 else 0 for v in map(sub, self._xp, other._xp)])
+        self._keys = bytearray(map(bool, self._xp))
+        self._version += 1
+        return self
+
+    def clip(self, lower: int = 0):
+        # In-place clamp of every present skill to at least `lower`
+        self._xp = array('q', (max(xp, lower) if present else 0 for xp, present in zip(self._xp, self._keys)))
+        self._version += 1
+
+    # Comparisons
+    # < and <= only look at the skills present in other. dominated_by() is plain multiset inclusion over every skill
+
+    def dominated_by(self, other: 'SkillSet') -> bool:
+        return all(map(le, self._xp, other._xp))
+
+    def __eq__(self, other):
+        if not isinstance(other, SkillSet):
+            return NotImplemented
+        # Missing skills count as zero, same as Counter
+        return self._xp == other._xp
 
     def __lt__(self, other):
         if isinstance(other, SkillSet):
-            return all(self.get(skill, 0) < other[skill] for skill in other)
+            return all(map(lt, compress(self._xp, other._keys), compress(other._xp, other._keys)))
         raise NotImplementedError
 
     def __le__(self, other):
         if isinstance(other, SkillSet):
-            return all(self.get(skill, 0) <= other[skill] for skill in other)
+            return all(map(le, compress(self._xp, other._keys), compress(other._xp, other._keys)))
         raise NotImplementedError
 
-    def total(self) -> int:
-        return sum(self.values())
-
-    @classmethod
-    def empty(cls):
-        return super(SkillSet, cls).__new__(cls)
+    def __repr__(self):
+        return f'SkillSet({dict(self.items())!r})'
 
     @staticmethod
     def from_json(data) -> 'SkillSet':
-        return SkillSet({Skills[req["skill"].upper()]: Skills.min_xp_for_level(req["level"]) for req in data})
+        return SkillSet({Skills[req["skill"].upper()]: min_xp_for_level(req["level"]) for req in data})
 
     @staticmethod
     def optimal_route_to_combat_level(goal: int, current_stats: 'SkillSet' = None) -> 'SkillSet':
+        # The least xp to train to reach combat level goal, see combat.route_to_combat_level
         route = SkillSet.empty()
         if goal < 3:
             return route
         if goal > 138:
             raise ValueError
-        if goal == 3:
-            return SkillSet()
 
         current_stats = current_stats or SkillSet()
-
-        combat_level = Skills.calculate_combat_level({skill: Skills.level_for_xp(xp) for skill, xp in current_stats.items()})
-        while combat_level < goal:
-            levels_to_next_cb = Skills.levels_for_combat_increase(
-                {skill: Skills.level_for_xp(xp) for skill, xp in current_stats.items()}
-            )
-            training_to_levels = Counter()
-            for skill, level_req in levels_to_next_cb.items():
-                if skill in Skills.CONSTITUTION | Skills.DEFENCE:
-                    higher, lower = SkillSet.__get_higher_and_lower_of_skills(
-                        current_stats,
-                        Skills.CONSTITUTION,
-                        Skills.DEFENCE)
-                    training_to_levels[higher], training_to_levels[lower] = SkillSet.__advance_levels_in_step(
-                        current_stats,
-                        higher,
-                        level_req,
-                        lower
-                    )
-                elif skill in Skills.ATTACK | Skills.STRENGTH:
-                    higher, lower = SkillSet.__get_higher_and_lower_of_skills(
-                        current_stats,
-                        Skills.ATTACK,
-                        Skills.STRENGTH
-                    )
-                    training_to_levels[higher], training_to_levels[lower] = SkillSet.__advance_levels_in_step(
-                        current_stats,
-                        higher,
-                        level_req,
-                        lower
-                    )
-                else:
-                    training_to_levels[skill] = Skills.xp_to_level(
-                        min(Skills.level_for_xp(current_stats[skill]) + level_req, 99),
-                        current_stats[skill]
-                    )
-
-            strategy = SkillSet.choose_training_strategy(training_to_levels)
-            current_stats += strategy
-            route += strategy
-            combat_level = Skills.calculate_combat_level({skill: Skills.level_for_xp(xp) for skill, xp in current_stats.items()})
+        for ordinal, xp in route_to_combat_level(tuple(current_stats[skill] for skill in COMBAT_SKILLS), goal):
+            route[SKILLS[ordinal]] = xp
         return route
-
-    @staticmethod
-    def __advance_levels_in_step(current_stats: 'SkillSet', higher: Skills, level_req: int, lower: Skills) -> (int, int):
-        level_gap = Skills.level_for_xp(current_stats[higher]) - Skills.level_for_xp(current_stats[lower])
-        levels_to_close_gap = min(level_gap, level_req)
-        training_for_lower = Skills.xp_to_level(
-            min(99, Skills.level_for_xp(current_stats[lower]) + ceil(
-                levels_to_close_gap + max(level_req - level_gap, 0) / 2)),
-            current_stats[lower]
-        )
-        training_for_higher = Skills.xp_to_level(
-            min(99, Skills.level_for_xp(current_stats[higher]) + max(level_req - level_gap, 0) // 2),
-            current_stats[higher]
-        )
-
-        return training_for_higher, training_for_lower
-
-    @staticmethod
-    def __get_higher_and_lower_of_skills(current_stats: 'SkillSet', first: Skills, second: Skills) -> (Skills, Skills):
-        return (first, second) if current_stats[first] >= current_stats[second] else (second, first)
-
-    @staticmethod
-    def choose_training_strategy(xp_requirements: Counter[Skills, int]) -> 'SkillSet':
-        chosen_skill, chosen_xp = xp_requirements.most_common()[-1]
-
-        if chosen_skill in Skills.ATTACK | Skills.STRENGTH:
-            chosen_xp = xp_requirements[Skills.ATTACK] + xp_requirements[Skills.STRENGTH]
-        elif chosen_skill in Skills.CONSTITUTION | Skills.DEFENCE:
-            chosen_xp = xp_requirements[Skills.CONSTITUTION] + xp_requirements[Skills.DEFENCE]
-
-        for skill, xp in xp_requirements.items():
-            target_xp = xp
-            if skill in Skills.ATTACK | Skills.STRENGTH:
-                target_xp = xp_requirements[Skills.ATTACK] + xp_requirements[Skills.STRENGTH]
-            elif skill in Skills.CONSTITUTION | Skills.DEFENCE:
-                target_xp = xp_requirements[Skills.CONSTITUTION] + xp_requirements[Skills.DEFENCE]
-
-            if target_xp < chosen_xp:
-                chosen_xp = target_xp
-                chosen_skill = skill
-
-        result = {}
-        if chosen_skill in Skills.ATTACK | Skills.STRENGTH:
-            result = {Skills.ATTACK: xp_requirements[Skills.ATTACK], Skills.STRENGTH: xp_requirements[Skills.STRENGTH]}
-        elif chosen_skill in Skills.CONSTITUTION | Skills.DEFENCE:
-            result = {Skills.CONSTITUTION: xp_requirements[Skills.CONSTITUTION], Skills.DEFENCE: xp_requirements[Skills.DEFENCE]}
-        else:
-            result = {chosen_skill: chosen_xp}
-
-        return SkillSet(result)
@@ -1,11 +1,112 @@
-from service.model import XpReward
+from typing import Iterator, Mapping, Optional
+
+from service.model import Skills, SkillSet, XpReward
+from service.model.levels import level_for_xp
 from service.model.quest import Quest
+from service.model.rewards import ClaimedChoiceXpReward
+from service.model.skillset import SKILLS
 from service.util import MyOrderedDict
 
-__all__ = ['QuestStrategy']
+__all__ = ['QuestStrategy', 'Training', 'describe', 'plan_wire', 'wire_steps']
+
+
+class Training:
+    # Training a skill up to target xp outside of quest rewards, xp being how much that took
+    __slots__ = ('skill', 'target', 'xp')
+
+    def __init__(self, skill: Skills, target: int, xp: int):
+        self.skill = skill
+        self.target = target
+        self.xp = xp
+
+    def __str__(self):
+        return _training_text(self.skill, self.target, self.xp)
+
+
+def _training_text(skill, target: int, xp: int) -> str:
+    return f'Train {skill} to level {level_for_xp(target)} (+{xp} xp)'
+
+
+# Steps are recorded compactly, by reference, as lists of ints tagged by their first:
+#   - [REWARD, quest id, index into the quest's xp_rewards], a reward as is
+#   - [CHOICE, quest id, index, skill ordinal], a reward used on a skill
+#   - [TRAINING, skill ordinal, target xp, xp trained]
+# Anything else is recorded as the text it's shown as
+REWARD, CHOICE, TRAINING = range(3)
+
+
+def _reward_record(reward, quests: Mapping[int, Quest]):
+    if isinstance(reward, ClaimedChoiceXpReward):
+        record = _reward_record(reward.reward, quests)
+        return [CHOICE, record[1], record[2], reward.skill_choice.ordinal]
+    elif isinstance(reward, XpReward):
+        return [REWARD, reward.quest_id, quests[reward.quest_id].xp_rewards.index(reward)]
+    elif isinstance(reward, Training):
+        return [TRAINING, reward.skill.ordinal, reward.target, reward.xp]
+    return reward
+
+
+def _reward_from_record(record, quests: Mapping[int, Quest]):
+    if not isinstance(record, list):
+        return record
+    if record[0] == TRAINING:
+        return Training(SKILLS[record[1]], record[2], record[3])
+    reward = quests[record[1]].xp_rewards[record[2]]
+    return ClaimedChoiceXpReward(reward, SKILLS[record[3]]) if record[0] == CHOICE else reward
+
+
+def plan_wire(record: dict, quests: Mapping[int, Quest]) -> dict:
+    # A strategy's record, see QuestStrategy.to_record, with what's needed to show it without the catalog: the names
+    # of its quests and skills, and the text of every reward it uses, by 'quest id:index'. Keyed by strings, as json is
+    refs = [ref for _, refs in record['steps'] for ref in refs] + record.get('preparation', [])
+    return dict(
+        record,
+        quests={str(quest_id): quests[quest_id].name for quest_id, _ in record['steps']},
+        rewards=_reward_texts(refs, quests),
+        skills=[str(skill) for skill in SKILLS],
+    )
+
+
+def _reward_texts(refs: list, quests: Mapping[int, Quest]) -> dict[str, str]:
+    return {
+        f'{ref[1]}:{ref[2]}': str(quests[ref[1]].xp_rewards[ref[2]])
+        for ref in refs if isinstance(ref, list) and ref[0] != TRAINING
+    }
+
+
+def wire_steps(steps: Iterator[tuple], quests: Mapping[int, Quest]) -> (dict, Iterator[tuple]):
+    # Steps as the solver decides them, see QuestStrategy.log, in the format of plan_wire: (kind, quest id, refs), the
+    # quest id None for rewards and training listed under the last quest. The plan's names are filled in as the steps
+    # that use them are read, so each step can be shown with describe as soon as it comes
+    plan = plan_wire({'steps': []}, quests)
+
+    def converted():
+        for kind, first, second in steps:
+            if kind == 'quest':
+                quest_id, rewards = first.id, second
+                plan['quests'][str(quest_id)] = first.name
+            else:
+                quest_id, rewards = second, first if kind == 'add' else [first]
+            refs = [_reward_record(reward, quests) for reward in rewards]
+            plan['rewards'].update(_reward_texts(refs, quests))
+            yield kind, quest_id, refs
+
+    return plan, converted()
+
+
+def describe(ref, plan: dict) -> str:
+    # The text of a step recorded in plan, see plan_wire, only worked out when it's shown
+    if not isinstance(ref, list):
+        return ref
+    if ref[0] == TRAINING:
+        return _training_text(plan['skills'][ref[1]], ref[2], ref[3])
+    reward = plan['rewards'][f'{ref[1]}:{ref[2]}']
+    return f'Use {reward} on {plan["skills"][ref[3]]}' if ref[0] == CHOICE else reward
 
 
 class StrategyItem:
+    __slots__ = ('quest', 'rewards')
+
     def __init__(self, quest: Quest, rewards: [XpReward]):
         self.quest = quest
         self.rewards = rewards
@@ -18,26 +119,107 @@ class StrategyItem:
 
 
 class QuestStrategy:
+    # Kept as a log of steps, each a tuple of its kind and the quest and rewards involved, which are shared with the
+    # catalog rather than copied. The per quest view is only built from the log when it's asked for
     def __init__(self):
-        self.strategy: MyOrderedDict[int, StrategyItem] = MyOrderedDict()
+        # xp trained outside of quest rewards, including combat training
+        self.training_xp = 0
+        # Every change made, so any prefix of the strategy can be rebuilt with apply(). One of:
+        #   - ('quest', quest, rewards claimed on completing it)
+        #   - ('add', rewards used or training done, quest id to list them under, or None for the last quest)
+        #   - ('push', reward, quest id), a reward listed before the quest's others
+        self.log: [tuple] = []
+        # The solver's checkpoints, a service.trace.SearchTrace, if the strategy was solved in this process
+        self.trace = None
+        # The (skills, completed quests bitset) it was solved from, if known
+        self.origin: Optional[(SkillSet, int)] = None
+
+        self._items: MyOrderedDict[int, StrategyItem] = MyOrderedDict()
+        self._preparation: [XpReward] = []
+        # How much of the log _items and _preparation are up to date with
+        self._built = 0
+
+    def _build(self):
+        for kind, first, second in self.log[self._built:]:
+            if kind == 'quest':
+                self._items[first.id] = StrategyItem(first, list(second))
+                continue
+            if second is None and not self._items:
+                # Rewards used and training done before the first quest, when there's no quest to list them under
+                if kind == 'add':
+                    self._preparation.extend(first)
+                else:
+                    self._preparation.insert(0, first)
+                continue
+            item = self._items[second or self._items.last()]
+            if kind == 'add':
+                item.rewards.extend(first)
+            else:
+                item.push_reward(first)
+        self._built = len(self.log)
+
+    @property
+    def strategy(self) -> MyOrderedDict[int, StrategyItem]:
+        self._build()
+        return self._items
+
+    @property
+    def preparation(self) -> [XpReward]:
+        self._build()
+        return self._preparation
 
     def add_reward(self, reward: XpReward, quest_id: int = None):
         self.add_rewards([reward], quest_id)
 
     def add_rewards(self, rewards: [XpReward], quest_id: int = None):
-        quest_id = quest_id or self.strategy.last()
-        for reward in rewards:
-            self.strategy[quest_id].add_reward(reward)
+        self.log.append(('add', tuple(rewards), quest_id))
 
     def push_reward(self, reward: XpReward, quest_id: int = None):
-        quest_id = quest_id or self.strategy.last()
-        self.strategy[quest_id].push_reward(reward)
+        self.log.append(('push', reward, quest_id))
 
     def add_quest(self, quest: Quest, rewards: [XpReward]):
-        self.strategy[quest.id] = StrategyItem(quest, rewards)
+        self.log.append(('quest', quest, tuple(rewards)))
+
+    def apply(self, log: [tuple]) -> 'QuestStrategy':
+        # Makes the changes in another strategy's log, e.g. QuestStrategy().apply(log[:n]) rebuilds its first n steps
+        self.log.extend(log)
+        return self
 
     def __iter__(self):
         return iter(self.strategy)
 
+    def to_record(self, quests: Mapping[int, Quest]) -> dict:
+        # A plain, json-able description of the strategy, referring to quests and rewards by id.
+        # Only valid against the quests it was recorded with
+        record = {
+            'training_xp': self.training_xp,
+            'steps': [
+                [quest_id, [_reward_record(reward, quests) for reward in item.rewards]]
+                for quest_id, item in self.strategy.items()
+            ],
+        }
+        if self.preparation:
+            record['preparation'] = [_reward_record(reward, quests) for reward in self.preparation]
+        if self.origin is not None:
+            skills, quests_completed = self.origin
+            record['origin'] = [list(skills.vector), quests_completed]
+        return record
+
+    def to_wire(self, quests: Mapping[int, Quest]) -> dict:
+        return plan_wire(self.to_record(quests), quests)
+
+    @staticmethod
+    def from_record(record: dict, quests: Mapping[int, Quest]) -> 'QuestStrategy':
+        strategy = QuestStrategy()
+        if 'preparation' in record:
+            strategy.add_rewards([_reward_from_record(reward, quests) for reward in record['preparation']])
+        for quest_id, rewards in record['steps']:
+            strategy.add_quest(quests[quest_id], [_reward_from_record(reward, quests) for reward in rewards])
+        strategy.training_xp = record['training_xp']
+        if 'origin' in record:
+            skills, quests_completed = record['origin']
+            strategy.origin = (SkillSet({skill: xp for skill, xp in zip(SKILLS, skills)}), quests_completed)
+        return strategy
+
     def __getitem__(self, item):
         return self.strategy[item]
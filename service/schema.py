@@ -0,0 +1,140 @@
+from .model.quest import Difficulty
+from .model.rewards import PrismaticXpReward
+from .model.skills import Skills
+
+__all__ = ['QuestDataError', 'validate_quest_data', 'check_quest_references']
+
+QUEST_REQUIRED_KEYS = {'id': int, 'name': str, 'difficulty': str}
+QUEST_OPTIONAL_KEYS = {
+    'quest_points': int,
+    'qp_requirement': int,
+    'combat_requirement': int,
+    'quest_requirements': list,
+    'skill_requirements': list,
+    'xp_rewards': list,
+    'location': list,
+}
+
+SKILL_REQUIREMENT_KEYS = {'skill': str, 'level': int}
+
+# Reward type -> (required keys, optional keys)
+REWARD_KEYS = {
+    'Immediate': ({'type': str, 'skills': str, 'amount': int}, {}),
+    'Choice': ({'type': str, 'skills': str, 'amount': int}, {'minimum_level': int}),
+    'ClaimableChoice': ({'type': str, 'skills': str, 'amount': int, 'source': str}, {'minimum_level': int}),
+    'Tiered': ({'type': str, 'skills': str, 'amount': int, 'source': str}, {'minimum_level': int}),
+    'Claimable': ({'type': str, 'skills': str, 'amount': int, 'source': str}, {'minimum_level': int}),
+    'Prismatic': ({'type': str, 'skills': str, 'size': str}, {'minimum_level': int, 'source': str}),
+}
+
+
+class QuestDataError(ValueError):
+    def __init__(self, errors: [str]):
+        super(QuestDataError, self).__init__(f'{len(errors)} problem(s) in quest data:\n' + '\n'.join(errors))
+        self.errors = errors
+
+
+def _check_keys(where: str, obj, required: dict[str, type], optional: dict[str, type]) -> [str]:
+    if not isinstance(obj, dict):
+        return [f'{where}: expected an object, found {type(obj).__name__}']
+
+    errors = []
+    for key, expected in required.items():
+        if key not in obj:
+            errors.append(f'{where}: missing required key "{key}"')
+    for key, value in obj.items():
+        expected = required.get(key, optional.get(key))
+        if expected is None:
+            errors.append(f'{where}: unknown key "{key}"')
+        # bool is an int subclass, but never a valid value here
+        elif not isinstance(value, expected) or isinstance(value, bool):
+            errors.append(f'{where}: "{key}" should be {expected.__name__}, found {type(value).__name__}')
+    return errors
+
+
+def _check_skills(where: str, skills_str: str) -> [str]:
+    return [f'{where}: unknown skill "{token}"' for token in skills_str.split(',') if token.upper() not in Skills.__members__]
+
+
+def _check_level(where: str, level: int) -> [str]:
+    if not 1 <= level <= 120:
+        return [f'{where}: level must be between 1 and 120, found {level}']
+    return []
+
+
+def _validate_reward(where: str, reward) -> [str]:
+    if not isinstance(reward, dict) or reward.get('type') not in REWARD_KEYS:
+        return [f'{where}: unknown reward type {reward.get("type") if isinstance(reward, dict) else reward!r}']
+
+    required, optional = REWARD_KEYS[reward['type']]
+    errors = _check_keys(where, reward, required, optional)
+    if errors:
+        return errors
+
+    errors += _check_skills(where, reward['skills'])
+    if 'amount' in reward and reward['amount'] <= 0:
+        errors.append(f'{where}: amount must be positive, found {reward["amount"]}')
+    if 'minimum_level' in reward:
+        errors += _check_level(where, reward['minimum_level'])
+    if 'size' in reward and reward['size'].upper() not in PrismaticXpReward.PrismaticSize.__members__:
+        errors.append(f'{where}: unknown prismatic size "{reward["size"]}"')
+    return errors
+
+
+def _validate_quest(where: str, quest) -> [str]:
+    errors = _check_keys(where, quest, QUEST_REQUIRED_KEYS, QUEST_OPTIONAL_KEYS)
+    if errors:
+        return errors
+
+    if quest['difficulty'].upper() not in Difficulty.__members__:
+        errors.append(f'{where}: unknown difficulty "{quest["difficulty"]}"')
+    if not 0 <= quest.get('combat_requirement', 0) <= 138:
+        errors.append(f'{where}: combat requirement must be between 0 and 138')
+
+    location = quest.get('location')
+    if location is not None and (len(location) != 2 or not all(
+            isinstance(coordinate, int) and not isinstance(coordinate, bool) for coordinate in location)):
+        errors.append(f'{where}: location must be [x, y] map coordinates, found {location!r}')
+
+    for prereq in quest.get('quest_requirements', []):
+        if not isinstance(prereq, int) or isinstance(prereq, bool):
+            errors.append(f'{where}: quest requirements must be quest ids, found {prereq!r}')
+
+    for idx, req in enumerate(quest.get('skill_requirements', [])):
+        req_where = f'{where}.skill_requirements[{idx}]'
+        req_errors = _check_keys(req_where, req, SKILL_REQUIREMENT_KEYS, {})
+        if not req_errors:
+            req_errors = _check_skills(req_where, req['skill']) + _check_level(req_where, req['level'])
+        errors += req_errors
+
+    for idx, reward in enumerate(quest.get('xp_rewards', [])):
+        errors += _validate_reward(f'{where}.xp_rewards[{idx}]', reward)
+
+    return errors
+
+
+def validate_quest_data(data) -> [str]:
+    if not isinstance(data, list):
+        return ['quest data must be a list of quests']
+
+    errors = []
+    ids = set()
+    for idx, quest in enumerate(data):
+        where = f'quest[{idx}]' + (f' ({quest["name"]})' if isinstance(quest, dict) and 'name' in quest else '')
+        errors += _validate_quest(where, quest)
+        if isinstance(quest, dict) and 'id' in quest:
+            if quest['id'] in ids:
+                errors.append(f'{where}: duplicate quest id {quest["id"]}')
+            ids.add(quest['id'])
+
+    return errors
+
+
+# Quests requiring a quest that isn't in the data can never be started. That's a data problem rather than a schema
+# one, and the solver copes with it, so these are only reported
+def check_quest_references(data: list[dict]) -> [str]:
+    ids = {quest['id'] for quest in data}
+    return [
+        f'quest {quest["id"]} ({quest["name"]}): requires unknown quest {prereq}, it will never be scheduled'
+        for quest in data for prereq in quest.get('quest_requirements', []) if prereq not in ids
+    ]
@@ -1,89 +1,100 @@
-from pathlib import Path
-from typing import Optional
+from array import array
+from operator import attrgetter
+from time import perf_counter
+from typing import Iterator, Mapping, Optional, Union
 
+from . import metrics
 from .model import Player, SkillSet, Skills
-from .model.quest import Quest, load_quest_data
-from .model.rewards import XpReward, ClaimableXpReward, ChoiceXpReward, ClaimableChoiceXpReward, ClaimedChoiceXpReward
-from .model.strategy import QuestStrategy
-from .util import partition
-
-__all__ = ['get_optimal_quest_strategy', 'get_quest_data']
-
-
-def choose_next_quest(shell: [int], player: Player, quest_list: [Quest]) -> Optional[int]:
-    for idx, quest_id in enumerate(shell):
-        if quest_list[quest_id].satisfies_requirements(player):
-            return idx
-    return None
-
+from .cache import get_cache, strategy_key
+from .catalog import QuestCatalog, get_catalog
+from .exact import ExactResult, exact_search
+from .flight import get_flights
+from .frontier import Frontier
+from .hoard import RewardHoard
+from .metrics import SolveStats, TimedIterator
+from .trace import SearchTrace, recall_strategy, remember_strategy
+from .travel import shorten_travel
+from .model.quest import Quest
+from .model.rewards import ClaimableXpReward, ChoiceXpReward, ClaimableChoiceXpReward, ClaimedChoiceXpReward
+from .model.strategy import QuestStrategy, Training
+
+__all__ = ['get_optimal_quest_strategy', 'stream_optimal_quest_strategy', 'get_exact_quest_strategy',
+           'replan_quest_strategy', 'get_quest_data', 'get_cache_stats', 'get_metrics']
+
+
+def optimal_search(player: Player, quest_list: Mapping[int, Quest], hoarded_rewards: RewardHoard = None,
+                   strategy: QuestStrategy = None, trace: SearchTrace = None) -> QuestStrategy:
+    # Given a hoard and strategy, carries on from where they left off. Given a trace, checkpoints every iteration to it
+    strategy = strategy if strategy is not None else QuestStrategy()
+    for _ in iter_optimal_search(player, quest_list, strategy, hoarded_rewards, trace):
+        pass
+    return strategy
 
-def build_quest_postreqs(quests: [Quest]) -> dict[int, [int]]:
-    res = {}
 
-    for quest_id, quest in quests.items():
-        for prereq_id in quest.quest_prereqs:
-            if prereq_id not in res:
-                res[prereq_id] = []
-            res[prereq_id].append(quest_id)
+def iter_optimal_search(player: Player, quest_list: Mapping[int, Quest], strategy: QuestStrategy,
+                        hoarded_rewards: RewardHoard = None, trace: SearchTrace = None) -> Iterator[tuple]:
+    # Solves into strategy, yielding every step added to its log as soon as it's decided, see QuestStrategy.apply.
+    # What the solve did, and the time spent on it, are added to the metrics once it's over
+    stats = SolveStats()
+    if not metrics.ENABLED:
+        yield from _search(player, quest_list, strategy, hoarded_rewards, trace, stats)
+        return
 
-    return res
+    steps = TimedIterator(_search(player, quest_list, strategy, hoarded_rewards, trace, stats))
+    try:
+        yield from steps
+    finally:
+        steps.close()
+        metrics.record_solve(stats, steps.elapsed)
 
 
 # noinspection PyShadowingNames
-def get_next_lamp(player_skills: SkillSet, xp_gap: SkillSet, skill: Skills, rewards: set[XpReward]) -> Optional[XpReward]:
-    options = sorted(reward for reward in rewards if reward.is_claimable(player_skills, skill))
-    if not options:
-        return None
-    return min(options, key=lambda r: abs(r.amount(player_skills, skill) - xp_gap[skill]))
-
+def _search(player: Player, quest_list: Mapping[int, Quest], strategy: QuestStrategy,
+            hoarded_rewards: Optional[RewardHoard], trace: Optional[SearchTrace], stats: SolveStats) -> Iterator[tuple]:
+    # Every uncompleted quest whose quest pre-reqs are all met, i.e. the nodes with no incoming edges.
+    # It hands out whichever of those we meet every other requirement for, easiest first
+    frontier = Frontier(quest_list, player)
+    stats.frontier = frontier
+    hoarded_rewards = hoarded_rewards if hoarded_rewards is not None else RewardHoard()
+    sent = len(strategy.log)
 
-# noinspection PyShadowingNames
-def optimal_search(player: Player, quest_list: dict[int, Quest]) -> QuestStrategy:
-    strategy = QuestStrategy()
+    # This is Kahn's algorithm, with a twist at the end
+    # https://en.wikipedia.org/wiki/Topological_sorting#Kahn's_algorithm
+    while frontier:
+        stats.iterations += 1
+        stats.frontier_quests += len(frontier)
 
-    # Set of all quests with no incoming edges, i.e. we satisfy all quest pre-reqs
-    # Sorted by the quest ordering, which sorts on (skill requirements, combat requirement, difficulty)
-    shell = [q for q in quest_list if not quest_list[q].quest_prereqs and q not in player.quests_completed]
+        # Everything decided in the last iteration is final
+        yield from strategy.log[sent:]
+        sent = len(strategy.log)
 
-    postreq_relation = build_quest_postreqs(quest_list)
-    hoarded_rewards = set()
+        # Nothing from earlier iterations will be rolled back
+        hoarded_rewards.commit()
+        player.commit()
 
-    # This is Kahn's algorithm, with a twist at the end
-    # https://en.wikipedia.org/wiki/Topological_sorting#Kahn's_algorithm
-    while shell:
+        if trace is not None and trace.record(player, hoarded_rewards, strategy) is not None:
+            # Back on the track of the solve being resumed, the rest of its strategy has been spliced on
+            break
 
         # First of, low-hanging fruit: check all of our Claimable rewards to see if we meet the requirements
         # If yes, claim them and remove from the hoard
-        to_hoard, to_claim = partition(
-            lambda r: isinstance(r, ClaimableXpReward) and r.is_claimable(player.skills),
-            hoarded_rewards
-        )
-
-        for reward in to_claim:
+        for reward in hoarded_rewards.pop_claimable(player.skills):
             player.skills += reward.get_reward()
             strategy.add_reward(reward)
 
-        hoarded_rewards = set(to_hoard)
-
-        shell.sort(key=lambda q: quest_list[q])
-        # Get the next quest we can complete; the first quest in the shell we satisfy all requirements for
-        idx = choose_next_quest(shell, player, quest_list)
-        if idx is not None:
-            next_quest = quest_list[shell.pop(idx)]
+        # Get the next quest we can complete; the easiest quest in the frontier we satisfy all requirements for
+        next_quest = frontier.pop_eligible()
+        if next_quest is not None:
             claimed_rewards, unclaimed_rewards = player.complete_quest(
-                next_quest.id,
+                next_quest.bit,
                 next_quest.quest_points,
                 next_quest.xp_rewards
             )
             strategy.add_quest(next_quest, claimed_rewards)
             hoarded_rewards.update(unclaimed_rewards)
 
-            # We're looking for every quest that has this one as a prereq
-            postreq_ids = postreq_relation.pop(next_quest.id, [])
-            for pr_id in postreq_ids:
-                # If we've completed all of its prereqs, the quest is a candidate for the next iteration
-                if quest_list[pr_id].quest_prereqs <= player.quests_completed:
-                    shell.append(pr_id)
+            # Every quest that has this one as a prereq and no other outstanding ones joins the frontier
+            frontier.complete(next_quest)
         else:
             # This is where we diverge from Kahn's algorithm
             # At this point we have to do some work, either use an unclaimed/unchosen reward, or do some training
@@ -93,35 +104,56 @@ def optimal_search(player: Player, quest_list: dict[int, Quest]) -> QuestStrateg
             # The basic idea is this: we iterate over the quests in the shell
             # For each quest, we calculate the training delta (skill_prereqs - player.skills), and apply lamps to
             #   lower that delta, until either we run out or the delta is negative
-            prospects: {int, (SkillSet, [(XpReward, Skills)])} = {}
-            for quest_id in shell:
-                hoarded_rewards_copy: set[XpReward] = hoarded_rewards.copy()
-                player_skills_copy = player.skills.copy()
-                quest = quest_list[quest_id]
-                xp_gap = quest.skill_prereqs + quest.combat_training_requirement - player.skills
+            # We take the option closest to zero: the first prospect whose remaining xp gap isn't dominated by a later
+            # one. Lamps can only take so much off a quest's gap, see RewardHoard.coverage, so quests whose gap can't
+            # come out below the best one so far on every skill are passed over without trying lamps out
+            prospects: {int, (SkillSet, [ClaimedChoiceXpReward], [(Skills, int)])} = {}
+            choice = None
+            coverage, total_coverage = hoarded_rewards.coverage()
+            skills = player.skills.vector
+            for quest in frontier.pending():
+                # Quest points only come from completing quests, no amount of training gets us there
+                if quest.qp_requirement > player.quest_points:
+                    continue
+                if choice is not None and not _may_dominate(quest.total_requirements.vector, skills, coverage,
+                                                            total_coverage, prospects[choice][0].vector):
+                    continue
+                quest_id = quest.id
+                # Lamps are tried out on the player and the hoard themselves, and rolled back afterwards
+                checkpoint = hoarded_rewards.checkpoint()
+                skills_checkpoint = player.checkpoint()
+                xp_gap = quest.total_requirements - player.skills
                 loop_flag = True
+                lamps = []
 
-                prospects[quest_id] = (xp_gap, [])
-
-                while +xp_gap and hoarded_rewards_copy and loop_flag:
+                while +xp_gap and hoarded_rewards and loop_flag:
                     for (skill, required_xp) in (+xp_gap).most_common():
                         # Want to get the lamp that is:
                         #   1) in absolute terms closest to filling the xp gap
                         #   2) is claimable at our stats
-                        while next_lamp := get_next_lamp(player_skills_copy, xp_gap, skill, hoarded_rewards_copy):
+                        while next_lamp := hoarded_rewards.next_lamp(player.skills, xp_gap, skill):
                             loop_flag = True
-                            hoarded_rewards_copy.remove(next_lamp)
-                            reward = next_lamp.get_reward(skill_choice=skill, player_skills=player_skills_copy)
+                            stats.lamps += 1
+                            hoarded_rewards.remove(next_lamp)
+                            reward = next_lamp.get_reward(skill_choice=skill, player_skills=player.skills)
                             xp_gap.subtract(reward)
-                            player_skills_copy += reward
-                            prospects[quest_id][1].append(ClaimedChoiceXpReward(next_lamp, skill))
+                            player.gain(reward)
+                            lamps.append(ClaimedChoiceXpReward(next_lamp, skill))
                         loop_flag = False
 
-            # At this point we take the option closest to zero
-            choice = min(prospects, key=lambda p: prospects[p][0])
+                # Put back the lamps we only tried out, keeping what they came to in case this quest is the one
+                prospects[quest_id] = (xp_gap, lamps, player.rollback(skills_checkpoint))
+                hoarded_rewards.rollback(checkpoint)
+
+                if choice is None or (xp_gap != prospects[choice][0] and xp_gap.dominated_by(prospects[choice][0])):
+                    choice = quest_id
+            if choice is None:
+                # Everything left is waiting on quest points we can't earn
+                break
+            # The lamps the choice was tried out with are used for real, no need to work out what they give again
+            player.apply(prospects[choice][2])
             for reward in prospects[choice][1]:
                 hoarded_rewards.remove(reward.reward)
-                player.skills += reward.reward.get_reward(reward.skill_choice, player.skills)
 
                 if isinstance(reward.reward, ClaimableXpReward) or isinstance(reward.reward, ClaimableChoiceXpReward):
                     strategy.add_reward(reward)
@@ -130,32 +162,246 @@ def optimal_search(player: Player, quest_list: dict[int, Quest]) -> QuestStrateg
 
             training_goal = quest_list[choice].skill_prereqs - player.skills
             if training_goal:
+                stats.training += 1
                 player.skills += training_goal
-                strategy.add_rewards([f'Train {skill} to level {Skills.level_for_xp(quest_list[choice].skill_prereqs[skill])} (+{training_goal[skill]} xp)' for skill in training_goal])
+                strategy.training_xp += training_goal.total()
+                strategy.add_rewards([Training(skill, player.skills[skill], training_goal[skill]) for skill in training_goal])
 
             if player.combat_level < quest_list[choice].combat_requirement:
+                stats.combat_routes += 1
+                # The route planner advances the stats it's given, so it works on a copy
                 combat_training_strategy = SkillSet.optimal_route_to_combat_level(
                     quest_list[choice].combat_requirement,
-                    player.skills
+                    player.skills.copy()
                 )
                 player.skills += combat_training_strategy
+                strategy.training_xp += combat_training_strategy.total()
                 for skill, xp in combat_training_strategy.items():
-                    strategy.add_reward(f'Train {skill} to level {Skills.level_for_xp(player.skills[skill])} (+{xp} xp)')
-    return strategy
+                    strategy.add_reward(Training(skill, player.skills[skill], xp))
+
+    yield from strategy.log[sent:]
+
 
+def _load_catalog() -> QuestCatalog:
+    with metrics.timer('quest_phase_seconds', phase='load'):
+        return get_catalog()
 
-def get_optimal_quest_strategy(initial_quests: [int] = None, initial_stats: SkillSet = None):
-    quests = get_quest_data()
 
-    player = Player(initial_stats)
+def _new_player(catalog: QuestCatalog, initial_quests: Union[list[int], int] = None,
+                initial_stats: SkillSet = None) -> Player:
+    # The player's skills are trained in place, so it gets its own copy
+    player = Player(initial_stats.copy() if initial_stats else None)
     if initial_quests:
-        player.quests_completed = set(initial_quests)
-    strategy = optimal_search(player, quests)
+        # Either quest ids, or a bitset straight from QuestCatalog.quest_mask
+        if isinstance(initial_quests, int):
+            player.quests_completed = initial_quests
+        else:
+            player.quests_completed = catalog.quest_mask(initial_quests)
+    return player
+
+
+def _greedy_steps(catalog: QuestCatalog, initial_quests: Union[list[int], int] = None,
+                  initial_stats: SkillSet = None, target_quest: int = None) -> (QuestStrategy, Iterator[tuple]):
+    # The strategy, and the steps that fill it in. Once they're exhausted the strategy is complete, and cached
+    player = _new_player(catalog, initial_quests, initial_stats)
+    key = strategy_key(player.skills, player.quests_completed, _solver_mode(catalog, 'greedy', target_quest))
+    record = get_cache().get(catalog.version, key)
+    hold = None
+    if record is None:
+        # The same solve running already is waited on. In this process, it hands its plan over directly, otherwise
+        # the plan can only come from the cache
+        hold = get_flights().acquire(f'{key}:{catalog.version}')
+        if hold.result is not None:
+            hold.release()
+            return hold.result, iter(hold.result.log)
+        if hold.waited:
+            record = get_cache().get(catalog.version, key)
+        if record is not None:
+            hold.release()
+    if record is not None:
+        # The same plan, solved in this process, still has its trace to re-plan from
+        strategy = recall_strategy(key, catalog.version) or QuestStrategy.from_record(record, catalog.quests)
+        return strategy, iter(strategy.log)
+
+    if target_quest is None:
+        strategy, steps = _traced_search(catalog, player)
+    else:
+        # Only solves part of the catalog, so there's nothing to re-plan from
+        strategy = QuestStrategy()
+        quest_list = catalog.target_quests(target_quest, player.quests_completed, player.quest_points)
+        steps = iter_optimal_search(player, quest_list, strategy)
+
+    def cached_steps():
+        # Anyone waiting on this solve goes ahead once it's done, or abandoned
+        try:
+            yield from steps
+            get_cache().put(catalog.version, key, strategy.to_record(catalog.quests))
+            if strategy.trace is not None:
+                remember_strategy(key, strategy)
+            hold.result = strategy
+        finally:
+            hold.release()
+
+    return strategy, cached_steps()
+
+
+def _greedy_strategy(catalog: QuestCatalog, initial_quests: Union[list[int], int] = None,
+                     initial_stats: SkillSet = None, target_quest: int = None) -> QuestStrategy:
+    strategy, steps = _greedy_steps(catalog, initial_quests, initial_stats, target_quest)
+    for _ in steps:
+        pass
+    return strategy
+
+
+def _solver_mode(catalog: QuestCatalog, solver: str, target_quest: int = None) -> str:
+    # What strategy_key() tells apart the solves of the same player by
+    if target_quest is None:
+        return solver
+    if target_quest not in catalog.quests:
+        raise ValueError(f'Unknown quest {target_quest}')
+    return f'{solver}:target:{target_quest}'
+
+
+def _traced_search(catalog: QuestCatalog, player: Player) -> (QuestStrategy, Iterator[tuple]):
+    strategy = QuestStrategy()
+    strategy.origin = (player.skills.copy(), player.quests_completed)
+    strategy.trace = SearchTrace(catalog.version)
+    return strategy, iter_optimal_search(player, catalog.quests, strategy, trace=strategy.trace)
+
+
+def replan_quest_strategy(prior: QuestStrategy, completed_quests: Union[list[int], int],
+                          current_stats: SkillSet = None) -> QuestStrategy:
+    # The updated plan after completing completed_quests (ids, or a bitset), on top of whatever prior was planned from.
+    # Resumes prior's solve from the furthest point those quests cover, rather than solving from scratch, and stops as
+    # soon as it's back on prior's track. With current_stats, they replace the skills the plan would have got to.
+    # The plan returned includes the quests done so far, and can be re-planned from in turn
+    catalog = get_catalog()
+    if prior.origin is None:
+        raise ValueError('strategy has no origin to re-plan from')
+    origin_skills, origin_quests = prior.origin
+    if prior.trace is None or prior.trace.version != catalog.version:
+        # Loaded from the cache, solved in another process, or against older quest data. Solve it again to get a
+        # trace, unless this process has solved it lately
+        key = strategy_key(origin_skills, origin_quests, 'greedy')
+        prior = recall_strategy(key, catalog.version) or prior
+        if prior.trace is None or prior.trace.version != catalog.version:
+            player = Player(origin_skills.copy())
+            player.quests_completed = origin_quests
+            prior, steps = _traced_search(catalog, player)
+            for _ in steps:
+                pass
+            remember_strategy(key, prior)
+
+    if not isinstance(completed_quests, int):
+        completed_quests = catalog.quest_mask(completed_quests)
+    done = origin_quests | completed_quests
+
+    idx = prior.trace.resume_point(done)
+    checkpoint = prior.trace[idx]
+    player = Player()
+    hoarded_rewards = checkpoint.restore(player)
+    strategy = QuestStrategy().apply(prior.log[:checkpoint.steps])
+    strategy.training_xp = checkpoint.training_xp
+
+    trace = SearchTrace(catalog.version, prior.trace, prior)
+    for earlier in prior.trace.checkpoints[:idx]:
+        trace.append(earlier)
+
+    # Quests done off plan, easiest first, as if the solver had picked them
+    extra = done & ~checkpoint.quests_completed
+    for quest in sorted((quest for quest in catalog.quests.values() if quest.bit & extra), key=attrgetter('sort_key')):
+        claimed_rewards, unclaimed_rewards = player.complete_quest(quest.bit, quest.quest_points, quest.xp_rewards)
+        strategy.add_quest(quest, claimed_rewards)
+        hoarded_rewards.update(unclaimed_rewards)
+    if current_stats is not None:
+        player.skills = current_stats.copy()
+
+    strategy = optimal_search(player, catalog.quests, hoarded_rewards, strategy, trace)
+    strategy.origin = prior.origin
+    strategy.trace = trace
+    return strategy
+
 
+def get_optimal_quest_strategy(initial_quests: Union[list[int], int] = None, initial_stats: SkillSet = None,
+                               target_quest: int = None, travel_time_limit: float = None):
+    # With target_quest, only plans as far as completing that quest: its prereqs, and whatever else it takes to make
+    # up the quest points they need, see QuestCatalog.target_quests. With travel_time_limit, spends up to that many
+    # seconds reordering the plan to travel less, see travel.shorten_travel
+    catalog = _load_catalog()
+    strategy = _greedy_strategy(catalog, initial_quests, initial_stats, target_quest)
+    if travel_time_limit:
+        strategy = shorten_travel(strategy, catalog.travel, travel_time_limit)
     return strategy
 
 
-def get_quest_data() -> dict[int, Quest]:
-    data_file = Path(__file__).resolve().parent / 'quest_data.json'
-    quests = load_quest_data(data_file)
-    return quests
+def stream_optimal_quest_strategy(initial_quests: Union[list[int], int] = None, initial_stats: SkillSet = None,
+                                  target_quest: int = None) -> (QuestStrategy, Iterator[tuple]):
+    # Same as get_optimal_quest_strategy, but returns straight away with the steps still to be solved, see
+    # QuestStrategy.apply for what they are. The strategy is only complete once they've all been read
+    return _greedy_steps(_load_catalog(), initial_quests, initial_stats, target_quest)
+
+
+def get_exact_quest_strategy(initial_quests: Union[list[int], int] = None, initial_stats: SkillSet = None,
+                             node_limit: int = 20000, time_limit: float = 10.0, target_quest: int = None) -> ExactResult:
+    # Searches for the plan with the least training, starting from the greedy plan. Much slower, so opt-in
+    catalog = _load_catalog()
+    player = _new_player(catalog, initial_quests, initial_stats)
+    mode = _solver_mode(catalog, f'exact:{node_limit}:{time_limit}', target_quest)
+    key = strategy_key(player.skills, player.quests_completed, mode)
+    record = get_cache().get(catalog.version, key)
+    if record is not None:
+        return ExactResult.from_record(record, catalog.quests)
+
+    # Holds on to nothing while it works out the greedy plan, which is waited on by a key of its own
+    greedy = _greedy_strategy(catalog, initial_quests, initial_stats, target_quest)
+    with get_flights().acquire(f'{key}:{catalog.version}') as hold:
+        if hold.result is not None:
+            return hold.result
+        if hold.waited:
+            record = get_cache().get(catalog.version, key)
+            if record is not None:
+                return ExactResult.from_record(record, catalog.quests)
+
+        start = perf_counter()
+        result = exact_search(player, catalog.quests, greedy, node_limit=node_limit, time_limit=time_limit)
+        metrics.record_solve(None, perf_counter() - start, 'exact')
+        # A search cut short depends on how busy the server was, only a proven plan is the same every time. Anyone
+        # waiting on this one gets it either way
+        if result.proven:
+            get_cache().put(catalog.version, key, result.to_record(catalog.quests))
+        hold.result = result
+        return result
+
+
+def get_cache_stats() -> dict[str, int]:
+    return get_cache().stats()
+
+
+def get_metrics() -> str:
+    # Everything service.metrics has recorded in this process, and the cache's stats, in the Prometheus text format
+    stats = get_cache().stats()
+    return metrics.render({
+        'quest_strategy_cache_hits_total': ('counter', 'Plans served from the cache', stats['hits']),
+        'quest_strategy_cache_disk_hits_total': ('counter', 'Plans served from the database', stats['disk_hits']),
+        'quest_strategy_cache_misses_total': ('counter', 'Plans not found in the cache', stats['misses']),
+        'quest_strategy_cache_entries': ('gauge', 'Plans cached in memory', stats['entries']),
+        'quest_strategy_cache_bytes': ('gauge', 'Size of the plans cached in memory', stats['bytes']),
+        'quest_strategy_cache_max_bytes': ('gauge', 'Most the plans cached in memory can take up', stats['max_bytes']),
+    })
+
+
+def _may_dominate(requirements: array, skills: array, coverage: [float], total_coverage: float, gap: array) -> bool:
+    # Whether a quest with these requirements could end up with an xp gap at or below gap on every skill, with lamps
+    # adding at most coverage to each skill, and total_coverage between them. All by skill ordinal
+    needed = 0
+    for required, xp, covered, best in zip(requirements, skills, coverage, gap):
+        short = max(required - xp, 0) - best
+        if short > covered:
+            return False
+        if short > 0:
+            needed += short
+    return needed <= total_coverage
+
+
+def get_quest_data() -> Mapping[int, Quest]:
+    return get_catalog().quests
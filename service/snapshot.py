@@ -0,0 +1,129 @@
+import hashlib
+import json
+import marshal
+import struct
+from pathlib import Path
+from typing import Optional
+
+from .model.quest import Difficulty, Quest, parse_quest_data, quest_positions
+from .model.rewards import ClaimableChoiceXpReward, ClaimableXpReward, ChoiceXpReward, ImmediateXpReward, \
+    PrismaticXpReward, XpReward
+from .model.skills import Skills
+from .model.skillset import SkillSet
+from .schema import QuestDataError, validate_quest_data
+
+__all__ = ['compile_snapshot', 'load_snapshot', 'SNAPSHOT_FILE']
+
+SNAPSHOT_FILE = Path(__file__).resolve().parent / 'quest_data.snapshot'
+
+# Bump whenever the record layout below, or the way quests are built from it, changes
+FORMAT_VERSION = 4
+MAGIC = b'RSQO'
+# magic, format version, sha256 of the source json, payload length
+HEADER = struct.Struct('<4sI32sQ')
+
+
+def _skillset_record(skills: SkillSet) -> tuple:
+    # The xp vector and which skills are present, including zero entries, so quests come out identical to the json path
+    return tuple(skills.vector), bytes(skills.present)
+
+
+def _skillset_from_record(record: tuple) -> SkillSet:
+    return SkillSet.from_vector(*record)
+
+
+# Reward records are (type, skills flag value, amount, minimum level, source, prismatic size value), by index into this
+REWARD_TYPES = ('Immediate', 'Choice', 'ClaimableChoice', 'Tiered', 'Claimable', 'Prismatic')
+
+
+def _reward_record(data: dict) -> tuple:
+    size = data.get('size')
+    return (
+        REWARD_TYPES.index(data['type']),
+        XpReward.parse_skills(data['skills']).value,
+        data.get('amount', 0),
+        data.get('minimum_level', 1),
+        data.get('source', ''),
+        PrismaticXpReward.PrismaticSize[size.upper()].value if size else 0,
+    )
+
+
+def _reward_from_record(record: tuple, quest_id: int) -> XpReward:
+    # Builds exactly what XpReward.from_json does for the same reward
+    kind, skills, amount, minimum_level, source, size = record
+    kind, skills = REWARD_TYPES[kind], Skills(skills)
+    if kind == 'Immediate':
+        return ImmediateXpReward(quest_id=quest_id, amount=amount, skill=skills)
+    elif kind == 'Choice':
+        return ChoiceXpReward(quest_id=quest_id, amount=amount, skills=skills, minimum_level=minimum_level)
+    elif kind in ('ClaimableChoice', 'Tiered'):
+        return ClaimableChoiceXpReward(quest_id=quest_id, amount=amount, skills=skills, minimum_level=minimum_level,
+                                       source=source)
+    elif kind == 'Claimable':
+        return ClaimableXpReward(quest_id=quest_id, amount=amount, skill=skills, minimum_level=minimum_level,
+                                 source=source)
+    return PrismaticXpReward(quest_id=quest_id, size=PrismaticXpReward.PrismaticSize(size), skills=skills,
+                             minimum_level=minimum_level)
+
+
+def _quest_record(quest: Quest, data: dict) -> tuple:
+    return (
+        quest.id,
+        quest.name,
+        quest.difficulty.value,
+        quest.combat_requirement,
+        quest.qp_requirement,
+        tuple(sorted(quest.quest_prereqs)),
+        _skillset_record(quest.skill_prereqs),
+        quest.quest_points,
+        tuple(_reward_record(reward) for reward in data.get('xp_rewards', [])),
+        _skillset_record(quest.combat_training_requirement),
+        quest.location,
+    )
+
+
+def _quest_from_record(record: tuple, positions: dict[int, int]) -> Quest:
+    quest_id, name, difficulty, combat_req, qp_req, quest_reqs, skill_reqs, quest_points, rewards, route, location = record
+    return Quest(id=quest_id, name=name, difficulty=Difficulty(difficulty),
+                 combat_requirement=combat_req,
+                 qp_requirement=qp_req,
+                 quest_reqs=quest_reqs,
+                 skill_reqs=_skillset_from_record(skill_reqs),
+                 quest_points=quest_points,
+                 rewards=[_reward_from_record(reward, quest_id) for reward in rewards],
+                 combat_training_requirement=_skillset_from_record(route),
+                 positions=positions,
+                 location=location)
+
+
+def compile_snapshot(raw: bytes) -> bytes:
+    data = json.loads(raw)
+    errors = validate_quest_data(data)
+    if errors:
+        raise QuestDataError(errors)
+
+    quests = parse_quest_data(data)
+    records = tuple(_quest_record(quests[quest['id']], quest) for quest in data)
+    # marshal only ever holds plain data, loading it can't run anything
+    payload = marshal.dumps(records)
+    return HEADER.pack(MAGIC, FORMAT_VERSION, hashlib.sha256(raw).digest(), len(payload)) + payload
+
+
+# Returns None if the snapshot is missing, corrupt, or wasn't built from the json with the given sha256
+def load_snapshot(path: Path, version: str) -> Optional[dict[int, Quest]]:
+    try:
+        data = path.read_bytes()
+        if len(data) < HEADER.size:
+            return None
+        magic, format_version, digest, length = HEADER.unpack_from(data)
+        if magic != MAGIC or format_version != FORMAT_VERSION or digest.hex() != version:
+            return None
+        if len(data) != HEADER.size + length:
+            return None
+        records = marshal.loads(memoryview(data)[HEADER.size:])
+    except (OSError, ValueError, EOFError, TypeError):
+        return None
+
+    # Records are in the json's order, so quests get the same bits as they would parsed from it
+    positions = quest_positions((record[0], record[5]) for record in records)
+    return {record[0]: _quest_from_record(record, positions) for record in records}
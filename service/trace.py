@@ -0,0 +1,193 @@
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from .hoard import RewardHoard
+from .model import Player, SkillSet
+from .model.rewards import ClaimableXpReward, ClaimedChoiceXpReward, ImmediateXpReward, XpReward
+from .model.strategy import QuestStrategy, Training
+
+__all__ = ['Checkpoint', 'SearchTrace', 'remember_strategy', 'recall_strategy']
+
+# How many traced strategies recall_strategy() keeps
+RECENT_STRATEGIES = 32
+
+
+class Checkpoint:
+    # The greedy solver's state at the top of an iteration. The frontier isn't kept, it's fully determined by the
+    # player, so it's rebuilt instead. Everything else the solver will do from here on only depends on the key
+    __slots__ = ('steps', 'training_xp', 'skills', 'quests_completed', 'quest_points', 'hoard', 'key', 'loose_key')
+
+    def __init__(self, steps: int, training_xp: int, skills: SkillSet, quests_completed: int, quest_points: int,
+                 hoard: (XpReward, ...)):
+        # How much of the strategy's log had been written
+        self.steps = steps
+        self.training_xp = training_xp
+        self.skills = skills
+        self.quests_completed = quests_completed
+        self.quest_points = quest_points
+        # Oldest first, lamp ties go to whichever reward was hoarded first
+        self.hoard = hoard
+        self.key = (quests_completed, quest_points, skills.vector.tobytes(), tuple(map(id, hoard)))
+        # Everything but the skills and the order rewards were hoarded in, see SearchTrace.find_dominated
+        self.loose_key = (quests_completed, quest_points, frozenset(map(id, hoard)))
+
+    def shifted(self, steps: int, training_xp: int) -> 'Checkpoint':
+        return Checkpoint(self.steps + steps, self.training_xp + training_xp, self.skills, self.quests_completed,
+                          self.quest_points, self.hoard)
+
+    def restore(self, player: Player) -> RewardHoard:
+        player.skills = self.skills.copy()
+        player.quests_completed = self.quests_completed
+        player.quest_points = self.quest_points
+        return RewardHoard(self.hoard)
+
+
+class SearchTrace:
+    # Every checkpoint of one greedy solve, against one catalog version.
+    #
+    # A trace can be resumed from: pick a checkpoint, restore the player and hoard from it, and carry on solving. Given
+    # the trace it resumed from, the new solve watches for a checkpoint with the same key. From there on both solves
+    # would do exactly the same, so the rest of the old strategy is spliced on instead of solved again.
+    #
+    # Failing that, it watches for a checkpoint it dominates: the same quests and hoard, and at least as much xp in
+    # every skill. Everything the old strategy does from there is still possible, so its steps are replayed on top of
+    # the new state instead, dropping whatever training the extra xp has made unnecessary
+    def __init__(self, version: str, rejoin: Optional['SearchTrace'] = None, rejoin_strategy: QuestStrategy = None):
+        self.version = version
+        self.checkpoints: [Checkpoint] = []
+        self.rejoin = rejoin
+        self.rejoin_strategy = rejoin_strategy
+        self._index: dict[tuple, int] = {}
+        self._loose_index: dict[tuple, [int]] = {}
+
+    def __len__(self):
+        return len(self.checkpoints)
+
+    def __getitem__(self, idx: int) -> Checkpoint:
+        return self.checkpoints[idx]
+
+    def append(self, checkpoint: Checkpoint):
+        self._index.setdefault(checkpoint.key, len(self.checkpoints))
+        self._loose_index.setdefault(checkpoint.loose_key, []).append(len(self.checkpoints))
+        self.checkpoints.append(checkpoint)
+
+    def find(self, key: tuple) -> Optional[int]:
+        return self._index.get(key)
+
+    def find_dominated(self, checkpoint: Checkpoint) -> Optional[int]:
+        # The first checkpoint with the same quests and hoard, and no more xp in any skill
+        for idx in self._loose_index.get(checkpoint.loose_key, []):
+            if self.checkpoints[idx].skills.dominated_by(checkpoint.skills):
+                return idx
+        return None
+
+    def record(self, player: Player, hoard: RewardHoard, strategy: QuestStrategy) -> Optional[QuestStrategy]:
+        # Checkpoints the solver. Returns the finished strategy if it has rejoined the trace it resumed from
+        checkpoint = Checkpoint(len(strategy.log), strategy.training_xp, player.skills.copy(),
+                                player.quests_completed, player.quest_points, tuple(hoard))
+        self.append(checkpoint)
+
+        if self.rejoin is None:
+            return None
+        idx = self.rejoin.find(checkpoint.key)
+        if idx is not None:
+            old = self.rejoin[idx]
+            steps, training_xp = checkpoint.steps - old.steps, checkpoint.training_xp - old.training_xp
+            for later in self.rejoin.checkpoints[idx + 1:]:
+                self.append(later.shifted(steps, training_xp))
+            strategy.apply(self.rejoin_strategy.log[old.steps:])
+            strategy.training_xp += self.rejoin_strategy.training_xp - old.training_xp
+        else:
+            idx = self.rejoin.find_dominated(checkpoint)
+            if idx is None:
+                return None
+            self._replay(player, strategy, idx)
+        self.rejoin = self.rejoin_strategy = None
+        return strategy
+
+    def _replay(self, player: Player, strategy: QuestStrategy, idx: int):
+        # Follows the old strategy from its checkpoint idx, from a state that dominates it. Rewards give at least as
+        # much as they did, so only training has to be worked out again
+        skills = player.skills.copy()
+        quests_completed, quest_points = player.quests_completed, player.quest_points
+        log = self.rejoin_strategy.log
+        later = self.rejoin.checkpoints[idx + 1:]
+
+        for step in range(self.rejoin[idx].steps, len(log)):
+            while later and later[0].steps == step:
+                self.append(Checkpoint(len(strategy.log), strategy.training_xp, skills.copy(), quests_completed,
+                                       quest_points, later.pop(0).hoard))
+
+            kind, first, second = log[step]
+            if kind == 'quest':
+                quests_completed |= first.bit
+                quest_points += first.quest_points
+                # Same as Player.complete_quest, for the rewards it used straight away the first time round
+                for reward in first.xp_rewards:
+                    if isinstance(reward, ClaimableXpReward):
+                        if reward in second:
+                            skills += reward.get_reward()
+                    elif isinstance(reward, ImmediateXpReward):
+                        skills += reward.get_reward()
+                strategy.add_quest(first, list(second))
+            elif kind == 'add':
+                rewards = []
+                for reward in first:
+                    if isinstance(reward, Training):
+                        if skills[reward.skill] < reward.target:
+                            rewards.append(Training(reward.skill, reward.target, reward.target - skills[reward.skill]))
+                            strategy.training_xp += rewards[-1].xp
+                            skills[reward.skill] = reward.target
+                        continue
+                    skills += _gained(reward, skills)
+                    rewards.append(reward)
+                if rewards:
+                    strategy.add_rewards(rewards, second)
+            else:
+                skills += _gained(first, skills)
+                strategy.push_reward(first, second)
+
+        for checkpoint in later:
+            self.append(Checkpoint(len(strategy.log), strategy.training_xp, skills.copy(), quests_completed,
+                                   quest_points, checkpoint.hoard))
+
+    def resume_point(self, quests_completed: int) -> int:
+        # The furthest checkpoint whose completed quests have all been done. Of the checkpoints with the same quests
+        # completed, the first, as the training between quests might not have been
+        best = 0
+        for idx, checkpoint in enumerate(self.checkpoints):
+            if checkpoint.quests_completed & ~quests_completed:
+                break
+            if checkpoint.quests_completed != self.checkpoints[best].quests_completed:
+                best = idx
+        return best
+
+
+def _gained(reward, skills: SkillSet) -> SkillSet:
+    if isinstance(reward, ClaimedChoiceXpReward):
+        return reward.reward.get_reward(skill_choice=reward.skill_choice, player_skills=skills)
+    elif isinstance(reward, XpReward):
+        return reward.get_reward()
+    return SkillSet.empty()
+
+
+# Traced strategies by strategy_key(), for strategies that come back from the cache without their trace
+_lock = threading.Lock()
+_recent: OrderedDict[str, QuestStrategy] = OrderedDict()
+
+
+def remember_strategy(key: str, strategy: QuestStrategy):
+    with _lock:
+        _recent[key] = strategy
+        _recent.move_to_end(key)
+        while len(_recent) > RECENT_STRATEGIES:
+            _recent.popitem(last=False)
+
+
+def recall_strategy(key: str, version: str) -> Optional[QuestStrategy]:
+    with _lock:
+        strategy = _recent.get(key)
+    if strategy is None or strategy.trace is None or strategy.trace.version != version:
+        return None
+    return strategy
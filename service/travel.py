@@ -0,0 +1,185 @@
+import time
+from array import array
+from math import hypot
+from typing import Mapping
+
+from .model.quest import Quest
+from .model.rewards import ClaimedChoiceXpReward, XpReward
+from .model.skills import COMBAT_SKILLS
+from .model.strategy import QuestStrategy, Training
+
+__all__ = ['TravelCosts', 'shorten_travel', 'TRAVEL_TIME_LIMIT']
+
+# Walking further than this, in tiles, costs the same as teleporting
+TELEPORT_COST = 100.0
+# The default time shorten_travel spends looking for a shorter route, in seconds
+TRAVEL_TIME_LIMIT = 0.5
+# The longest runs of quests moved as one, see shorten_travel
+MAX_MOVE = 3
+
+COMBAT_MASK = sum(skill.value for skill in COMBAT_SKILLS)
+# Skills masks are Skills values, so every skill is every bit
+ALL_SKILLS = -1
+
+
+class TravelCosts:
+    # The cost of getting from every quest with a location to every other, walking or teleporting, whichever's less.
+    # Built once per catalog, as a flat n x n matrix over the quests with a location
+    def __init__(self, quests: Mapping[int, Quest], teleport_cost: float = TELEPORT_COST):
+        located = [quest for quest in quests.values() if quest.location is not None]
+        self.index: dict[int, int] = {quest.id: idx for idx, quest in enumerate(located)}
+        self.size = len(located)
+        self.matrix = array('d', bytes(8 * self.size * self.size))
+        for a, first in enumerate(located):
+            row = a * self.size
+            for b, second in enumerate(located[:a]):
+                cost = min(hypot(first.location[0] - second.location[0], first.location[1] - second.location[1]),
+                           teleport_cost)
+                self.matrix[row + b] = self.matrix[b * self.size + a] = cost
+
+    def cost(self, first_id: int, second_id: int) -> float:
+        # Nothing for quests with no known location, they're done wherever the player happens to be
+        a = self.index.get(first_id)
+        b = self.index.get(second_id)
+        if a is None or b is None:
+            return 0.0
+        return self.matrix[a * self.size + b]
+
+    def route_cost(self, quest_ids: [int]) -> float:
+        return sum(self.cost(a, b) for a, b in zip(quest_ids, quest_ids[1:]))
+
+    def __len__(self):
+        return self.size
+
+
+def _reward_skills(reward) -> int:
+    # The skills a reward or training can add xp to, as a Skills mask, or every skill if it isn't known
+    if isinstance(reward, Training):
+        return reward.skill.value
+    elif isinstance(reward, ClaimedChoiceXpReward):
+        return reward.skill_choice.value
+    elif isinstance(reward, XpReward):
+        return reward.skills.value
+    return ALL_SKILLS
+
+
+def _conflicts(items: list) -> [int]:
+    # For every quest in the plan and the rewards listed after it, a bitset of the others it has to stay on the same
+    # side of. Two only commute if neither changes anything the other depends on: the xp of the skills one adds xp to
+    # or is required to have, combat if it has a combat requirement, quest points if it has a quest point requirement,
+    # and the quests and rewards it needs done first. Plans reordered by swapping commuting neighbours see exactly the
+    # same skills, quest points and quests at every step, so stay just as feasible, and rewards and training stay
+    # just as big
+    writes, reads, ids = [], [], []
+    for item in items:
+        quest = item.quest
+        written = 0
+        for reward in item.rewards:
+            written |= _reward_skills(reward)
+        read = sum(skill.value for skill, xp in quest.skill_prereqs.items() if xp > 0)
+        if quest.combat_requirement:
+            read |= COMBAT_MASK
+        writes.append(written)
+        reads.append(read)
+        ids.append({reward.quest_id for reward in item.rewards if isinstance(reward, XpReward)} | quest.quest_prereqs)
+
+    conflicts = [0] * len(items)
+    for a, first in enumerate(items):
+        for b in range(a):
+            second = items[b]
+            if (writes[a] & (reads[b] | writes[b]) or writes[b] & reads[a]
+                    or first.quest.id in ids[b] or second.quest.id in ids[a]
+                    or first.quest.quest_points and second.quest.qp_requirement
+                    or second.quest.quest_points and first.quest.qp_requirement):
+                conflicts[a] |= 1 << b
+                conflicts[b] |= 1 << a
+    return conflicts
+
+
+def _best_move(order: [int], ids: [int], conflicts: [int], costs: TravelCosts) -> (float, tuple):
+    # The first move found that shortens the route: a run of up to MAX_MOVE quests moved before or after others
+    # (or-opt), or a run reversed (2-opt), as (change in cost, move). Only moves past or within quests that commute
+    # are tried, extending each move only until it would break that
+    n = len(order)
+    cost = costs.cost
+
+    def edge(i: int, j: int) -> float:
+        # Between positions i and j, or nothing past either end
+        if i < 0 or j >= n:
+            return 0.0
+        return cost(ids[order[i]], ids[order[j]])
+
+    for start in range(n):
+        # 2-opt: reversing order[start:end + 1] only changes its two outer edges
+        inside = 1 << order[start]
+        for end in range(start + 1, n):
+            if conflicts[order[end]] & inside:
+                break
+            inside |= 1 << order[end]
+            delta = (edge(start - 1, end) + edge(start, end + 1)) - (edge(start - 1, start) + edge(end, end + 1))
+            if delta < -1e-9:
+                return delta, ('reverse', start, end)
+
+        # or-opt: moving order[start:start + length] elsewhere
+        moved = 0
+        for length in range(1, MAX_MOVE + 1):
+            stop = start + length
+            if stop > n:
+                break
+            moved |= conflicts[order[stop - 1]]
+            removed = edge(start - 1, start) + edge(stop - 1, stop) - edge(start - 1, stop)
+            # Later, to just after position at
+            for at in range(stop, n):
+                if moved & (1 << order[at]):
+                    break
+                delta = edge(at, start) + edge(stop - 1, at + 1) - edge(at, at + 1) - removed
+                if delta < -1e-9:
+                    return delta, ('move', start, stop, at + 1)
+            # Earlier, to just before position at
+            for at in range(start - 1, -1, -1):
+                if moved & (1 << order[at]):
+                    break
+                delta = edge(at - 1, start) + edge(stop - 1, at) - edge(at - 1, at) - removed
+                if delta < -1e-9:
+                    return delta, ('move', start, stop, at)
+    return 0.0, None
+
+
+def shorten_travel(strategy: QuestStrategy, costs: TravelCosts, time_limit: float = TRAVEL_TIME_LIMIT) -> QuestStrategy:
+    # A copy of strategy with its quests reordered to cut down on travel between them, by local search, for at most
+    # time_limit seconds. Quests only ever move past others they commute with, see _conflicts, so the plan still
+    # meets every quest, skill, quest point and combat requirement along the way, and needs the same training.
+    # Rewards used and training done stay with the quest they're listed after
+    items = list(strategy.strategy.values())
+    if len(costs) < 2 or len(items) < 3:
+        return strategy
+    deadline = time.perf_counter() + time_limit
+    ids = [item.quest.id for item in items]
+    conflicts = _conflicts(items)
+    order = list(range(len(items)))
+
+    while time.perf_counter() < deadline:
+        _, move = _best_move(order, ids, conflicts, costs)
+        if move is None:
+            break
+        if move[0] == 'reverse':
+            _, start, end = move
+            order[start:end + 1] = order[start:end + 1][::-1]
+        else:
+            _, start, stop, at = move
+            run = order[start:stop]
+            if at > start:
+                order[start:at] = order[stop:at] + run
+            else:
+                order[at:stop] = run + order[at:start]
+
+    if order == sorted(order):
+        return strategy
+    shortened = QuestStrategy()
+    if strategy.preparation:
+        shortened.add_rewards(strategy.preparation)
+    for idx in order:
+        shortened.add_quest(items[idx].quest, items[idx].rewards)
+    shortened.training_xp = strategy.training_xp
+    shortened.origin = strategy.origin
+    return shortened
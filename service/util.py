@@ -10,4 +10,12 @@ def partition(pred, iterable):
 
 class MyOrderedDict(OrderedDict):
     def last(self):
-        return next(reversed(self))
\ No newline at end of file
+        return next(reversed(self))
+
+
+def bits(mask: int):
+    # The positions of the set bits, lowest first
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
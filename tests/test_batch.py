@@ -0,0 +1,66 @@
+import io
+import json
+
+from service import get_optimal_quest_strategy
+from service.batch import main, plan_profile, plan_profiles, read_profiles
+from service.model import SkillSet, Skills
+
+PROFILES = [
+    {'id': 'fresh'},
+    {'id': 'attack', 'skills': {'attack': Skills.min_xp_for_level(40)}},
+    {'id': 'quests', 'skills': {'Mining': 20_000}, 'quests': [1, 2, 3]},
+]
+
+
+def _expected(profile: dict) -> int:
+    stats = SkillSet()
+    for name, xp in profile.get('skills', {}).items():
+        stats[Skills[name.upper()]] = xp
+    return get_optimal_quest_strategy(profile.get('quests'), stats).training_xp
+
+
+def test_csv_and_ndjson_read_the_same():
+    csv = io.StringIO('id,quests,Attack,Mining\nattack,,37224,\nquests,1;2 3,,20000\n')
+    ndjson = io.StringIO('\n'.join(json.dumps(profile) for profile in PROFILES[1:]) + '\n')
+    from_csv = list(read_profiles(csv, 'csv'))
+    from_ndjson = list(read_profiles(ndjson))
+    assert [profile['quests'] for profile in from_csv] == [[], [1, 2, 3]]
+    assert [plan['training_xp'] for plan in plan_profiles(from_csv, 1)] == \
+           [plan['training_xp'] for plan in plan_profiles(from_ndjson, 1)]
+
+
+def test_worker_pool_plans_the_same_as_this_process():
+    plans = list(plan_profiles(PROFILES, workers=2))
+    assert [plan['id'] for plan in plans] == [profile['id'] for profile in PROFILES]
+    assert [plan['training_xp'] for plan in plans] == [_expected(profile) for profile in PROFILES]
+    assert all(plan['quests'] for plan in plans)
+
+
+def test_bad_lines_are_reported_and_skipped(tmp_path):
+    source = tmp_path / 'profiles.ndjson'
+    source.write_text('{"id": "ok"}\nnot json\n{"id": "bad", "skills": {"Cooking": "lots"}}\n')
+    output = tmp_path / 'plans.ndjson'
+    assert main([str(source), '--output', str(output), '--workers', '1', '--quiet']) == 1
+    plans = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [plan['id'] for plan in plans] == ['ok', 2, 'bad']
+    assert 'training_xp' in plans[0]
+    assert 'error' in plans[1] and 'error' in plans[2]
+
+
+def test_profiles_with_the_wrong_types_fail_on_their_own():
+    bad = [
+        ({'id': 1, 'skills': []}, '"skills" should be an object'),
+        ({'id': 2, 'skills': {'Baking': 10}}, 'Unknown skill Baking'),
+        ({'id': 3, 'skills': {'Cooking': True}}, 'Cooking xp should be a whole number'),
+        ({'id': 4, 'skills': {'Cooking': -1}}, 'Cooking xp should be a whole number'),
+        ({'id': 5, 'quests': '1,2'}, '"quests" should be a list of quest ids'),
+        ({'id': 6, 'quests': [1, '2']}, '"quests" should be a list of quest ids'),
+        ({'id': 7, 'target': '12'}, '"target" should be a quest id'),
+    ]
+    for profile, error in bad:
+        assert plan_profile(profile)['error'].startswith(error)
+    # Through the pool, every other profile is still planned
+    plans = list(plan_profiles([profile for profile, _ in bad] + PROFILES, workers=2))
+    assert [plan['id'] for plan in plans] == [profile['id'] for profile, _ in bad] + [p['id'] for p in PROFILES]
+    assert all('error' in plan for plan in plans[:len(bad)])
+    assert [plan['training_xp'] for plan in plans[len(bad):]] == [_expected(profile) for profile in PROFILES]
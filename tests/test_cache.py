@@ -0,0 +1,67 @@
+from random import Random
+
+from service.cache import StrategyCache, _encode, strategy_key
+from service.model import SkillSet, Skills
+
+
+def _record(seed: int) -> dict:
+    # Random enough not to compress away, so every record takes about the same room
+    random = Random(seed)
+    return {'training_xp': seed, 'steps': [[random.randrange(10 ** 9), []] for _ in range(50)]}
+
+
+def test_the_lru_is_bounded_by_bytes():
+    size = len(_encode(_record(0)))
+    cache = StrategyCache(max_bytes=int(size * 3.5))
+    for seed in range(3):
+        cache.put('v1', f'key{seed}', _record(seed))
+    # Using key0 makes key1 the least recently used
+    assert cache.get('v1', 'key0') == _record(0)
+    cache.put('v1', 'key3', _record(3))
+    assert cache.get('v1', 'key1') is None
+    assert [cache.get('v1', f'key{seed}')['training_xp'] for seed in (0, 2, 3)] == [0, 2, 3]
+    stats = cache.stats()
+    assert stats['bytes'] <= stats['max_bytes']
+    assert stats['entries'] == 3
+
+    # Anything bigger than the whole cache isn't kept, and doesn't push anything else out
+    small = StrategyCache(max_bytes=size // 2)
+    small.put('v1', 'key', _record(0))
+    assert small.get('v1', 'key') is None
+    assert small.stats()['bytes'] == 0
+
+
+def test_sqlite_keeps_records_across_instances(tmp_path):
+    path = tmp_path / 'cache.db'
+    StrategyCache(path=path).put('v1', 'key', _record(1))
+
+    cache = StrategyCache(path=path)
+    assert len(cache) == 0
+    assert cache.get('v1', 'key') == _record(1)
+    assert cache.disk_hits == 1
+    # Promoted to memory once found on disk
+    assert cache.get('v1', 'key') == _record(1)
+    assert cache.disk_hits == 1
+    assert len(cache) == 1
+
+
+def test_a_new_catalog_version_drops_everything(tmp_path):
+    path = tmp_path / 'cache.db'
+    cache = StrategyCache(path=path)
+    cache.put('v1', 'key', _record(1))
+    assert cache.get('v2', 'key') is None
+    assert len(cache) == 0
+    # Gone from disk too, even going back to the old version
+    assert cache.get('v1', 'key') is None
+    assert StrategyCache(path=path).get('v1', 'key') is None
+
+    cache.put('v2', 'key', _record(2))
+    assert StrategyCache(path=path).get('v2', 'key') == _record(2)
+
+
+def test_keys_only_depend_on_what_the_solver_sees():
+    stats = SkillSet({Skills.ATTACK: 100})
+    explicit = SkillSet({Skills.ATTACK: 100, Skills.MINING: 0})
+    assert strategy_key(stats, 5, 'greedy') == strategy_key(explicit, 5, 'greedy')
+    assert strategy_key(stats, 5, 'greedy') != strategy_key(stats, 5, 'exact')
+    assert strategy_key(stats, 5, 'greedy') != strategy_key(stats, 6, 'greedy')
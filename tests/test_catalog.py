@@ -0,0 +1,55 @@
+import json
+import os
+
+import pytest
+
+from service import catalog as catalog_module
+from service.catalog import get_catalog
+
+QUESTS = [
+    {'id': 1, 'name': 'First', 'difficulty': 'Novice', 'quest_points': 1},
+    {'id': 2, 'name': 'Second', 'difficulty': 'Novice', 'quest_points': 1, 'quest_requirements': [1]},
+]
+
+
+@pytest.fixture
+def data_file(tmp_path, monkeypatch):
+    path = tmp_path / 'quest_data.json'
+    path.write_text(json.dumps(QUESTS))
+    monkeypatch.setattr(catalog_module, 'DATA_FILE', path)
+    monkeypatch.setattr(catalog_module, 'SNAPSHOT_FILE', tmp_path / 'quest_data.snapshot')
+    monkeypatch.setattr(catalog_module, '_catalog', None)
+    return path
+
+
+def _touch(path, seconds: int):
+    # Moves the modification time on, so the change is seen even on file systems with coarse timestamps
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + seconds * 1_000_000_000))
+
+
+def test_unchanged_data_keeps_the_catalog(data_file):
+    catalog = get_catalog()
+    assert get_catalog() is catalog
+    assert sorted(catalog.quests) == [1, 2]
+
+
+def test_touched_data_keeps_the_quests(data_file):
+    catalog = get_catalog()
+    _touch(data_file, 1)
+    touched = get_catalog()
+    assert touched.version == catalog.version
+    assert touched.quests is catalog.quests
+    assert get_catalog() is touched
+
+
+def test_changed_data_reloads(data_file):
+    catalog = get_catalog()
+    data_file.write_text(json.dumps(QUESTS + [{'id': 3, 'name': 'Third', 'difficulty': 'Novice'}]))
+    _touch(data_file, 1)
+    reloaded = get_catalog()
+    assert reloaded is not catalog
+    assert reloaded.version != catalog.version
+    assert sorted(reloaded.quests) == [1, 2, 3]
+    # Anyone still holding the old catalog keeps a consistent view of it
+    assert sorted(catalog.quests) == [1, 2]
@@ -0,0 +1,29 @@
+from service.catalog import get_catalog
+from service.closure import build_closures, target_quests
+from service.model.quest import parse_quest_data
+
+
+def _chain(length):
+    # Each quest needs the one before it
+    return parse_quest_data([
+        {'id': n, 'name': f'Quest {n}', 'difficulty': 'Novice', 'quest_points': 1,
+         'quest_requirements': [n - 1] if n else []}
+        for n in range(length)
+    ])
+
+
+def test_long_chains_build_without_recursion():
+    quests = _chain(5000)
+    closures = build_closures(quests)
+    assert closures[4999].depth == 4999
+    assert closures[4999].quest_points == 5000
+    assert len(target_quests(quests, closures, 4999, 0, 0)) == 5000
+
+
+def test_quest_points_match_a_full_scan():
+    catalog = get_catalog()
+    for quest_id, closure in catalog.closures.items():
+        expected = catalog.quests[quest_id].quest_points + sum(
+            quest.quest_points for quest in catalog.quests.values() if quest.bit & closure.mask
+        )
+        assert closure.quest_points == expected
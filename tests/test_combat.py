@@ -0,0 +1,47 @@
+from itertools import product
+from random import Random
+
+import pytest
+
+from service.model import SkillSet, Skills
+from service.model.levels import XP_TABLE, level_for_xp
+from service.model.skills import COMBAT_SKILLS
+
+
+def _brute_force(levels, goal):
+    # Every combination of levels from the current ones up to 99, cheapest first
+    best = None
+    for targets in product(*(range(level, 100) for level in levels)):
+        if Skills.calculate_combat_level(dict(zip(COMBAT_SKILLS, targets))) < goal:
+            continue
+        cost = sum(XP_TABLE[target] - XP_TABLE[level] for level, target in zip(levels, targets))
+        if best is None or cost < best:
+            best = cost
+    return best
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_route_is_as_cheap_as_brute_force(seed):
+    random = Random(seed)
+    levels = [random.randint(95, 99) for _ in COMBAT_SKILLS]
+    stats = SkillSet({skill: XP_TABLE[level] for skill, level in zip(COMBAT_SKILLS, levels)})
+    current = Skills.calculate_combat_level(dict(zip(COMBAT_SKILLS, levels)))
+    top = Skills.calculate_combat_level({skill: 99 for skill in COMBAT_SKILLS})
+
+    for goal in range(current + 1, top + 1):
+        route = SkillSet.optimal_route_to_combat_level(goal, stats.copy())
+        reached = stats + route
+        assert Skills.calculate_combat_level({skill: level_for_xp(reached[skill]) for skill in COMBAT_SKILLS}) >= goal
+        assert route.total() == _brute_force(levels, goal)
+
+
+def test_route_from_a_fresh_account_reaches_every_goal():
+    for goal in range(3, 139):
+        reached = SkillSet() + SkillSet.optimal_route_to_combat_level(goal)
+        assert Skills.calculate_combat_level({skill: level_for_xp(reached[skill]) for skill in COMBAT_SKILLS}) >= goal
+
+
+def test_out_of_reach():
+    assert not SkillSet.optimal_route_to_combat_level(2)
+    with pytest.raises(ValueError):
+        SkillSet.optimal_route_to_combat_level(139)
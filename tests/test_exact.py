@@ -0,0 +1,48 @@
+from service.exact import exact_search
+from service.model import Player, SkillSet, Skills
+from service.model.levels import level_for_xp
+from service.model.quest import Difficulty, Quest, quest_positions
+from service.model.rewards import ClaimableXpReward, PrismaticXpReward
+from service.service import optimal_search
+
+
+def test_trains_to_a_reward_threshold_when_that_is_cheaper():
+    # Training Magic to 50 unlocks 100k xp, which gets most of the way to the 60 the second quest needs
+    positions = quest_positions([(1, []), (2, [1])])
+    first = Quest(1, 'First', Difficulty.NOVICE, 0, 0, [], SkillSet.empty(), 1,
+                  [ClaimableXpReward(1, 100000, Skills.MAGIC, 50, 'a chest')], positions=positions)
+    second = Quest(2, 'Second', Difficulty.NOVICE, 0, 0, [1], SkillSet({Skills.MAGIC: Skills.min_xp_for_level(60)}), 1,
+                   [], positions=positions)
+    quests = {1: first, 2: second}
+
+    greedy = optimal_search(Player(), quests)
+    result = exact_search(Player(), quests, greedy)
+
+    assert greedy.training_xp == Skills.min_xp_for_level(60)
+    assert result.proven
+    assert result.training_xp == Skills.min_xp_for_level(60) - 100000
+
+
+def test_trains_up_to_the_level_a_prismatic_lamp_does_best_at():
+    # A huge lamp used straight away is worth next to nothing. Training most of the way to 60 first makes it worth
+    # over 17k xp
+    positions = quest_positions([(1, []), (2, [1])])
+    first = Quest(1, 'First', Difficulty.NOVICE, 0, 0, [], SkillSet.empty(), 1,
+                  [PrismaticXpReward(1, PrismaticXpReward.PrismaticSize.HUGE, Skills.MAGIC, 1)], positions=positions)
+    required = Skills.min_xp_for_level(60)
+    second = Quest(2, 'Second', Difficulty.NOVICE, 0, 0, [1], SkillSet({Skills.MAGIC: required}), 1, [],
+                   positions=positions)
+    quests = {1: first, 2: second}
+
+    greedy = optimal_search(Player(), quests)
+    result = exact_search(Player(), quests, greedy)
+
+    # The least training of any plan: train to some xp, use the lamp, and train the rest
+    amounts = PrismaticXpReward.PRISMATIC_AMOUNTS[PrismaticXpReward.PrismaticSize.HUGE]
+    least = min(xp + max(0, required - xp - amounts[level_for_xp(xp)]) for xp in range(required + 1))
+    assert greedy.training_xp == 273299
+    assert result.proven
+    assert result.training_xp == result.lower_bound == least < 257248
+    assert [str(reward) for reward in result.strategy[1].rewards] == [
+        'Train Magic to level 60 (+247867 xp)', 'Use Huge xp lamp on Magic', 'Train Magic to level 60 (+8505 xp)'
+    ]
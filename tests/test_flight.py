@@ -0,0 +1,78 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from service import get_optimal_quest_strategy, get_metrics
+from service.flight import SingleFlight
+from service.model import SkillSet, Skills
+
+
+def _coalesced(flights: [SingleFlight], callers: int) -> ([int], int):
+    # Every caller wants the same thing, counting how many times it's worked out
+    runs = []
+    lock = threading.Lock()
+
+    def call(n):
+        with flights[n % len(flights)].acquire('key') as hold:
+            if hold.result is None and not (hold.waited and runs):
+                with lock:
+                    runs.append(n)
+                time.sleep(0.1)
+                hold.result = 'plan'
+            return hold.result
+
+    with ThreadPoolExecutor(callers) as pool:
+        results = list(pool.map(call, range(callers)))
+    return results, len(runs)
+
+
+def test_identical_calls_run_once():
+    flights = SingleFlight()
+    results, runs = _coalesced([flights], 8)
+    assert runs == 1
+    assert results == ['plan'] * 8
+    # Nothing's kept once everyone's done
+    assert not len(flights)
+
+
+def test_lock_files_hold_keys_across_instances(tmp_path):
+    # Instances sharing a lock directory stand in for processes. They can't hand results over, but the ones that waited
+    # know to look for one
+    results, runs = _coalesced([SingleFlight(tmp_path), SingleFlight(tmp_path)], 2)
+    assert runs == 1
+
+
+def test_unrelated_keys_dont_share_lock_files(tmp_path):
+    first, second = SingleFlight(tmp_path, timeout=0.2), SingleFlight(tmp_path, timeout=0.2)
+    # Keys that start the same, as cache keys for the same catalog version might
+    with first.acquire('abc:1'), second.acquire('abc:2') as hold:
+        assert not hold.waited
+    # Lock files go once they're released
+    assert not list(tmp_path.iterdir())
+    with first.acquire('abc:1'):
+        hold = second.acquire('abc:1')
+        assert hold.waited
+        hold.release()
+
+
+def test_abandoned_holds_are_released():
+    flights = SingleFlight()
+    flights.acquire('key')
+    hold = flights.acquire('key')
+    assert not hold.waited
+    hold.release()
+
+
+def test_identical_solves_at_once_solve_once():
+    def solves():
+        for line in get_metrics().splitlines():
+            if line.startswith('quest_solves_total{solver="greedy"}'):
+                return float(line.split()[1])
+        return 0.0
+
+    stats = SkillSet({Skills.FISHING: Skills.min_xp_for_level(37)})
+    before = solves()
+    with ThreadPoolExecutor(6) as pool:
+        plans = list(pool.map(lambda _: get_optimal_quest_strategy(initial_stats=stats), range(6)))
+    assert solves() == before + 1
+    assert len({plan.training_xp for plan in plans}) == 1
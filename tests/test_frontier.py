@@ -0,0 +1,78 @@
+from random import Random
+
+import pytest
+
+from service.catalog import get_catalog
+from service.frontier import Frontier
+from service.model import Player, SkillSet, Skills
+from service.model.skillset import SKILLS
+
+
+def _eligible(quests, player):
+    # What the frontier replaced: scan every quest, easiest first
+    return sorted(quest for quest in quests.values() if quest.satisfies_requirements(player))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_pop_eligible_matches_a_full_scan(seed):
+    random = Random(seed)
+    quests = get_catalog().quests
+    player = Player(SkillSet())
+    frontier = Frontier(quests, player)
+
+    while frontier:
+        expected = _eligible(quests, player)
+        quest = frontier.pop_eligible()
+        if not expected:
+            assert quest is None
+            # Stuck: raise a few skills, as the solver's training would
+            for skill in random.sample(SKILLS, 3):
+                player.skills[skill] = max(player.skills[skill], Skills.min_xp_for_level(random.randint(20, 99)))
+            if all(player.skills[skill] >= Skills.min_xp_for_level(99) for skill in SKILLS):
+                break
+            continue
+
+        assert quest is expected[0]
+        player.complete_quest(quest.bit, quest.quest_points, quest.xp_rewards)
+        frontier.complete(quest)
+
+
+def test_pending_is_every_quest_with_its_prereqs_done():
+    quests = get_catalog().quests
+    player = Player(SkillSet())
+    frontier = Frontier(quests, player)
+    for _ in range(20):
+        quest = frontier.pop_eligible()
+        player.complete_quest(quest.bit, quest.quest_points, quest.xp_rewards)
+        frontier.complete(quest)
+
+    expected = sorted(
+        quest for quest in quests.values()
+        if not quest.bit & player.quests_completed and not quest.prereq_mask & ~player.quests_completed
+    )
+    assert frontier.pending() == expected
+
+
+def test_lowered_stats_are_rebuilt():
+    quests = get_catalog().quests
+    player = Player(SkillSet({skill: Skills.min_xp_for_level(99) for skill in SKILLS}))
+    frontier = Frontier(quests, player)
+    player.skills = SkillSet()
+    assert frontier.pop_eligible() is _eligible(quests, player)[0]
+
+
+@pytest.mark.parametrize('level', [1, 30, 60])
+def test_passing_over_prospects_picks_the_same(monkeypatch, level):
+    # Quests whose gap can't beat the best so far aren't tried out with lamps, which mustn't change the plan
+    from service import service
+
+    def lines(strategy):
+        return [str(reward) for quest_id in strategy for reward in strategy[quest_id].rewards] + list(strategy)
+
+    stats = SkillSet({skill: Skills.min_xp_for_level(level) for skill in SKILLS})
+    quests = get_catalog().quests
+    pruned = service.optimal_search(Player(stats.copy()), quests)
+    monkeypatch.setattr(service, '_may_dominate', lambda *args: True)
+    full = service.optimal_search(Player(stats.copy()), quests)
+    assert pruned.training_xp == full.training_xp
+    assert lines(pruned) == lines(full)
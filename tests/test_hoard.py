@@ -0,0 +1,99 @@
+from random import Random
+
+import pytest
+
+from service.catalog import get_catalog
+from service.hoard import RewardHoard
+from service.model import SkillSet, Skills
+from service.model.rewards import ClaimableXpReward, ImmediateXpReward
+from service.model.skillset import SKILLS
+
+
+def _next_lamp(rewards, player_skills, xp_gap, skill):
+    # What the hoard replaced: sort every usable reward, then take the one closest to the gap. Rewards are listed oldest
+    # first and the sort is stable, so ties go to whichever was hoarded first
+    options = sorted(reward for reward in rewards if reward.is_claimable(player_skills, skill))
+    if not options:
+        return None
+    return min(options, key=lambda reward: abs(reward.amount(player_skills, skill) - xp_gap[skill]))
+
+
+def _rewards():
+    return [
+        reward for quest in get_catalog().quests.values() for reward in quest.xp_rewards
+        if not isinstance(reward, ImmediateXpReward) or isinstance(reward, ClaimableXpReward)
+    ]
+
+
+def _random_skills(random):
+    return SkillSet({skill: Skills.min_xp_for_level(random.randint(1, 99)) for skill in SKILLS})
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_next_lamp_matches_sorting_the_hoard(seed):
+    random = Random(seed)
+    rewards = random.sample(_rewards(), 60)
+    hoard = RewardHoard(rewards)
+    held = list(rewards)
+
+    for _ in range(300):
+        player_skills = _random_skills(random)
+        xp_gap = SkillSet({skill: random.randint(0, 200000) for skill in SKILLS})
+        skill = random.choice(SKILLS)
+        expected = _next_lamp(held, player_skills, xp_gap, skill)
+        assert hoard.next_lamp(player_skills, xp_gap, skill) is expected
+        if expected is not None and random.random() < 0.3:
+            hoard.remove(expected)
+            held.remove(expected)
+
+
+def test_rollback_restores_the_hoard():
+    random = Random(0)
+    rewards = _rewards()
+    hoard = RewardHoard(rewards[:40])
+    before = list(hoard)
+
+    checkpoint = hoard.checkpoint()
+    for reward in random.sample(before, 15):
+        hoard.remove(reward)
+    hoard.update(rewards[40:50])
+    hoard.rollback(checkpoint)
+
+    assert list(hoard) == before
+    player_skills = _random_skills(random)
+    xp_gap = SkillSet({skill: 50000 for skill in SKILLS})
+    for skill in SKILLS:
+        assert hoard.next_lamp(player_skills, xp_gap, skill) is _next_lamp(before, player_skills, xp_gap, skill)
+
+
+def test_pop_claimable_takes_what_the_player_meets():
+    random = Random(1)
+    claimables = [reward for reward in _rewards() if isinstance(reward, ClaimableXpReward)]
+    hoard = RewardHoard(claimables)
+    player_skills = _random_skills(random)
+
+    expected = [reward for reward in claimables if reward.is_claimable(player_skills)]
+    assert hoard.pop_claimable(player_skills) == expected
+    assert list(hoard) == [reward for reward in claimables if reward not in expected]
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_coverage_bounds_any_use_of_the_hoard(seed):
+    random = Random(seed)
+    hoard = RewardHoard(random.sample(_rewards(), 40))
+    coverage, total = hoard.coverage()
+    player_skills = _random_skills(random)
+    added = SkillSet.empty()
+    while True:
+        skill = random.choice(SKILLS)
+        lamp = hoard.next_lamp(player_skills, SkillSet({skill: random.randint(0, 50_000)}), skill)
+        if lamp is None:
+            if not any(hoard.next_lamp(player_skills, SkillSet({other: 1}), other) for other in SKILLS):
+                break
+            continue
+        hoard.remove(lamp)
+        reward = lamp.get_reward(skill_choice=skill, player_skills=player_skills)
+        player_skills += reward
+        added += reward
+    assert all(added[skill] <= coverage[skill.ordinal] for skill in SKILLS)
+    assert added.total() <= total
@@ -0,0 +1,36 @@
+import gzip
+
+import pytest
+
+from app import app
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+def test_home_is_compressed_once_and_revalidated(client):
+    plain = client.get('/', headers={'Accept-Encoding': 'identity'})
+    compressed = client.get('/', headers={'Accept-Encoding': 'gzip, deflate'})
+    assert plain.status_code == compressed.status_code == 200
+    assert 'Content-Encoding' not in plain.headers
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.data) == plain.data
+    assert b'quest_1_complete' in plain.data
+
+    # Different representations, different ETags, both cacheable
+    assert plain.headers['ETag'] != compressed.headers['ETag']
+    assert 'max-age' in compressed.headers['Cache-Control']
+    assert compressed.headers['Vary'] == 'Accept-Encoding'
+
+    again = client.get('/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': compressed.headers['ETag']})
+    assert again.status_code == 304
+    assert not again.data
+    assert again.headers['ETag'] == compressed.headers['ETag']
+
+
+def test_stale_etags_get_the_page(client):
+    response = client.get('/', headers={'If-None-Match': '"not-the-page"'})
+    assert response.status_code == 200
+    assert response.data
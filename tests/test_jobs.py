@@ -0,0 +1,63 @@
+import pytest
+
+from app import app
+from service import get_optimal_quest_strategy, metrics
+from service.jobs import JobQueue, QueueFull
+from service.model import SkillSet, Skills
+
+STATS = SkillSet({Skills.ATTACK: Skills.min_xp_for_level(40)})
+
+
+@pytest.fixture
+def queue():
+    queue = JobQueue(workers=1, max_pending=2, time_limit=30)
+    yield queue
+    queue.shutdown()
+
+
+def test_jobs_solve_the_same_as_the_request_thread(queue):
+    job = queue.wait(queue.submit('greedy', 0, STATS), 60)
+    assert job.status == 'done'
+    assert job.result().training_xp == get_optimal_quest_strategy(initial_stats=STATS).training_xp
+    assert queue.get(job.id) is job
+    assert not len(queue)
+
+
+def test_workers_dont_inherit_held_locks(queue):
+    # Workers start while another thread is recording metrics. A forked worker would find the lock held for good
+    with metrics._lock:
+        job = queue.submit('greedy', 0, STATS)
+    assert queue.wait(job, 60).status == 'done'
+
+
+def test_full_queues_turn_jobs_away(queue):
+    jobs = [queue.submit('greedy', 0, SkillSet({Skills.MINING: xp})) for xp in (1000, 2000)]
+    with pytest.raises(QueueFull) as e:
+        queue.submit('greedy')
+    assert e.value.retry_after >= 1
+    for job in jobs:
+        queue.wait(job, 60)
+    assert queue.wait(queue.submit('greedy'), 60).status == 'done'
+
+
+def test_jobs_stop_at_their_time_limit(queue):
+    job = queue.wait(queue.submit('greedy', 0, SkillSet({Skills.SLAYER: 5000}), time_limit=1e-6), 60)
+    assert job.status == 'timed out'
+    assert job.error
+
+
+def test_exact_searches_are_jobs():
+    client = app.test_client()
+    headers = {'Accept': 'application/json'}
+    submitted = client.post('/result', data={'exact': '1', 'skillAttackType': 'level', 'skillAttackValue': '50'},
+                            headers=headers)
+    assert submitted.status_code in (200, 202)
+    done = client.get(submitted.json['url'], query_string={'wait': 30}, headers=headers)
+    assert done.status_code == 200
+    assert done.json['status'] == 'done'
+    assert done.json['training_xp'] <= done.json['greedy_training_xp']
+    assert done.json['plan']['steps']
+
+    page = client.post('/result', data={'job': '1'})
+    assert page.status_code == 303
+    assert client.get('/jobs/nothing').status_code == 404
@@ -0,0 +1,43 @@
+import re
+
+from service import metrics
+from service.catalog import get_catalog
+from service.model import Player, SkillSet
+from service.service import get_metrics, optimal_search
+
+SAMPLE = re.compile(r'^[a-z_]+(\{[a-z_]+="[^"]*"(,[a-z_]+="[^"]*")*\})? \S+$')
+
+
+def _value(text, name):
+    for line in text.splitlines():
+        if line.startswith(name + ' '):
+            return float(line.split()[1])
+    return 0.0
+
+
+def test_solves_are_counted():
+    before = get_metrics()
+    strategy = optimal_search(Player(SkillSet()), get_catalog().quests)
+    after = get_metrics()
+
+    solves = 'quest_solves_total{solver="greedy"}'
+    assert _value(after, solves) == _value(before, solves) + 1
+    iterations = _value(after, 'quest_solver_iterations_total') - _value(before, 'quest_solver_iterations_total')
+    assert iterations >= len(strategy.strategy)
+    training = _value(after, 'quest_solver_training_total') - _value(before, 'quest_solver_training_total')
+    assert training > 0
+
+
+def test_histograms_are_cumulative():
+    for value in (0.001, 0.3, 100):
+        metrics.observe('quest_phase_seconds', value, phase='test')
+    lines = [line for line in metrics.render().splitlines() if 'phase="test"' in line]
+    buckets = [float(line.split()[1]) for line in lines if '_bucket' in line]
+    assert buckets == sorted(buckets)
+    assert buckets[0] == 1 and buckets[-1] == 3
+    assert 'quest_phase_seconds_count{phase="test"} 3' in lines
+
+
+def test_the_text_format_parses():
+    for line in get_metrics().splitlines():
+        assert line.startswith('# HELP ') or line.startswith('# TYPE ') or SAMPLE.match(line), line
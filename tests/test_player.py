@@ -0,0 +1,78 @@
+from random import Random
+
+from service.model import Player, SkillSet, Skills
+from service.model.skills import COMBAT_SKILLS
+from service.model.skillset import SKILLS
+
+
+def test_rollback_puts_back_exactly_what_was_gained():
+    random = Random(0)
+    player = Player(SkillSet({Skills.ATTACK: 5000, Skills.MINING: 0}))
+    before = player.skills.copy()
+    checkpoint = player.checkpoint()
+    for _ in range(50):
+        player.gain(SkillSet({random.choice(SKILLS): random.randint(1, 10_000)}))
+    after = player.skills.copy()
+    level = player.level(Skills.ATTACK)
+
+    changes = player.rollback(checkpoint)
+    assert player.skills == before
+    assert player.skills.keys() == before.keys()
+    assert player.level(Skills.ATTACK) == Skills.level_for_xp(5000)
+
+    # Redoing the changes gets back to where the rolled back ones got to, and can be rolled back in turn
+    player.apply(changes)
+    assert player.skills == after
+    assert player.level(Skills.ATTACK) == level
+    player.rollback(checkpoint)
+    assert player.skills == before
+    player.commit()
+    assert player.checkpoint() == 0
+
+
+def _combat_level(skills: SkillSet) -> int:
+    # Worked out from scratch, without the player's cached levels
+    return Skills.calculate_combat_level({skill: Skills.level_for_xp(skills[skill]) for skill in COMBAT_SKILLS})
+
+
+def test_levels_follow_in_place_changes():
+    player = Player()
+    assert player.combat_level == _combat_level(player.skills)
+    player.skills[Skills.ATTACK] = Skills.min_xp_for_level(70)
+    assert player.level(Skills.ATTACK) == 70
+    assert player.combat_level == _combat_level(player.skills)
+    player.skills += SkillSet({Skills.STRENGTH: Skills.min_xp_for_level(80)})
+    assert player.level(Skills.STRENGTH) == 80
+    assert player.combat_level == _combat_level(player.skills)
+    player.skills.subtract(SkillSet({Skills.ATTACK: Skills.min_xp_for_level(70)}))
+    assert player.level(Skills.ATTACK) == 1
+    assert player.combat_level == _combat_level(player.skills)
+
+
+def test_levels_follow_reassigned_skills():
+    player = Player()
+    player.level(Skills.DEFENCE)
+    stats = SkillSet({skill: Skills.min_xp_for_level(60) for skill in COMBAT_SKILLS})
+    player.skills = stats
+    assert player.level(Skills.DEFENCE) == 60
+    assert player.combat_level == _combat_level(stats)
+    # A copy with the same version number is still a different SkillSet
+    copy = stats.copy()
+    copy[Skills.DEFENCE] = Skills.min_xp_for_level(90)
+    player.skills = copy
+    assert player.level(Skills.DEFENCE) == 90
+    assert player.combat_level == _combat_level(copy)
+
+
+def test_levels_follow_gain_and_rollback():
+    player = Player()
+    checkpoint = player.checkpoint()
+    player.gain(SkillSet({Skills.MAGIC: Skills.min_xp_for_level(94)}))
+    assert player.level(Skills.MAGIC) == 94
+    assert player.combat_level == _combat_level(player.skills)
+    changes = player.rollback(checkpoint)
+    assert player.level(Skills.MAGIC) == 1
+    assert player.combat_level == _combat_level(player.skills)
+    player.apply(changes)
+    assert player.level(Skills.MAGIC) == 94
+    assert player.combat_level == _combat_level(player.skills)
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+from markupsafe import escape
+
+from app import app
+from service import get_optimal_quest_strategy
+from service.cache import get_cache
+from service.model import SkillSet, Skills
+
+FORM = {'skillAttackType': 'level', 'skillAttackValue': '40'}
+
+
+@pytest.fixture
+def client():
+    # Nothing cached, so the plan streams from the solver as it's worked out
+    get_cache().clear()
+    return app.test_client()
+
+
+def _strategy():
+    stats = SkillSet()
+    stats[Skills.ATTACK] = Skills.min_xp_for_level(40)
+    return get_optimal_quest_strategy(initial_stats=stats)
+
+
+def test_the_plan_is_streamed_as_html(client):
+    response = client.post('/result', data=FORM)
+    assert response.status_code == 200
+    assert response.is_streamed
+    body = response.get_data(as_text=True)
+    strategy = _strategy()
+    assert body.rstrip().endswith('</html>')
+    # Every quest in plan order, and every reward, listed as the solver decides to use it
+    position = 0
+    for quest_id in strategy:
+        position = body.index(f'>Complete {escape(strategy[quest_id].quest.name)}<', position)
+    for reward in strategy.preparation + [reward for item in strategy.strategy.values() for reward in item.rewards]:
+        assert f'>{escape(reward)}<' in body
+
+
+def test_the_plan_is_streamed_as_ndjson(client):
+    response = client.post('/result', data=FORM, headers={'Accept': 'application/x-ndjson'})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    strategy = _strategy()
+    assert lines[-1] == {'training_xp': strategy.training_xp}
+    assert [line['quest'] for line in lines[:-1] if 'name' in line] == list(strategy)
+    # Rewards for a quest can come in more than one line, once the solver decides to use them, listed under the last
+    # quest completed if there's no quest given
+    rewards, last = {}, None
+    for line in lines[:-1]:
+        if 'name' in line:
+            last = line['quest']
+        rewards.setdefault(line['quest'] or last, []).extend(line['rewards'])
+    assert sorted(rewards.get(None, [])) == sorted(str(reward) for reward in strategy.preparation)
+    for quest_id in strategy:
+        assert sorted(rewards[quest_id]) == sorted(str(reward) for reward in strategy[quest_id].rewards)
@@ -0,0 +1,109 @@
+import hashlib
+import json
+
+import pytest
+
+from service import snapshot
+from service.catalog import DATA_FILE
+from service.model.quest import Quest, parse_quest_data
+from service.schema import QuestDataError, check_quest_references, validate_quest_data
+from service.snapshot import compile_snapshot, load_snapshot
+
+
+def _quest_fields(quest: Quest) -> dict:
+    fields = {name: getattr(quest, name) for name in Quest.__slots__ if name != 'xp_rewards'}
+    fields['xp_rewards'] = [(type(reward), vars(reward)) for reward in quest.xp_rewards]
+    return fields
+
+
+@pytest.fixture(scope='module')
+def raw() -> bytes:
+    return DATA_FILE.read_bytes()
+
+
+def test_snapshot_builds_the_same_quests_as_the_json(raw, tmp_path):
+    path = tmp_path / 'quest_data.snapshot'
+    path.write_bytes(compile_snapshot(raw))
+    loaded = load_snapshot(path, hashlib.sha256(raw).hexdigest())
+    parsed = parse_quest_data(json.loads(raw))
+    assert list(loaded) == list(parsed)
+    for quest_id, quest in parsed.items():
+        assert _quest_fields(loaded[quest_id]) == _quest_fields(quest)
+
+
+def test_locations_survive_the_snapshot(tmp_path):
+    raw = json.dumps([{'id': 1, 'name': 'A', 'difficulty': 'Novice', 'location': [3200, 3200]}]).encode()
+    path = tmp_path / 'quest_data.snapshot'
+    path.write_bytes(compile_snapshot(raw))
+    assert load_snapshot(path, hashlib.sha256(raw).hexdigest())[1].location == (3200, 3200)
+
+
+def test_stale_snapshots_are_ignored(raw, tmp_path, monkeypatch):
+    path = tmp_path / 'quest_data.snapshot'
+    compiled = compile_snapshot(raw)
+    version = hashlib.sha256(raw).hexdigest()
+
+    # Built from other quest data
+    path.write_bytes(compiled)
+    assert load_snapshot(path, hashlib.sha256(raw + b' ').hexdigest()) is None
+    # Built by an older layout
+    magic, format_version, digest, length = snapshot.HEADER.unpack_from(compiled)
+    path.write_bytes(snapshot.HEADER.pack(magic, format_version - 1, digest, length) + compiled[snapshot.HEADER.size:])
+    assert load_snapshot(path, version) is None
+    monkeypatch.setattr(snapshot, 'FORMAT_VERSION', format_version + 1)
+    path.write_bytes(compiled)
+    assert load_snapshot(path, version) is None
+    monkeypatch.undo()
+    # Truncated, corrupt, or missing
+    path.write_bytes(compiled[:-10])
+    assert load_snapshot(path, version) is None
+    path.write_bytes(compiled[:snapshot.HEADER.size] + b'\x00' * (len(compiled) - snapshot.HEADER.size))
+    assert load_snapshot(path, version) is None
+    assert load_snapshot(tmp_path / 'missing', version) is None
+
+
+def test_the_real_data_is_valid(raw):
+    assert validate_quest_data(json.loads(raw)) == []
+
+
+@pytest.mark.parametrize('quest, error', [
+    ({'name': 'A', 'difficulty': 'Novice'}, 'missing required key "id"'),
+    ({'id': 1, 'name': 'A', 'difficulty': 'Novice', 'colour': 'red'}, 'unknown key "colour"'),
+    ({'id': '1', 'name': 'A', 'difficulty': 'Novice'}, '"id" should be int, found str'),
+    ({'id': 1, 'name': 'A', 'difficulty': 'Novice', 'quest_points': True}, '"quest_points" should be int'),
+    ({'id': 1, 'name': 'A', 'difficulty': 'Impossible'}, 'unknown difficulty "Impossible"'),
+    ({'id': 1, 'name': 'A', 'difficulty': 'Novice', 'combat_requirement': 200}, 'combat requirement'),
+    ({'id': 1, 'name': 'A', 'difficulty': 'Novice', 'quest_requirements': ['2']}, 'must be quest ids'),
+    ({'id': 1, 'name': 'A', 'difficulty': 'Novice', 'skill_requirements': [{'skill': 'Cooking', 'level': 121}]},
+     'level must be between 1 and 120'),
+    ({'id': 1, 'name': 'A', 'difficulty': 'Novice', 'skill_requirements': [{'skill': 'Baking', 'level': 10}]},
+     'unknown skill "Baking"'),
+    ({'id': 1, 'name': 'A', 'difficulty': 'Novice', 'xp_rewards': [{'type': 'Gift', 'skills': 'Cooking'}]},
+     "unknown reward type 'Gift'"),
+    ({'id': 1, 'name': 'A', 'difficulty': 'Novice', 'xp_rewards': [{'type': 'Immediate', 'skills': 'Cooking'}]},
+     'missing required key "amount"'),
+    ({'id': 1, 'name': 'A', 'difficulty': 'Novice',
+      'xp_rewards': [{'type': 'Immediate', 'skills': 'Cooking', 'amount': 0}]}, 'amount must be positive'),
+    ({'id': 1, 'name': 'A', 'difficulty': 'Novice',
+      'xp_rewards': [{'type': 'Prismatic', 'skills': 'Cooking', 'size': 'Tiny'}]}, 'unknown prismatic size "Tiny"'),
+    ({'id': 1, 'name': 'A', 'difficulty': 'Novice', 'location': [1, 2, 3]}, 'location must be [x, y]'),
+])
+def test_schema_errors(quest, error):
+    errors = validate_quest_data([quest])
+    assert len(errors) == 1
+    assert error in errors[0]
+    assert errors[0].startswith('quest[0]')
+
+
+def test_bad_data_isnt_compiled():
+    quests = [{'id': 1, 'name': 'A', 'difficulty': 'Novice'}, {'id': 1, 'name': 'B', 'difficulty': 'Novice'}]
+    with pytest.raises(QuestDataError) as e:
+        compile_snapshot(json.dumps(quests).encode())
+    assert e.value.errors == ['quest[1] (B): duplicate quest id 1']
+    assert validate_quest_data({}) == ['quest data must be a list of quests']
+
+
+def test_unknown_prereqs_are_only_warned_about():
+    quests = [{'id': 1, 'name': 'A', 'difficulty': 'Novice', 'quest_requirements': [7]}]
+    assert validate_quest_data(quests) == []
+    assert check_quest_references(quests) == ['quest 1 (A): requires unknown quest 7, it will never be scheduled']
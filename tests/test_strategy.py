@@ -0,0 +1,81 @@
+import json
+
+from app import app
+from service import get_optimal_quest_strategy, get_quest_data
+from service.model import SkillSet, Skills
+from service.model.strategy import QuestStrategy, describe
+
+STATS = SkillSet({Skills.ATTACK: Skills.min_xp_for_level(40)})
+
+
+def _lines(strategy: QuestStrategy) -> [str]:
+    return [str(reward) for reward in strategy.preparation] + [
+        line for quest_id in strategy
+        for line in [strategy[quest_id].quest.name] + [str(reward) for reward in strategy[quest_id].rewards]
+    ]
+
+
+def _wire_lines(plan: dict) -> [str]:
+    return [describe(ref, plan) for ref in plan.get('preparation', [])] + [
+        line for quest_id, refs in plan['steps']
+        for line in [plan['quests'][str(quest_id)]] + [describe(ref, plan) for ref in refs]
+    ]
+
+
+def test_records_rebuild_the_same_strategy():
+    quests = get_quest_data()
+    strategy = get_optimal_quest_strategy(initial_stats=STATS)
+    record = json.loads(json.dumps(strategy.to_record(quests)))
+    rebuilt = QuestStrategy.from_record(record, quests)
+    assert _lines(rebuilt) == _lines(strategy)
+    assert rebuilt.training_xp == strategy.training_xp
+    assert all(isinstance(ref, (list, str)) for _, refs in record['steps'] for ref in refs)
+
+
+def test_the_wire_format_reads_the_same_as_the_strategy():
+    strategy = get_optimal_quest_strategy(initial_stats=STATS)
+    plan = json.loads(json.dumps(strategy.to_wire(get_quest_data())))
+    assert _wire_lines(plan) == _lines(strategy)
+
+
+def test_the_per_quest_view_follows_the_log():
+    quests = list(get_quest_data().values())
+    strategy = QuestStrategy()
+    strategy.add_reward('first')
+    strategy.add_quest(quests[0], ['a'])
+    assert list(strategy) == [quests[0].id]
+    strategy.add_quest(quests[1], [])
+    strategy.add_reward('b')
+    strategy.push_reward('c', quests[0].id)
+    assert strategy.preparation == ['first']
+    assert strategy[quests[0].id].rewards == ['c', 'a']
+    assert strategy[quests[1].id].rewards == ['b']
+    assert all(isinstance(step, tuple) for step in strategy.log)
+
+
+def test_strategy_api():
+    client = app.test_client()
+    response = client.get('/api/strategy', query_string={'skillAttackType': 'level', 'skillAttackValue': '40'})
+    assert response.status_code == 200
+    stats = SkillSet()
+    stats[Skills.ATTACK] = Skills.min_xp_for_level(40)
+    assert response.json['training_xp'] == get_optimal_quest_strategy(initial_stats=stats).training_xp
+    assert response.json == client.post('/api/strategy', data={'skillAttackType': 'level',
+                                                               'skillAttackValue': '40'}).json
+
+
+def test_bad_stats_are_rejected():
+    client = app.test_client()
+    for values, error in [({'skillAttackValue': 'abc'}, 'Attack should be a whole number, found "abc"'),
+                          ({'skillAttackValue': '-5'}, 'Attack should be a whole number, found "-5"'),
+                          ({'skillAttackType': 'level', 'skillAttackValue': '150'},
+                           'Attack: Level cannot be greater than 120, found 150'),
+                          ({'skillAttackType': 'level', 'skillAttackValue': '0'},
+                           'Attack: Level must be greater than 0, found 0'),
+                          ({'skillAttackValue': '10000000000000000000000'}, 'Attack: Experience cannot be greater')]:
+        response = client.get('/api/strategy', query_string=values)
+        assert response.status_code == 400
+        assert response.json['error'].startswith(error)
+        response = client.post('/result', data=values)
+        assert response.status_code == 400
+        assert response.get_data(as_text=True).startswith(error)
@@ -0,0 +1,33 @@
+from collections import Counter
+
+from benchmarks.synthetic import load_real_quest_data, scaled_quest_data
+from service.closure import build_closures
+from service.model.quest import parse_quest_data
+from service.schema import check_quest_references, validate_quest_data
+
+
+def _shape(data):
+    return (
+        sum(len(quest.get('quest_requirements', [])) for quest in data) / len(data),
+        Counter(reward['type'] for quest in data for reward in quest.get('xp_rewards', [])),
+        Counter(requirement['skill'] for quest in data for requirement in quest.get('skill_requirements', [])),
+    )
+
+
+def test_scaled_catalogs_keep_the_real_ones_shape():
+    data = load_real_quest_data()
+    scaled = scaled_quest_data(data, 10)
+    assert len(scaled) == 10 * len(data)
+    assert not validate_quest_data(scaled)
+    # The real data's dangling prereqs are copied along with everything else, and nothing more
+    assert len(check_quest_references(scaled)) == 10 * len(check_quest_references(data))
+
+    density, reward_types, skill_requirements = _shape(data)
+    scaled_density, scaled_reward_types, scaled_skill_requirements = _shape(scaled)
+    assert scaled_density == density
+    assert scaled_reward_types == Counter({key: 10 * count for key, count in reward_types.items()})
+    assert scaled_skill_requirements == Counter({key: 10 * count for key, count in skill_requirements.items()})
+
+    # Copies link up with each other, without making any cycles
+    assert build_closures(parse_quest_data(scaled))
+    assert scaled_quest_data(data, 10) == scaled
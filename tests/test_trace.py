@@ -0,0 +1,112 @@
+from random import Random
+
+import pytest
+
+from service import service
+from service.catalog import get_catalog
+from service.model import Player, SkillSet, Skills
+from service.model.rewards import ClaimableXpReward, ClaimedChoiceXpReward, ImmediateXpReward
+from service.model.skillset import SKILLS
+from service.model.strategy import QuestStrategy, Training
+from service.trace import SearchTrace
+
+
+def _lines(strategy):
+    return [str(line) for quest_id in strategy for line in [strategy[quest_id].quest.name] + strategy[quest_id].rewards]
+
+
+def _follow(strategy, skills, exempt=(), stats_at=None, stats=None):
+    # Plays the strategy's log back from skills, checking every quest can be done when it is, and returns the training
+    player = Player(skills.copy())
+    trained = 0
+    for step, (kind, first, second) in enumerate(strategy.log):
+        if step == stats_at:
+            player.skills = stats.copy()
+        if kind == 'quest':
+            if first.id not in exempt:
+                assert first.skill_prereqs.dominated_by(player.skills), first.name
+                assert first.combat_requirement <= player.combat_level, first.name
+                assert not first.prereq_mask & ~player.quests_completed, first.name
+            player.quests_completed |= first.bit
+            for reward in first.xp_rewards:
+                if isinstance(reward, ClaimableXpReward):
+                    if reward in second:
+                        player.skills += reward.get_reward()
+                elif isinstance(reward, ImmediateXpReward):
+                    player.skills += reward.get_reward()
+            continue
+        for reward in first if kind == 'add' else [first]:
+            if isinstance(reward, Training):
+                assert reward.xp == reward.target - player.skills[reward.skill]
+                player.skills[reward.skill] = reward.target
+                trained += reward.xp
+            elif isinstance(reward, ClaimedChoiceXpReward):
+                assert reward.reward.is_claimable(player.skills, reward.skill_choice)
+                player.skills += reward.reward.get_reward(skill_choice=reward.skill_choice, player_skills=player.skills)
+            else:
+                assert reward.is_claimable(player.skills)
+                player.skills += reward.get_reward()
+    return trained
+
+
+def _prior(random):
+    stats = SkillSet({skill: Skills.min_xp_for_level(random.randint(1, 70)) for skill in SKILLS})
+    return stats, service._greedy_strategy(get_catalog(), None, stats)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_following_the_plan_rejoins_it(seed):
+    random = Random(seed)
+    stats, prior = _prior(random)
+    done = list(prior)[:random.randint(0, len(prior.strategy))]
+
+    new = service.replan_quest_strategy(prior, done)
+
+    assert _lines(new) == _lines(prior)
+    assert new.training_xp == prior.training_xp
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_splicing_matches_solving_the_rest(seed, monkeypatch):
+    random = Random(seed)
+    stats, prior = _prior(random)
+    order = list(prior)
+    cut = random.randint(0, len(order) - 5)
+    done = order[:cut] + [order[cut + 3]]
+    new = service.replan_quest_strategy(prior, done)
+
+    class NoRejoin(SearchTrace):
+        def __init__(self, version, rejoin=None, rejoin_strategy=None):
+            super(NoRejoin, self).__init__(version)
+
+    monkeypatch.setattr(service, 'SearchTrace', NoRejoin)
+    solved = service.replan_quest_strategy(prior, done)
+
+    assert _follow(new, stats, exempt={order[cut + 3]}) == new.training_xp
+    assert set(new) == set(solved)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_more_xp_than_planned_is_replayed(seed):
+    random = Random(seed)
+    stats, prior = _prior(random)
+    done = list(prior)[:random.randint(0, len(prior.strategy) - 1)]
+    checkpoint = prior.trace[prior.trace.resume_point(get_catalog().quest_mask(done))]
+    current = checkpoint.skills.copy()
+    for skill in random.sample(SKILLS, 3):
+        current[skill] += random.randint(1, 100000)
+
+    new = service.replan_quest_strategy(prior, done, current)
+
+    assert set(new) == set(prior)
+    assert new.training_xp <= prior.training_xp
+    assert _follow(new, stats, stats_at=checkpoint.steps, stats=current) == new.training_xp
+
+
+def test_a_cached_plan_is_replanned_from_the_traced_one():
+    random = Random(0)
+    stats, prior = _prior(random)
+    cached = QuestStrategy.from_record(prior.to_record(get_catalog().quests), get_catalog().quests)
+    done = list(prior)[:10]
+
+    assert _lines(service.replan_quest_strategy(cached, done)) == _lines(service.replan_quest_strategy(prior, done))
@@ -0,0 +1,73 @@
+import json
+from random import Random
+
+from service.catalog import DATA_FILE, QuestCatalog
+from service.model import Player, SkillSet, Skills
+from service.model.quest import parse_quest_data
+from service.schema import validate_quest_data
+from service.service import optimal_search
+from service.travel import TravelCosts, _conflicts, shorten_travel
+
+
+def _located_catalog(seed: int = 0) -> QuestCatalog:
+    random = Random(seed)
+    data = json.loads(DATA_FILE.read_bytes())
+    for quest in data:
+        quest['location'] = [random.randrange(3200), random.randrange(3200)]
+    return QuestCatalog(parse_quest_data(data), 'located', (0, 0))
+
+
+def test_travel_costs():
+    data = [
+        {'id': 1, 'name': 'A', 'difficulty': 'Novice', 'location': [0, 0]},
+        {'id': 2, 'name': 'B', 'difficulty': 'Novice', 'location': [3, 4]},
+        {'id': 3, 'name': 'C', 'difficulty': 'Novice', 'location': [3000, 0]},
+        {'id': 4, 'name': 'D', 'difficulty': 'Novice'},
+    ]
+    assert not validate_quest_data(data)
+    assert validate_quest_data([dict(data[0], location=[1])])
+    costs = TravelCosts(parse_quest_data(data), teleport_cost=50)
+    assert len(costs) == 3
+    assert costs.cost(1, 2) == costs.cost(2, 1) == 5
+    assert costs.cost(1, 3) == 50
+    assert costs.cost(1, 4) == 0
+    assert costs.route_cost([1, 2, 4, 3]) == 5
+
+
+def test_shortened_plans_keep_every_requirement():
+    catalog = _located_catalog()
+    stats = SkillSet({Skills.ATTACK: Skills.min_xp_for_level(40)})
+    player = Player(stats.copy())
+    strategy = optimal_search(player, catalog.quests)
+    shortened = shorten_travel(strategy, catalog.travel, time_limit=5)
+
+    before, after = list(strategy), list(shortened)
+    assert sorted(before) == sorted(after)
+    assert catalog.travel.route_cost(after) < catalog.travel.route_cost(before)
+    assert shortened.training_xp == strategy.training_xp
+    for quest_id in before:
+        assert shortened[quest_id].rewards == strategy[quest_id].rewards
+
+    # Anything that doesn't commute stays in order
+    items = list(strategy.strategy.values())
+    conflicts = _conflicts(items)
+    position = {quest_id: idx for idx, quest_id in enumerate(after)}
+    for a in range(len(items)):
+        for b in range(a):
+            if conflicts[a] >> b & 1:
+                assert position[before[b]] < position[before[a]]
+
+    # Quest and quest point requirements, checked independently
+    done, quest_points = set(), Player().quest_points
+    for quest_id in after:
+        quest = catalog.quests[quest_id]
+        assert quest.qp_requirement <= quest_points
+        assert all(prereq in done or prereq not in catalog.quests for prereq in quest.quest_prereqs)
+        done.add(quest_id)
+        quest_points += quest.quest_points
+
+
+def test_plans_without_locations_are_left_alone():
+    catalog = QuestCatalog(parse_quest_data(json.loads(DATA_FILE.read_bytes())), 'plain', (0, 0))
+    strategy = optimal_search(Player(), catalog.quests)
+    assert shorten_travel(strategy, catalog.travel) is strategy